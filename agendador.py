@@ -0,0 +1,235 @@
+# Agendador global das emissões de certidões
+# agendador.py
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Threads que executam certidões neste processo
+AGENDADOR_WORKERS = int(os.getenv("AGENDADOR_WORKERS", "8"))
+# Emissões simultâneas por emissor; sobrescreva com LIMITE_EMISSOR_<EMISSOR> (ex.: LIMITE_EMISSOR_RECEITA=1)
+LIMITE_EMISSOR_PADRAO = int(os.getenv("LIMITE_EMISSOR_PADRAO", "2"))
+# Quando há certidões interativas e de lote esperando, 1 a cada N vagas vai para o lote (evita inanição)
+AGENDADOR_COTA_LOTE = int(os.getenv("AGENDADOR_COTA_LOTE", "5"))
+# Certidões com prazo a menos disso (segundos) passam na frente de qualquer outra, da mais urgente para a menos
+MARGEM_PRAZO = int(os.getenv("AGENDADOR_MARGEM_PRAZO", "60"))
+
+# Classes de prioridade (menor = mais prioritária)
+PRIORIDADE_INTERATIVA = 0  # emissão pedida por um usuário na tela
+PRIORIDADE_LOTE = 1        # emissões em massa (POST /analises/certidoes/lote/)
+PRIORIDADES = {"interativa": PRIORIDADE_INTERATIVA, "lote": PRIORIDADE_LOTE}
+
+
+def limite_do_emissor(emissor: str) -> int:
+    return int(os.getenv(f"LIMITE_EMISSOR_{emissor.upper()}", LIMITE_EMISSOR_PADRAO))
+
+
+class FilaJusta:
+    """
+    Fila de um emissor. Ordem de saída:
+      1. itens com prazo vencendo (dentro de MARGEM_PRAZO), em rodízio entre os usuários
+         que têm algum (quem não foi atendido assim ainda vai primeiro, pelo prazo mais
+         cedo) e, por usuário, o de prazo mais cedo;
+      2. classe interativa antes da de lote, cedendo 1 vaga a cada AGENDADOR_COTA_LOTE ao lote;
+      3. dentro da classe, rodízio entre usuario_id (cada usuário tem a mesma vez,
+         não importa quantas certidões enfileirou) e, por usuário, prazo mais cedo primeiro.
+    """
+
+    def __init__(self):
+        self._classes = {}  # prioridade -> OrderedDict(usuario_id -> heap de (prazo, seq, funcao, args))
+        self._seq = itertools.count()
+        self._tamanho = 0
+        self._interativas_seguidas = 0
+        # Ordem de atendimento pelos prazos vencendo: o último usuário atendido fica no fim
+        self._rodizio_urgente = OrderedDict()
+
+    def __len__(self):
+        return self._tamanho
+
+    def inserir(self, funcao, args, prioridade: int, usuario_id, prazo: float = None):
+        usuarios = self._classes.setdefault(prioridade, OrderedDict())
+        heap = usuarios.setdefault(usuario_id, [])
+        heapq.heappush(heap, (prazo if prazo is not None else math.inf, next(self._seq), funcao, args))
+        self._tamanho += 1
+
+    def _urgente(self, agora: float):
+        # Item mais urgente de cada usuário com prazo vencendo: usuario_id -> (prazo, prioridade)
+        urgentes = {}
+        for prioridade, usuarios in self._classes.items():
+            for usuario_id, heap in usuarios.items():
+                prazo = heap[0][0]
+                if prazo - agora <= MARGEM_PRAZO and (usuario_id not in urgentes or prazo < urgentes[usuario_id][0]):
+                    urgentes[usuario_id] = (prazo, prioridade)
+        if not urgentes:
+            return None
+        novos = [usuario_id for usuario_id in urgentes if usuario_id not in self._rodizio_urgente]
+        if novos:
+            usuario_id = min(novos, key=lambda usuario_id: urgentes[usuario_id][0])
+        else:
+            usuario_id = next(usuario_id for usuario_id in self._rodizio_urgente if usuario_id in urgentes)
+        self._rodizio_urgente.pop(usuario_id, None)
+        self._rodizio_urgente[usuario_id] = None
+        return urgentes[usuario_id][1], usuario_id
+
+    def _classe(self):
+        classes = sorted(prioridade for prioridade, usuarios in self._classes.items() if usuarios)
+        if len(classes) > 1 and self._interativas_seguidas >= AGENDADOR_COTA_LOTE - 1:
+            self._interativas_seguidas = 0
+            return classes[-1]
+        if len(classes) > 1:
+            self._interativas_seguidas += 1
+        return classes[0]
+
+    def retirar(self, agora: float = None):
+        if not self._tamanho:
+            return None
+        urgente = self._urgente(time.time() if agora is None else agora)
+        if urgente:
+            prioridade, usuario_id = urgente
+        else:
+            prioridade = self._classe()
+            usuario_id = next(iter(self._classes[prioridade]))
+        usuarios = self._classes[prioridade]
+        heap = usuarios[usuario_id]
+        _, _, funcao, args = heapq.heappop(heap)
+        # O usuário atendido vai para o fim do rodízio da classe
+        del usuarios[usuario_id]
+        if heap:
+            usuarios[usuario_id] = heap
+        elif not any(usuario_id in outros for outros in self._classes.values()):
+            self._rodizio_urgente.pop(usuario_id, None)
+        self._tamanho -= 1
+        return funcao, args
+
+    def esvaziar(self) -> list:
+        """Remove e retorna todos os itens, pares (funcao, args), na ordem de inserção."""
+        itens = [item for usuarios in self._classes.values() for heap in usuarios.values() for item in heap]
+        itens.sort(key=lambda item: item[1])
+        self._classes.clear()
+        self._rodizio_urgente.clear()
+        self._tamanho = 0
+        return [(funcao, args) for _prazo, _seq, funcao, args in itens]
+
+    def por_classe(self) -> dict:
+        return {
+            prioridade: sum(len(heap) for heap in usuarios.values())
+            for prioridade, usuarios in self._classes.items()
+        }
+
+
+class Agendador:
+    """
+    Fila única do processo para todas as certidões, de todas as análises e lotes.
+    Cada emissor tem sua fila (FilaJusta) e um limite de execuções simultâneas;
+    as threads de trabalho alternam entre os emissores com vaga livre, então um
+    lote grande em um emissor lento não segura os demais.
+    """
+
+    def __init__(self, workers: int = AGENDADOR_WORKERS):
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._filas = {}  # emissor -> FilaJusta
+        self._em_execucao = Counter()
+        self._ordem = deque()  # rodízio entre emissores
+        self._threads = []
+        self._ativo = True
+
+    def submeter(self, emissor: str, funcao, *args, prioridade: int = PRIORIDADE_INTERATIVA,
+                 usuario_id=None, prazo: float = None):
+        """
+        Enfileira funcao(*args) no emissor.
+        prazo: instante (time.time()) até o qual a certidão deveria ter saído.
+        """
+        with self._cond:
+            if not self._ativo:
+                raise RuntimeError("Agendador encerrado")
+            if emissor not in self._filas:
+                self._filas[emissor] = FilaJusta()
+                self._ordem.append(emissor)
+            self._filas[emissor].inserir(funcao, args, prioridade, usuario_id, prazo)
+            self._iniciar()
+            self._cond.notify()
+
+    def _iniciar(self):
+        # Threads criadas sob demanda, na primeira submissão
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._trabalhar, name=f"agendador-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _proximo(self):
+        # Chamado com o lock: primeiro emissor (em rodízio) com fila e vaga livre
+        for _ in range(len(self._ordem)):
+            emissor = self._ordem[0]
+            self._ordem.rotate(-1)
+            fila = self._filas[emissor]
+            if fila and self._em_execucao[emissor] < limite_do_emissor(emissor):
+                return emissor, fila.retirar()
+        return None
+
+    def _trabalhar(self):
+        while True:
+            with self._cond:
+                while True:
+                    proximo = self._proximo()
+                    if proximo is not None:
+                        break
+                    if not self._ativo and not self.pendentes():
+                        return
+                    self._cond.wait()
+                emissor, (funcao, args) = proximo
+                self._em_execucao[emissor] += 1
+            try:
+                funcao(*args)
+            except Exception:
+                logger.exception("Falha ao executar certidão do emissor %s", emissor)
+            finally:
+                with self._cond:
+                    self._em_execucao[emissor] -= 1
+                    self._cond.notify_all()
+
+    def pendentes(self) -> int:
+        return sum(len(fila) for fila in self._filas.values())
+
+    def estatisticas(self) -> dict:
+        with self._cond:
+            return {
+                emissor: {
+                    "na_fila": len(self._filas[emissor]),
+                    "por_prioridade": {
+                        nome: self._filas[emissor].por_classe().get(valor, 0)
+                        for nome, valor in PRIORIDADES.items()
+                    },
+                    "em_execucao": self._em_execucao[emissor],
+                    "limite": limite_do_emissor(emissor),
+                }
+                for emissor in self._filas
+            }
+
+    def encerrar(self, timeout: float = None, descartar_fila: bool = False) -> list:
+        """
+        Para de aceitar certidões e espera as threads terminarem (timeout total, não por thread).
+        descartar_fila: só as certidões em execução são concluídas; as ainda na fila
+        são retiradas e devolvidas, pares (funcao, args), para quem chamou
+        liberá-las no banco (ver gateway_certidoes.liberar_descartadas).
+        """
+        with self._cond:
+            self._ativo = False
+            descartadas = []
+            if descartar_fila:
+                for fila in self._filas.values():
+                    descartadas += fila.esvaziar()
+            self._cond.notify_all()
+        limite = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if limite is None else max(limite - time.monotonic(), 0))
+        return descartadas
+
+
+agendador = Agendador()
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, Enum as SAEnum
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Depends
+from sqlalchemy import select, create_engine, Column, Integer, String, DateTime, ForeignKey, Text, Enum as SAEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from typing import List, Optional
@@ -7,47 +7,88 @@ from pydantic import BaseModel
 from datetime import datetime, date
 import enum
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
 import re
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, ORJSONResponse, RedirectResponse
 # teste 
 from gateway_certidoes import router as gateway_certidoes_router
-from db import get_db
+from eventos import router as eventos_router, publicar_evento
+from relatorio import router as relatorio_router
+from zip_certidoes import router as zip_certidoes_router
+from consulta_documento import router as consulta_documento_router
+from webhooks import router as webhooks_router, com_despachante
+from cache import chave_analise, chave_analise_full, invalidar_analise, obter_ou_gerar_analise
+from db import DATABASE_REPLICA_URLS, LeituraAposEscrita, get_db, get_db_leitura
+from armazenamento import get_armazenamento
+from idempotencia import executar_idempotente
+from arquivamento import analise_arquivada
+from urls import assinatura_valida
 from models import Analise, Proprietario, EsposaSocio, Imovel, StatusAnalise
 from schemas import ConjugeCPFSchema,ProprietarioCPFSchema,AnaliseEtapa1CPFPayload,ConjugeCNPJSchema,ProprietarioCNPJSchema,AnaliseEtapa1CNPJPayload,ImovelSchema
+from schemas import AnaliseResponse, AnaliseFullResponse, ProprietarioResponse, EsposaSocioResponse
+from respostas import dumps, carregar_analise, carregar_analise_full, carregar_conjuge, listar_analises, listar_proprietarios, projetar
+from respostas import COLUNAS_ANALISE, COLUNAS_PROPRIETARIO, VISOES_ANALISE, VISOES_PROPRIETARIO
 
 # =======================
 # CONFIGURAÇÃO DA API
 # =======================
 
-app = FastAPI()
-app.include_router(gateway_certidoes_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Ajuste conforme necessário
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
+
+
+def criar_app(lifespan=None) -> FastAPI:
+    """
+    Monta a aplicação. Não toca no banco (o engine nasce na primeira sessão)
+    nem cria tabelas: o schema é aplicado com `python manage.py schema`.
+    lifespan: ciclo de vida do processo (aquecimento e drenagem, ver servidor.py);
+    o despachante de webhooks é iniciado e encerrado em volta dele.
+    """
+    # orjson como serializador padrão: respostas grandes (dezenas de colunas pdf_* por proprietário) ficam bem mais baratas
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=com_despachante(lifespan))
+    app.include_router(gateway_certidoes_router)
+    app.include_router(eventos_router)
+    app.include_router(relatorio_router)
+    app.include_router(zip_certidoes_router)
+    app.include_router(consulta_documento_router)
+    app.include_router(webhooks_router)
+    app.include_router(router)
+
+    if DATABASE_REPLICA_URLS:
+        app.add_middleware(LeituraAposEscrita)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Ajuste conforme necessário
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
 
 
 # =======================
 # ENDPOINTS
 # =======================
-# Acessar docs 
-docs_path = Path("files")
-
-@app.get("/files/{filename}", tags=["Arquivos"])
-async def get_file(filename: str):
-    file_path = docs_path / filename
-    if file_path.exists() and file_path.is_file():
+# Acessar docs (pasta local ou bucket, conforme ARMAZENAMENTO)
+# Com URL_SEGREDO configurado, só URLs assinadas (urls.url_arquivo) são aceitas
+@router.get("/files/{filename}", tags=["Arquivos"])
+def get_file(filename: str, expira: Optional[int] = None, assinatura: Optional[str] = None):
+    if not assinatura_valida(filename, expira, assinatura):
+        raise HTTPException(status_code=403, detail="URL expirada ou assinatura inválida")
+    armazenamento = get_armazenamento()
+    try:
+        file_path = armazenamento.caminho_local(filename)
+    except ValueError:
+        file_path = None
+    if file_path:
         return FileResponse(file_path, filename=filename, media_type="application/octet-stream")
+    # No S3 o download sai direto do bucket, por URL pré-assinada
+    url = armazenamento.url_assinada(filename, nome_download=filename)
+    if url and armazenamento.existe(filename):
+        return RedirectResponse(url)
     raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
 # Rota para etapa 1 via CPF
-@app.post("/analises/etapa1/cpf/")
-def create_analise_etapa1_cpf(payload: List[AnaliseEtapa1CPFPayload], db: Session = Depends(get_db)):
+def _inserir_etapa1_cpf(db: Session, payload: List[AnaliseEtapa1CPFPayload]) -> list:
+    # Só add/flush (para obter os ids): o commit único fica com executar_idempotente
     results = []
     for analise_payload in payload:
         # Cria a análise
@@ -57,8 +98,7 @@ def create_analise_etapa1_cpf(payload: List[AnaliseEtapa1CPFPayload], db: Sessio
             data=datetime.utcnow()
         )
         db.add(new_analise)
-        db.commit()
-        db.refresh(new_analise)
+        db.flush()
 
         proprietario_ids = []
         # Para cada proprietário na análise
@@ -73,28 +113,43 @@ def create_analise_etapa1_cpf(payload: List[AnaliseEtapa1CPFPayload], db: Sessio
                 e_empresa= 0
             )
             db.add(new_prop)
-            db.commit()
-            db.refresh(new_prop)
+            db.flush()
             proprietario_ids.append(new_prop.id)
 
             # Se o proprietário for casado e tiver dados do cônjuge, cria o registro na tabela esposa_socio
             if prop.estado_civil.lower() == "casado" and prop.conjuge:
-                new_conjuge = EsposaSocio(
+                db.add(EsposaSocio(
                     proprietario_id=new_prop.id,
                     nome=prop.conjuge.nome_completo,
                     cpf=prop.conjuge.cpf,
                     data_nascimento=datetime.combine(prop.conjuge.data_nascimento, datetime.min.time()),
                     nome_mae=prop.conjuge.nome_mae,
-                )
-                db.add(new_conjuge)
-                db.commit()
-                db.refresh(new_conjuge)
+                ))
         results.append({"analise_id": new_analise.id, "proprietario_ids": proprietario_ids, "status": "success"})
-    return results[0]
+    return results
+
+
+def _resposta_etapa1(results: list, repetida: bool):
+    for result in results:
+        invalidar_analise(result["analise_id"])
+    # Repetição com a mesma Idempotency-Key: mesmos ids da primeira execução
+    return ORJSONResponse(results[0], headers={"Idempotent-Replayed": "true"} if repetida else None)
+
+
+@router.post("/analises/etapa1/cpf/")
+def create_analise_etapa1_cpf(
+    payload: List[AnaliseEtapa1CPFPayload],
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Cria as análises, proprietários e cônjuges em uma transação; aceita Idempotency-Key."""
+    results, repetida = executar_idempotente(
+        db, "etapa1_cpf", idempotency_key, payload, lambda: _inserir_etapa1_cpf(db, payload)
+    )
+    return _resposta_etapa1(results, repetida)
 
 # Rota para etapa 1 via CNPJ
-@app.post("/analises/etapa1/cnpj/")
-def create_analise_etapa1_cnpj(payload: List[AnaliseEtapa1CNPJPayload], db: Session = Depends(get_db)):
+def _inserir_etapa1_cnpj(db: Session, payload: List[AnaliseEtapa1CNPJPayload]) -> list:
     results = []
     for analise_payload in payload:
         new_analise = Analise(
@@ -103,8 +158,7 @@ def create_analise_etapa1_cnpj(payload: List[AnaliseEtapa1CNPJPayload], db: Sess
             data=datetime.utcnow()
         )
         db.add(new_analise)
-        db.commit()
-        db.refresh(new_analise)
+        db.flush()
 
         proprietario_ids = []
         for prop in analise_payload.proprietarios:
@@ -121,15 +175,27 @@ def create_analise_etapa1_cnpj(payload: List[AnaliseEtapa1CNPJPayload], db: Sess
                 e_empresa=1 if prop.e_empresa else 0
             )
             db.add(new_prop)
-            db.commit()
-            db.refresh(new_prop)
+            db.flush()
             proprietario_ids.append(new_prop.id)
 
         results.append({"analise_id": new_analise.id, "proprietarios": proprietario_ids})
-    return results[0]
+    return results
+
+
+@router.post("/analises/etapa1/cnpj/")
+def create_analise_etapa1_cnpj(
+    payload: List[AnaliseEtapa1CNPJPayload],
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Cria as análises e proprietários em uma transação; aceita Idempotency-Key."""
+    results, repetida = executar_idempotente(
+        db, "etapa1_cnpj", idempotency_key, payload, lambda: _inserir_etapa1_cnpj(db, payload)
+    )
+    return _resposta_etapa1(results, repetida)
 
 # Rota para etapa 2: atualização ou criação dos dados do imóvel (em tabela separada)
-@app.put("/analises/etapa2/{analise_id}/")
+@router.put("/analises/etapa2/{analise_id}/")
 def update_analise_etapa2(analise_id: int, imovel: ImovelSchema, db: Session = Depends(get_db)):
     analise = db.query(Analise).filter(Analise.id == analise_id).first()
     if not analise:
@@ -158,144 +224,97 @@ def update_analise_etapa2(analise_id: int, imovel: ImovelSchema, db: Session = D
     analise.status = StatusAnalise.em_progresso.value
     db.commit()
     db.refresh(analise)
+    invalidar_analise(analise.id)
+    publicar_evento(analise.id, "status", status=analise.status)
     return {"status": "Dados do imóvel atualizados com sucesso!", "analise_id": analise.id}
 
 # Endpoints para consulta
 
-@app.get("/analises/")
-def get_all_analises(db: Session = Depends(get_db)):
-    analises = db.query(Analise).all()
+@router.get("/analises/", response_model=List[AnaliseResponse])
+def get_all_analises(risco: Optional[str] = None, db: Session = Depends(get_db_leitura)):
+    """Lista as análises; risco=com_pendencias filtra pelo veredito (coluna indexada)."""
+    analises = listar_analises(db, risco=risco)
     if not analises:
         raise HTTPException(status_code=404, detail="Nenhuma análise encontrada")
-    return analises
+    return ORJSONResponse(analises)
 
-@app.get("/analises/{analise_id}/")
-def get_analise(analise_id: int, db: Session = Depends(get_db)):
-    analise = db.query(Analise).filter(Analise.id == analise_id).first()
-    if not analise:
-        raise HTTPException(status_code=404, detail="Análise não encontrada")
-    return analise
+@router.get("/analises/{analise_id}/", response_model=AnaliseResponse)
+def get_analise(analise_id: int, db: Session = Depends(get_db_leitura)):
+    def gerar():
+        analise = carregar_analise(db, analise_id)
+        return dumps(analise) if analise else None
 
-@app.get("/analises/{analise_id}/proprietarios/")
-def get_proprietarios_by_analise(analise_id: int, db: Session = Depends(get_db)):
-    analise = db.query(Analise).filter(Analise.id == analise_id).first()
-    if not analise:
+    corpo = obter_ou_gerar_analise(analise_id, chave_analise(analise_id), gerar)
+    if corpo is None:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    return Response(content=corpo, media_type="application/json")
+
+@router.get("/analises/{analise_id}/proprietarios/", response_model=List[ProprietarioResponse])
+def get_proprietarios_by_analise(
+    analise_id: int,
+    fields: Optional[str] = None,
+    visao: Optional[str] = None,
+    db: Session = Depends(get_db_leitura)
+):
+    """
+    Lista os proprietários da análise.
+    fields=nome_razao,cpf_cnpj ou visao=resumo restringem as colunas do SELECT.
+    """
+    colunas = projetar(COLUNAS_PROPRIETARIO, fields, visao, VISOES_PROPRIETARIO)
+    analise = db.query(Analise.id).filter(Analise.id == analise_id).first()
+    if not analise and not analise_arquivada(db, analise_id):
         raise HTTPException(status_code=404, detail="Análise não encontrada")
-    proprietarios = db.query(Proprietario).filter(Proprietario.analise_id == analise_id).all()
-    return proprietarios
+    return ORJSONResponse(listar_proprietarios(db, analise_id=analise_id, colunas=colunas))
 
-@app.get("/proprietarios/{proprietario_id}/")
-def get_proprietario(proprietario_id: int, db: Session = Depends(get_db)):
-    proprietario = db.query(Proprietario).filter(Proprietario.id == proprietario_id).first()
-    if not proprietario:
+@router.get("/proprietarios/{proprietario_id}/", response_model=ProprietarioResponse)
+def get_proprietario(proprietario_id: int, db: Session = Depends(get_db_leitura)):
+    proprietarios = listar_proprietarios(db, proprietario_id=proprietario_id)
+    if not proprietarios:
         raise HTTPException(status_code=404, detail="Proprietário não encontrado")
-    return proprietario
+    return ORJSONResponse(proprietarios[0])
 
-@app.get("/proprietarios/{proprietario_id}/conjuge/")
-def get_conjuge_by_proprietario(proprietario_id: int, db: Session = Depends(get_db)):
-    conjuge = db.query(EsposaSocio).filter(EsposaSocio.proprietario_id == proprietario_id).first()
+@router.get("/proprietarios/{proprietario_id}/conjuge/", response_model=EsposaSocioResponse)
+def get_conjuge_by_proprietario(proprietario_id: int, db: Session = Depends(get_db_leitura)):
+    conjuge = carregar_conjuge(db, proprietario_id)
     if not conjuge:
         raise HTTPException(status_code=404, detail="Cônjuge não encontrado para este proprietário")
-    return conjuge
-
-@app.get("/analises/usuario/{usuario_id}/")
-def get_analises_by_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    analises = db.query(Analise).filter(Analise.usuario_id == str(usuario_id)).all()
+    return ORJSONResponse(conjuge)
+
+@router.get("/analises/usuario/{usuario_id}/", response_model=List[AnaliseResponse])
+def get_analises_by_usuario(
+    usuario_id: int,
+    fields: Optional[str] = None,
+    visao: Optional[str] = None,
+    db: Session = Depends(get_db_leitura)
+):
+    """
+    Lista as análises do usuário.
+    fields=status,data ou visao=resumo restringem as colunas do SELECT.
+    """
+    colunas = projetar(COLUNAS_ANALISE, fields, visao, VISOES_ANALISE)
+    analises = listar_analises(db, usuario_id=str(usuario_id), colunas=colunas)
     if not analises:
         raise HTTPException(status_code=404, detail="Nenhuma análise encontrada para este usuário")
-    return analises
-
-# =======================
-# MODELOS DE RESPOSTA COMPLETA
-# =======================
-from typing import Optional
-from datetime import datetime
-
-class ImovelResponse(BaseModel):
-    id: int
-    cep: Optional[str] = None
-    endereco: Optional[str] = None
-    inscricao_iptu: Optional[str] = None
-    cartorio: Optional[str] = None
-    matricula: Optional[str] = None
-    pdf_sefaz: Optional[str] = None
-
-    class Config:
-        orm_mode = True
-
-class EsposaSocioResponse(BaseModel):
-    id: int
-    nome: Optional[str] = None
-    cpf: Optional[str] = None
-    data_nascimento: Optional[datetime] = None
-    nome_mae: Optional[str] = None
-    pdf_sefaz: Optional[str] = None
-    pdf_trabalho: Optional[str] = None
-    pdf_nada_consta_civel: Optional[str] = None
-    pdf_nada_consta_criminal: Optional[str] = None
-    pdf_nada_consta_falencia: Optional[str] = None
-    pdf_nada_consta_especial: Optional[str] = None
-    pdf_receita: Optional[str] = None
-    pdf_tjdf_criminal: Optional[str] = None
-    pdf_tjdf_eleitoral: Optional[str] = None
-    pdf_tjdf_civel: Optional[str] = None
-    ad: Optional[str] = None
-
-    class Config:
-        orm_mode = True
-
-class ProprietarioResponse(BaseModel):
-    id: int
-    analise_id: int
-    nome_razao: Optional[str] = None
-    nome_mae: Optional[str] = None
-    cpf_cnpj: Optional[str] = None
-    data_nascimento: Optional[datetime] = None
-    estado_civil: Optional[str] = None
-    e_empresa: Optional[int] = None
-    nome_representante: Optional[str] = None
-    nome_mae_representante: Optional[str] = None
-    cpf_representante: Optional[str] = None
-    data_nascimento_representante: Optional[datetime] = None
-    pdf_sefaz: Optional[str] = None
-    pdf_trabalho: Optional[str] = None
-    pdf_nada_consta_civel: Optional[str] = None
-    pdf_nada_consta_criminal: Optional[str] = None
-    pdf_nada_consta_falencia: Optional[str] = None
-    pdf_nada_consta_especial: Optional[str] = None
-    pdf_receita: Optional[str] = None
-    pdf_tjdf_criminal: Optional[str] = None
-    pdf_tjdf_eleitoral: Optional[str] = None
-    pdf_tjdf_civel: Optional[str] = None
-    ad: Optional[str] = None
-    conjuge: Optional[EsposaSocioResponse] = None
-
-    class Config:
-        orm_mode = True
-
-class AnaliseFullResponse(BaseModel):
-    id: int
-    status: Optional[str] = None
-    link_pdf: Optional[str] = None
-    resumo: Optional[str] = None
-    data: datetime
-    usuario_id: Optional[str] = None
-    imovel: Optional[ImovelResponse] = None
-    proprietarios: List[ProprietarioResponse] = []
-
-    class Config:
-        orm_mode = True
+    return ORJSONResponse(analises)
 
 # =======================
 # NOVO ENDPOINT PARA CONSULTA COMPLETA DA ANÁLISE
 # =======================
-@app.get("/analises/full/{analise_id}/", response_model=AnaliseFullResponse)
-def get_full_analise(analise_id: int, db: Session = Depends(get_db)):
-    analise = db.query(Analise).filter(Analise.id == analise_id).first()
-    if not analise:
+@router.get("/analises/full/{analise_id}/", response_model=AnaliseFullResponse)
+def get_full_analise(analise_id: int, db: Session = Depends(get_db_leitura)):
+    def gerar():
+        analise = carregar_analise_full(db, analise_id)
+        return dumps(analise) if analise else None
+
+    # Leituras repetidas saem do cache sem consultar o banco nem serializar de novo
+    corpo = obter_ou_gerar_analise(analise_id, chave_analise_full(analise_id), gerar)
+    if corpo is None:
         raise HTTPException(status_code=404, detail="Análise não encontrada")
-    return analise  
+    return Response(content=corpo, media_type="application/json")
+
+app = criar_app()
 
+# Desenvolvimento (um processo, com reload); em produção use `python servidor.py`
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
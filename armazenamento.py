@@ -0,0 +1,317 @@
+# Armazenamento dos arquivos das certidões (disco local ou S3/MinIO)
+# armazenamento.py
+import io
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# "local": pasta no disco do nó (padrão, comportamento anterior); "s3": bucket S3 ou compatível (MinIO)
+ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "local")
+ARMAZENAMENTO_PASTA = os.getenv("ARMAZENAMENTO_PASTA", "files")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIXO = os.getenv("S3_PREFIXO", "")
+# Ex.: http://minio:9000; credenciais pelas variáveis padrão do boto3 (AWS_ACCESS_KEY_ID, ...)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGIAO = os.getenv("S3_REGIAO")
+# Validade (segundos) das URLs pré-assinadas de download
+S3_URL_EXPIRA = int(os.getenv("S3_URL_EXPIRA", "3600"))
+# Acima disso o envio vai em partes (multipart), com S3_CONCORRENCIA partes/arquivos em paralelo
+S3_MULTIPART_MB = int(os.getenv("S3_MULTIPART_MB", "8"))
+S3_CONCORRENCIA = int(os.getenv("S3_CONCORRENCIA", "8"))
+
+BLOCO = 256 * 1024
+
+
+class _LeitorDeBlocos(io.RawIOBase):
+    """Expõe um iterável de bytes (ex.: response.iter_content) como arquivo, sem juntar tudo na memória."""
+
+    def __init__(self, blocos):
+        self._blocos = iter(blocos)
+        self._resto = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self._resto:
+            try:
+                self._resto = next(self._blocos)
+            except StopIteration:
+                return 0
+        n = min(len(destino), len(self._resto))
+        destino[:n] = self._resto[:n]
+        self._resto = self._resto[n:]
+        return n
+
+
+def _como_arquivo(dados):
+    """bytes, arquivo aberto ou iterável de blocos -> objeto com read()."""
+    if isinstance(dados, (bytes, bytearray, memoryview)):
+        return io.BytesIO(dados)
+    if hasattr(dados, "read"):
+        return dados
+    return io.BufferedReader(_LeitorDeBlocos(dados), BLOCO)
+
+
+# =======================
+# DISCO LOCAL
+# =======================
+
+class ArmazenamentoLocal:
+    """Arquivos em uma pasta do nó. A chave é o caminho relativo à pasta (ex.: 'relatorios/1_ab.pdf')."""
+
+    def __init__(self, pasta: str = ARMAZENAMENTO_PASTA):
+        self.pasta = pasta
+
+    def caminho(self, chave: str) -> str:
+        raiz = os.path.abspath(self.pasta)
+        caminho = os.path.abspath(os.path.join(raiz, *chave.split("/")))
+        if not caminho.startswith(raiz + os.sep):
+            raise ValueError(f"Chave inválida: {chave}")
+        return caminho
+
+    def salvar(self, chave: str, dados, content_type: str = "application/pdf"):
+        """Grava bytes, um arquivo aberto ou um iterável de blocos (escrita atômica)."""
+        destino = self.caminho(chave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+        with open(temporario, "wb") as arquivo:
+            shutil.copyfileobj(_como_arquivo(dados), arquivo, BLOCO)
+        os.replace(temporario, destino)
+
+    def enviar_arquivo(self, chave: str, caminho: str, content_type: str = "application/pdf"):
+        destino = self.caminho(chave)
+        if os.path.abspath(caminho) == destino:
+            return
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.move(caminho, destino)
+
+    def abrir(self, chave: str, inicio: int = 0):
+        arquivo = open(self.caminho(chave), "rb")
+        if inicio:
+            arquivo.seek(inicio)
+        return arquivo
+
+    def ler(self, chave: str) -> bytes:
+        with self.abrir(chave) as arquivo:
+            return arquivo.read()
+
+    def info(self, chave: str):
+        """{'tamanho', 'versao', 'modificado' (epoch)} do arquivo, ou None se não existe."""
+        try:
+            estado = os.stat(self.caminho(chave))
+        except (FileNotFoundError, ValueError):
+            return None
+        return {"tamanho": estado.st_size, "versao": str(estado.st_mtime_ns), "modificado": estado.st_mtime}
+
+    def existe(self, chave: str) -> bool:
+        return self.info(chave) is not None
+
+    def remover(self, chave: str):
+        try:
+            os.remove(self.caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def listar(self, prefixo: str = ""):
+        raiz = os.path.abspath(self.pasta)
+        for pasta, _, nomes in os.walk(raiz):
+            for nome in nomes:
+                chave = os.path.relpath(os.path.join(pasta, nome), raiz).replace(os.sep, "/")
+                if chave.startswith(prefixo) and not chave.endswith(".tmp"):
+                    yield chave
+
+    def listar_com_info(self, prefixo: str = ""):
+        """(chave, {'tamanho', 'modificado'}) de cada arquivo, sem uma consulta por arquivo."""
+        for chave in self.listar(prefixo):
+            try:
+                estado = os.stat(self.caminho(chave))
+            except FileNotFoundError:
+                continue  # removido durante a listagem
+            yield chave, {"tamanho": estado.st_size, "modificado": estado.st_mtime}
+
+    def mover(self, origem: str, destino: str):
+        """Renomeia a chave; 'modificado' passa a ser o instante da mudança."""
+        caminho_destino = self.caminho(destino)
+        os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
+        os.replace(self.caminho(origem), caminho_destino)
+        os.utime(caminho_destino)
+
+    def caminho_local(self, chave: str):
+        """Caminho no disco, para servir com FileResponse; None se o arquivo não é local."""
+        caminho = self.caminho(chave)
+        return caminho if os.path.isfile(caminho) else None
+
+    def url_assinada(self, chave: str, expira: int = None, nome_download: str = None):
+        # Arquivos locais são servidos pela própria API (GET /files/...)
+        return None
+
+    @contextmanager
+    def arquivos_locais(self, chaves: list):
+        """Caminhos no disco das chaves existentes (na mesma ordem), para quem precisa de arquivo (mmap)."""
+        yield [caminho for caminho in (self.caminho_local(chave) for chave in chaves) if caminho]
+
+
+# =======================
+# S3 / MINIO
+# =======================
+
+class ArmazenamentoS3:
+    """
+    Bucket S3 ou compatível (MinIO). Envios acima de S3_MULTIPART_MB vão em partes
+    paralelas, inclusive a partir de um stream (a origem não precisa caber na memória);
+    downloads saem por URL pré-assinada, direto do bucket para o cliente.
+    """
+
+    def __init__(self, bucket: str = S3_BUCKET, prefixo: str = S3_PREFIXO,
+                 endpoint_url: str = S3_ENDPOINT_URL, regiao: str = S3_REGIAO, cliente=None):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            raise RuntimeError("ARMAZENAMENTO=s3 requer o pacote boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("ARMAZENAMENTO=s3 requer S3_BUCKET")
+        self.bucket = bucket
+        self.prefixo = prefixo
+        self.cliente = cliente or boto3.client("s3", endpoint_url=endpoint_url, region_name=regiao)
+        self.transferencia = TransferConfig(
+            multipart_threshold=S3_MULTIPART_MB * 1024 * 1024,
+            multipart_chunksize=S3_MULTIPART_MB * 1024 * 1024,
+            max_concurrency=S3_CONCORRENCIA,
+        )
+
+    def _chave(self, chave: str) -> str:
+        return f"{self.prefixo}{chave}"
+
+    def salvar(self, chave: str, dados, content_type: str = "application/pdf"):
+        self.cliente.upload_fileobj(
+            _como_arquivo(dados), self.bucket, self._chave(chave),
+            ExtraArgs={"ContentType": content_type}, Config=self.transferencia
+        )
+
+    def enviar_arquivo(self, chave: str, caminho: str, content_type: str = "application/pdf"):
+        self.cliente.upload_file(
+            caminho, self.bucket, self._chave(chave),
+            ExtraArgs={"ContentType": content_type}, Config=self.transferencia
+        )
+
+    def abrir(self, chave: str, inicio: int = 0):
+        parametros = {"Bucket": self.bucket, "Key": self._chave(chave)}
+        if inicio:
+            parametros["Range"] = f"bytes={inicio}-"
+        return self.cliente.get_object(**parametros)["Body"]
+
+    def ler(self, chave: str) -> bytes:
+        return self.abrir(chave).read()
+
+    def info(self, chave: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            cabecalho = self.cliente.head_object(Bucket=self.bucket, Key=self._chave(chave))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {
+            "tamanho": cabecalho["ContentLength"],
+            "versao": cabecalho["ETag"].strip('"'),
+            "modificado": cabecalho["LastModified"].timestamp(),
+        }
+
+    def existe(self, chave: str) -> bool:
+        return self.info(chave) is not None
+
+    def remover(self, chave: str):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._chave(chave))
+
+    def listar(self, prefixo: str = ""):
+        paginas = self.cliente.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=self._chave(prefixo)
+        )
+        for pagina in paginas:
+            for objeto in pagina.get("Contents", ()):
+                yield objeto["Key"][len(self.prefixo):]
+
+    def listar_com_info(self, prefixo: str = ""):
+        paginas = self.cliente.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=self._chave(prefixo)
+        )
+        for pagina in paginas:
+            for objeto in pagina.get("Contents", ()):
+                yield objeto["Key"][len(self.prefixo):], {
+                    "tamanho": objeto["Size"],
+                    "modificado": objeto["LastModified"].timestamp(),
+                }
+
+    def mover(self, origem: str, destino: str):
+        # Cópia no próprio bucket (sem trafegar os dados) e remoção da origem
+        self.cliente.copy(
+            {"Bucket": self.bucket, "Key": self._chave(origem)}, self.bucket, self._chave(destino),
+            Config=self.transferencia
+        )
+        self.remover(origem)
+
+    def caminho_local(self, chave: str):
+        return None
+
+    def url_assinada(self, chave: str, expira: int = None, nome_download: str = None):
+        parametros = {"Bucket": self.bucket, "Key": self._chave(chave)}
+        if nome_download:
+            parametros["ResponseContentDisposition"] = f'attachment; filename="{nome_download}"'
+        return self.cliente.generate_presigned_url(
+            "get_object", Params=parametros, ExpiresIn=expira or S3_URL_EXPIRA
+        )
+
+    @contextmanager
+    def arquivos_locais(self, chaves: list):
+        """Baixa as chaves em paralelo para uma pasta temporária, apagada ao sair do bloco."""
+        with tempfile.TemporaryDirectory(prefix="certidoes_") as pasta:
+            destinos = [os.path.join(pasta, f"{i:05d}.pdf") for i in range(len(chaves))]
+
+            def baixar(par):
+                chave, destino = par
+                if not self.existe(chave):
+                    return None
+                self.cliente.download_file(self.bucket, self._chave(chave), destino, Config=self.transferencia)
+                return destino
+
+            with ThreadPoolExecutor(max_workers=S3_CONCORRENCIA) as executor:
+                baixados = list(executor.map(baixar, zip(chaves, destinos)))
+            yield [destino for destino in baixados if destino]
+
+
+# =======================
+# INSTÂNCIA DO PROCESSO
+# =======================
+
+_armazenamento = None
+_armazenamento_lock = threading.Lock()
+
+
+def get_armazenamento():
+    """Armazenamento configurado por ARMAZENAMENTO (criado no primeiro uso)."""
+    global _armazenamento
+    if _armazenamento is None:
+        with _armazenamento_lock:
+            if _armazenamento is None:
+                _armazenamento = ArmazenamentoS3() if ARMAZENAMENTO == "s3" else ArmazenamentoLocal()
+    return _armazenamento
+
+
+def definir_armazenamento(armazenamento):
+    """Troca o armazenamento do processo (ex.: outro bucket)."""
+    global _armazenamento
+    _armazenamento = armazenamento
+
+
+def chave_do_valor(valor: str):
+    """Chave de armazenamento a partir do que está gravado no banco (nome do arquivo ou URL antiga .../files/<nome>)."""
+    if not valor:
+        return None
+    return os.path.basename(valor.split("?", 1)[0].rstrip("/")) or None
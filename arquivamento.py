@@ -0,0 +1,316 @@
+# Arquivamento das análises antigas (tabelas quentes x arquivo comprimido)
+# arquivamento.py
+#
+# Uso: python manage.py arquivar [--meses N] [--simular] [--restaurar ID]
+#
+# Análises concluídas com data anterior a ARQUIVAR_APOS_MESES saem das tabelas
+# quentes (analise, imovel, proprietario, esposa_socio, certidao_job e
+# certidao_resultado) e vão para analise_arquivo. As colunas da análise continuam
+# em colunas, então listagens e filtros por usuário/data não descomprimem nada; as
+# linhas de todas as tabelas ficam num JSON comprimido com zlib. proprietario_arquivo
+# leva cada proprietário arquivado à sua análise. Os endpoints de leitura consultam
+# o arquivo quando a análise não está nas tabelas quentes (ver respostas.py e app.py);
+# documento_arquivo leva cada CPF/CNPJ arquivado às suas análises (consulta_documento.py).
+#
+# Particionamento por data (PARTITION BY RANGE em analise.data) não serve aqui: o
+# InnoDB não aceita chave estrangeira em tabela particionada e a chave primária
+# teria de incluir a data. Os ids arquivados não voltam a ser usados: o MySQL 8
+# persiste o contador do AUTO_INCREMENT.
+import base64
+import logging
+import os
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+import orjson
+from sqlalchemy import Date, DateTime, LargeBinary, delete, insert, select
+from sqlalchemy.orm import Session
+
+from cache import invalidar_analise
+from documentos import normalizar
+from eventos import STATUS_FINAIS
+from models import (
+    Analise, AnaliseArquivada, CertidaoJob, CertidaoResultado, DocumentoArquivado, EsposaSocio, Imovel,
+    Proprietario, ProprietarioArquivado, StatusCertidao,
+)
+
+logger = logging.getLogger(__name__)
+
+# Idade (pela data da análise) a partir da qual uma análise concluída é arquivada
+ARQUIVAR_APOS_MESES = int(os.getenv("ARQUIVAR_APOS_MESES", "12"))
+# Análises por transação e pausa (segundos) entre lotes, para não disputar o banco com a API
+ARQUIVAR_LOTE = int(os.getenv("ARQUIVAR_LOTE", "200"))
+ARQUIVAR_PAUSA = float(os.getenv("ARQUIVAR_PAUSA", "0.5"))
+
+# Tabelas de uma análise, na ordem de inserção (pais antes dos filhos)
+MODELOS = (Analise, Imovel, Proprietario, EsposaSocio, CertidaoJob, CertidaoResultado)
+_ATRIBUTOS = {
+    modelo.__tablename__: {prop.columns[0].name: prop.key for prop in modelo.__mapper__.column_attrs}
+    for modelo in MODELOS
+}
+_COLUNAS = {modelo.__tablename__: {coluna.name: coluna for coluna in modelo.__table__.columns} for modelo in MODELOS}
+
+
+# =======================
+# CONTEÚDO (JSON comprimido)
+# =======================
+
+def _para_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, bytes):
+        return base64.b64encode(valor).decode()
+    return valor
+
+
+def _de_json(coluna, valor):
+    if valor is None:
+        return None
+    if isinstance(coluna.type, DateTime):
+        return datetime.fromisoformat(valor)
+    if isinstance(coluna.type, Date):
+        return date.fromisoformat(valor)
+    if isinstance(coluna.type, LargeBinary):
+        return base64.b64decode(valor)
+    return valor
+
+
+def comprimir(linhas: dict) -> bytes:
+    """{tabela: [linhas com os nomes das colunas do banco]} -> zlib(JSON)."""
+    return zlib.compress(orjson.dumps({
+        tabela: [{coluna: _para_json(valor) for coluna, valor in linha.items()} for linha in registros]
+        for tabela, registros in linhas.items()
+    }, option=orjson.OPT_NON_STR_KEYS), 6)  # nomes de coluna do SQLAlchemy são subclasses de str
+
+
+def descomprimir(conteudo: bytes) -> dict:
+    return orjson.loads(zlib.decompress(conteudo))
+
+
+def linhas_arquivadas(db: Session, analise_id: int, tipados: bool = False):
+    """
+    Linhas da análise arquivada por tabela, com os nomes dos atributos dos modelos
+    (id, analise_id, ...), como nas consultas às tabelas quentes. None se não está no arquivo.
+    tipados=True devolve datas como date/datetime e binários como bytes, em vez dos
+    valores do JSON (ISO 8601 e base64).
+    """
+    conteudo = db.execute(select(AnaliseArquivada.conteudo).where(AnaliseArquivada.id == analise_id)).scalar()
+    if conteudo is None:
+        return None
+    linhas = {}
+    for tabela, registros in descomprimir(conteudo).items():
+        atributos, colunas = _ATRIBUTOS[tabela], _COLUNAS[tabela]
+        linhas[tabela] = [
+            {atributos[coluna]: _de_json(colunas[coluna], valor) if tipados else valor for coluna, valor in linha.items()}
+            for linha in registros
+        ]
+    return linhas
+
+
+def analise_arquivada(db: Session, analise_id: int) -> bool:
+    return db.execute(select(AnaliseArquivada.id).where(AnaliseArquivada.id == analise_id)).first() is not None
+
+
+def analise_do_proprietario(db: Session, proprietario_id: int):
+    return db.execute(
+        select(ProprietarioArquivado.analise_id).where(ProprietarioArquivado.id == proprietario_id)
+    ).scalar()
+
+
+def analises_do_documento(db: Session, documento: str) -> list:
+    return db.execute(
+        select(DocumentoArquivado.analise_id).where(DocumentoArquivado.documento == documento)
+    ).scalars().all()
+
+
+def documentos_da_analise(linhas: dict) -> set:
+    """CPFs/CNPJs (só dígitos) de proprietários, representantes e cônjuges de uma análise."""
+    documentos = set()
+    for linha in linhas.get("proprietario", []):
+        documentos.add(linha.get("documento") or normalizar(linha.get("cpf_cnpj")))
+        documentos.add(linha.get("documento_representante") or normalizar(linha.get("cpf_representante")))
+    for linha in linhas.get("esposa_socio", []):
+        documentos.add(linha.get("documento") or normalizar(linha.get("cpf")))
+    documentos.discard(None)
+    documentos.discard("")
+    return documentos
+
+
+# =======================
+# ARQUIVAMENTO
+# =======================
+
+def _linhas_do_banco(db: Session, analise_ids: list) -> dict:
+    """analise_id -> {tabela: [linhas]} de um lote de análises, com um SELECT por tabela."""
+    por_analise = {analise_id: {modelo.__tablename__: [] for modelo in MODELOS} for analise_id in analise_ids}
+
+    def distribuir(modelo, consulta, analise_de):
+        for linha in db.execute(consulta).mappings():
+            por_analise[analise_de(linha)][modelo.__tablename__].append(dict(linha))
+
+    tabela = Analise.__table__
+    distribuir(Analise, select(tabela).where(tabela.c.id_analise.in_(analise_ids)), lambda l: l["id_analise"])
+    for modelo in (Imovel, Proprietario, CertidaoJob, CertidaoResultado):
+        tabela = modelo.__table__
+        distribuir(modelo, select(tabela).where(tabela.c.analise_id.in_(analise_ids)), lambda l: l["analise_id"])
+    analise_do_prop = {
+        linha["id_proprietario"]: analise_id
+        for analise_id, linhas in por_analise.items() for linha in linhas["proprietario"]
+    }
+    if analise_do_prop:
+        tabela = EsposaSocio.__table__
+        distribuir(
+            EsposaSocio,
+            select(tabela).where(tabela.c.proprietario_id.in_(list(analise_do_prop))),
+            lambda l: analise_do_prop[l["proprietario_id"]],
+        )
+    return por_analise
+
+
+def _arquivos(linhas: dict) -> str:
+    """Valores das colunas de arquivo (pdf_*, link_pdf, arquivo*), um por linha, para o gc_arquivos."""
+    valores = []
+    for registros in linhas.values():
+        for linha in registros:
+            valores += [
+                valor for coluna, valor in linha.items()
+                if valor and (coluna.startswith("pdf_") or coluna in ("link_pdf", "arquivo", "arquivo_url"))
+            ]
+    return "\n".join(dict.fromkeys(valores))
+
+
+def _arquivar_lote(db: Session, analise_ids: list) -> list:
+    # Trava as análises e confere de novo: uma nova emissão pode ter começado depois da seleção
+    analise_ids = db.execute(
+        select(Analise.id)
+        .where(Analise.id.in_(analise_ids), Analise.status.in_(STATUS_FINAIS))
+        .with_for_update()
+    ).scalars().all()
+    if not analise_ids:
+        db.rollback()
+        return []
+    # Job ainda pendente/executando (emissão em curso): fica para a próxima passada
+    ocupadas = set(db.execute(
+        select(CertidaoJob.analise_id).where(
+            CertidaoJob.analise_id.in_(analise_ids),
+            CertidaoJob.status.in_([StatusCertidao.pendente.value, StatusCertidao.executando.value]),
+        )
+    ).scalars())
+    analise_ids = [analise_id for analise_id in analise_ids if analise_id not in ocupadas]
+    if not analise_ids:
+        db.rollback()
+        return []
+
+    por_analise = _linhas_do_banco(db, analise_ids)
+    colunas_analise = [coluna.key for coluna in AnaliseArquivada.__table__.columns if coluna.key in Analise.__table__.c]
+    arquivadas, proprietarios, documentos = [], [], []
+    agora = datetime.utcnow()
+    for analise_id, linhas in por_analise.items():
+        analise = linhas["analise"][0]
+        registro = {coluna: analise[coluna] for coluna in colunas_analise}
+        registro.update(arquivos=_arquivos(linhas), conteudo=comprimir(linhas), arquivada_em=agora)
+        arquivadas.append(registro)
+        proprietarios += [
+            {"id_proprietario": linha["id_proprietario"], "analise_id": analise_id} for linha in linhas["proprietario"]
+        ]
+        documentos += [
+            {"documento": documento, "analise_id": analise_id} for documento in sorted(documentos_da_analise(linhas))
+        ]
+    db.execute(insert(AnaliseArquivada.__table__), arquivadas)
+    if proprietarios:
+        db.execute(insert(ProprietarioArquivado.__table__), proprietarios)
+    if documentos:
+        db.execute(insert(DocumentoArquivado.__table__), documentos)
+
+    proprietario_ids = [linha["id_proprietario"] for linha in proprietarios]
+    if proprietario_ids:
+        db.execute(delete(EsposaSocio).where(EsposaSocio.proprietario_id.in_(proprietario_ids)))
+    for modelo in (CertidaoResultado, CertidaoJob, Proprietario, Imovel):
+        db.execute(delete(modelo).where(modelo.analise_id.in_(analise_ids)))
+    db.execute(delete(Analise).where(Analise.id.in_(analise_ids)))
+    db.commit()
+    for analise_id in analise_ids:
+        invalidar_analise(analise_id)
+    return analise_ids
+
+
+def arquivar(db: Session, meses: int = ARQUIVAR_APOS_MESES, simular: bool = False, limite: int = None) -> dict:
+    """
+    Move para analise_arquivo as análises concluídas com data anterior a `meses`
+    meses, um lote (uma transação) por vez. Retorna as contagens.
+    """
+    corte = datetime.utcnow() - timedelta(days=30 * meses)
+    consulta = (
+        select(Analise.id)
+        .where(Analise.data < corte, Analise.status.in_(STATUS_FINAIS))
+        .order_by(Analise.id)
+    )
+    estatisticas = {"candidatas": 0, "arquivadas": 0}
+    ultimo = 0
+    while limite is None or estatisticas["arquivadas"] < limite:
+        tamanho = ARQUIVAR_LOTE if limite is None else min(ARQUIVAR_LOTE, limite - estatisticas["arquivadas"])
+        ids = db.execute(consulta.where(Analise.id > ultimo).limit(tamanho)).scalars().all()
+        if not ids:
+            break
+        ultimo = ids[-1]
+        estatisticas["candidatas"] += len(ids)
+        if simular:
+            db.rollback()
+            continue
+        estatisticas["arquivadas"] += len(_arquivar_lote(db, ids))
+        logger.info("Arquivamento: %s", estatisticas)
+        time.sleep(ARQUIVAR_PAUSA)
+    return estatisticas
+
+
+def restaurar(db: Session, analise_id: int) -> bool:
+    """Devolve uma análise arquivada às tabelas quentes (ex.: para reemitir certidões)."""
+    registro = db.execute(
+        select(AnaliseArquivada.conteudo).where(AnaliseArquivada.id == analise_id).with_for_update()
+    ).scalar()
+    if registro is None:
+        return False
+    linhas = descomprimir(registro)
+    for modelo in MODELOS:
+        tabela = modelo.__table__
+        registros = [
+            {coluna.name: _de_json(coluna, linha.get(coluna.name)) for coluna in tabela.columns}
+            for linha in linhas.get(tabela.name, [])
+        ]
+        if registros:
+            db.execute(insert(tabela), registros)
+    db.execute(delete(ProprietarioArquivado).where(ProprietarioArquivado.analise_id == analise_id))
+    db.execute(delete(DocumentoArquivado).where(DocumentoArquivado.analise_id == analise_id))
+    db.execute(delete(AnaliseArquivada).where(AnaliseArquivada.id == analise_id))
+    db.commit()
+    invalidar_analise(analise_id)
+    return True
+
+
+def indexar_documentos(db: Session) -> int:
+    """
+    Preenche documento_arquivo para as análises arquivadas antes da tabela existir
+    (as que ainda não têm nenhuma linha nela). Retorna quantas foram indexadas.
+    """
+    sem_indice = (
+        select(AnaliseArquivada.id)
+        .where(~select(DocumentoArquivado.analise_id).where(DocumentoArquivado.analise_id == AnaliseArquivada.id).exists())
+        .order_by(AnaliseArquivada.id)
+    )
+    indexadas, ultimo = 0, 0
+    while True:
+        ids = db.execute(sem_indice.where(AnaliseArquivada.id > ultimo).limit(ARQUIVAR_LOTE)).scalars().all()
+        if not ids:
+            return indexadas
+        ultimo = ids[-1]
+        documentos = []
+        for analise_id in ids:
+            linhas = linhas_arquivadas(db, analise_id)
+            documentos += [
+                {"documento": documento, "analise_id": analise_id} for documento in sorted(documentos_da_analise(linhas))
+            ]
+            indexadas += 1
+        if documentos:
+            db.execute(insert(DocumentoArquivado.__table__), documentos)
+        db.commit()
@@ -0,0 +1,66 @@
+# Compara a validação de CPF/CNPJ documento a documento com a validação em lote
+# benchmarks/bench_documentos.py
+#
+# Uso (na raiz do projeto):
+#   python benchmarks/bench_documentos.py --documentos 100000
+#
+# Gera CPFs e CNPJs aleatórios (metade com dígitos verificadores corretos,
+# com e sem pontuação) e mede documentos.documento_valido em laço contra
+# documentos.validar_em_lote (vetorizado com numpy, se instalado).
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documentos import _PESOS_CNPJ, _PESOS_CPF, _dv_cnpj, _dv_cpf, documento_valido, validar_em_lote
+
+
+def gerar(tamanho: int, pesos: tuple, dv, valido: bool) -> str:
+    numeros = [random.randint(0, 9) for _ in range(tamanho - 2)]
+    for pesos_dv in pesos:
+        numeros.append(dv(sum(n * p for n, p in zip(numeros, pesos_dv))))
+    if not valido:
+        numeros[-1] = (numeros[-1] + 1) % 10
+    digitos = "".join(map(str, numeros))
+    if random.random() < 0.5:
+        return digitos
+    if tamanho == 11:
+        return f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+    return f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documentos", type=int, default=100000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    documentos = [
+        gerar(11, _PESOS_CPF, _dv_cpf, i % 2 == 0) if i % 3 else gerar(14, _PESOS_CNPJ, _dv_cnpj, i % 2 == 0)
+        for i in range(args.documentos)
+    ]
+
+    inicio = time.perf_counter()
+    um_a_um = [documento_valido(documento) for documento in documentos]
+    tempo_laco = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    em_lote = validar_em_lote(documentos)
+    tempo_lote = time.perf_counter() - inicio
+
+    assert um_a_um == em_lote
+    try:
+        import numpy  # noqa: F401
+        motor = "numpy"
+    except ImportError:
+        motor = "python (numpy não instalado)"
+    print(f"{args.documentos} documentos, {sum(em_lote)} válidos; lote: {motor}")
+    for nome, tempo in (("um a um", tempo_laco), ("em lote", tempo_lote)):
+        print(f"{nome:<8} {tempo * 1000:>9.1f} ms  {tempo / args.documentos * 1e6:>6.2f} µs/documento")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Compara a mesclagem por páginas (relatorio_pdf.mesclar_pdfs) com o PdfMerger
+# benchmarks/bench_merge.py
+#
+# Uso (na raiz do projeto):
+#   python benchmarks/bench_merge.py --certidoes 60 --paginas 4 --imagem-kb 256
+#
+# Gera PDFs sintéticos parecidos com certidões (texto comprimido + uma imagem
+# por página), mescla com os dois motores e mostra tempo e pico de memória
+# Python (tracemalloc). Cada motor roda em um processo próprio, para um não
+# herdar o heap do outro.
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+MOTORES = ("streaming", "pdfmerger")
+
+
+def gerar_certidao(caminho: str, paginas: int, imagem_kb: int):
+    writer = PdfWriter()
+    for numero in range(paginas):
+        writer.add_blank_page(595, 842)
+        pagina = writer.pages[-1]
+        imagem = StreamObject()
+        imagem._data = os.urandom(imagem_kb * 1024)
+        lado = int((imagem_kb * 1024 / 3) ** 0.5)
+        imagem.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(lado),
+            NameObject("/Height"): NumberObject(lado),
+            NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+        })
+        texto = "".join(
+            f"BT /F1 10 Tf 40 {800 - linha * 14} Td (CERTIDAO {numero} - linha {linha} - NADA CONSTA) Tj ET\n"
+            for linha in range(50)
+        ) + "q 100 0 0 100 400 40 cm /Im0 Do Q\n"
+        conteudo = DecodedStreamObject()
+        conteudo.set_data(zlib.compress(texto.encode()))
+        conteudo[NameObject("/Filter")] = NameObject("/FlateDecode")
+        pagina[NameObject("/Contents")] = writer._add_object(conteudo)
+        pagina[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): writer._add_object(imagem)}),
+        })
+    with open(caminho, "wb") as arquivo:
+        writer.write(arquivo)
+
+
+def medir(motor: str, caminhos: list, destino: str) -> dict:
+    from relatorio_pdf import mesclar_pdfs_pdfmerger, _mesclar_streaming
+
+    funcao = _mesclar_streaming if motor == "streaming" else mesclar_pdfs_pdfmerger
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    paginas = funcao(caminhos, destino)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"paginas": paginas, "segundos": duracao, "pico_mb": pico / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--certidoes", type=int, default=40)
+    parser.add_argument("--paginas", type=int, default=3, help="páginas por certidão")
+    parser.add_argument("--imagem-kb", type=int, default=128, help="tamanho da imagem de cada página")
+    parser.add_argument("--motor", choices=MOTORES, help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.motor:
+        # Processo filho: mede um motor sobre as certidões já geradas
+        caminhos = sorted(
+            os.path.join(args.dir, nome) for nome in os.listdir(args.dir) if nome.startswith("certidao_")
+        )
+        destino = os.path.join(args.dir, f"mesclado_{args.motor}.pdf")
+        r = medir(args.motor, caminhos, destino)
+        print(f"{r['paginas']} {r['segundos']:.4f} {r['pico_mb']:.2f} {os.path.getsize(destino)}")
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for i in range(args.certidoes):
+            gerar_certidao(os.path.join(pasta, f"certidao_{i:04d}.pdf"), args.paginas, args.imagem_kb)
+        total = sum(os.path.getsize(os.path.join(pasta, nome)) for nome in os.listdir(pasta))
+        print(f"{args.certidoes} certidões x {args.paginas} páginas, {total / 2**20:.1f} MB de entrada\n")
+        print(f"{'motor':<10} {'páginas':>8} {'tempo (s)':>10} {'pico (MB)':>10} {'saída (MB)':>11}")
+        for motor in MOTORES:
+            saida = subprocess.run(
+                [sys.executable, __file__, "--motor", motor, "--dir", pasta],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            paginas, segundos, pico, tamanho = int(saida[0]), float(saida[1]), float(saida[2]), int(saida[3])
+            conferidas = len(PdfReader(os.path.join(pasta, f"mesclado_{motor}.pdf")).pages)
+            assert conferidas == paginas == args.certidoes * args.paginas, (motor, conferidas, paginas)
+            print(f"{motor:<10} {paginas:>8} {segundos:>10.3f} {pico:>10.1f} {tamanho / 2**20:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
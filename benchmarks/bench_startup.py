@@ -0,0 +1,71 @@
+# Mede o tempo de partida a frio da API (import + criar_app) em processos novos
+# benchmarks/bench_startup.py
+#
+# Uso (na raiz do projeto):
+#   python benchmarks/bench_startup.py --rodadas 15
+#
+# "atual" importa app e monta a aplicação como um worker faz ao subir.
+# "eager" faz o mesmo e em seguida carrega o que antes vinha junto no import
+# (requests, PyPDF2, driver do banco via create_engine), para comparação.
+# Nenhum dos cenários conecta ao banco; a partida anterior ainda somava o
+# round-trip do create_all, que não entra na conta.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+app.criar_app()
+if {eager}:
+    import requests, PyPDF2, db
+    try:
+        db.get_engine()
+    except ImportError:
+        pass  # driver do banco não instalado neste ambiente
+duracao = time.perf_counter() - inicio
+import db
+print(json.dumps({{
+    "segundos": duracao,
+    "modulos": len(sys.modules),
+    "requests": "requests" in sys.modules,
+    "PyPDF2": "PyPDF2" in sys.modules,
+    "engine": db._engine is not None,
+}}))
+"""
+
+CENARIOS = {"atual": False, "eager": True}
+
+
+def rodar(eager: bool) -> dict:
+    saida = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(eager=eager)],
+        cwd=RAIZ, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rodadas", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'cenário':<8} {'mediana (ms)':>13} {'p90 (ms)':>9} {'módulos':>8}  requests  PyPDF2  engine")
+    for nome, eager in CENARIOS.items():
+        resultados = [rodar(eager) for _ in range(args.rodadas)]
+        tempos = sorted(r["segundos"] * 1000 for r in resultados)
+        ultimo = resultados[-1]
+        print(
+            f"{nome:<8} {statistics.median(tempos):>13.1f} {tempos[int(len(tempos) * 0.9) - 1]:>9.1f} "
+            f"{ultimo['modulos']:>8}  {str(ultimo['requests']):<8}  {str(ultimo['PyPDF2']):<6}  {ultimo['engine']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
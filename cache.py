@@ -0,0 +1,243 @@
+# Cache de respostas das análises (JSON já serializado)
+# cache.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db import DATABASE_REPLICA_URLS, REPLICA_ATRASO_MAXIMO, REPLICA_VERIFICAR_A_CADA
+
+# Quantidade máxima de respostas mantidas em memória por processo
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "2048"))
+# Validade (segundos) das entradas em memória
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+# Arquivo SQLite compartilhado entre os workers da mesma máquina (opcional)
+CACHE_COMPARTILHADO = os.getenv("CACHE_COMPARTILHADO")
+# Com o backend compartilhado, a memória local vira um L1 curto: a invalidação
+# feita por outro worker só apaga o L2, então o L1 não pode viver muito
+CACHE_TTL_LOCAL = int(os.getenv("CACHE_TTL_LOCAL", "2"))
+
+
+class CacheLRU:
+    """LRU em memória com TTL, seguro para uso entre threads."""
+
+    def __init__(self, max_itens: int, ttl: int):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave: str, valor: bytes):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave: str):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class CacheSQLite:
+    """
+    Backend compartilhado em um arquivo SQLite local: todos os workers da
+    máquina enxergam as mesmas entradas e as mesmas invalidações.
+    """
+
+    def __init__(self, caminho: str, ttl: int):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conexao(self):
+        # Uma conexão por thread; WAL permite leitores concorrentes entre processos
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # A tabela é criada na primeira conexão, não ao importar o módulo
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_respostas "
+                "(chave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira_em REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def obter(self, chave: str):
+        linha = self._conexao().execute(
+            "SELECT valor FROM cache_respostas WHERE chave = ? AND expira_em > ?",
+            (chave, time.time())
+        ).fetchone()
+        return bytes(linha[0]) if linha else None
+
+    def guardar(self, chave: str, valor: bytes):
+        self._conexao().execute(
+            "INSERT OR REPLACE INTO cache_respostas (chave, valor, expira_em) VALUES (?, ?, ?)",
+            (chave, valor, time.time() + self.ttl)
+        )
+
+    def remover(self, chave: str):
+        self._conexao().execute("DELETE FROM cache_respostas WHERE chave = ?", (chave,))
+
+    def limpar(self):
+        self._conexao().execute("DELETE FROM cache_respostas")
+
+
+class CacheRespostas:
+    """
+    Read-through em dois níveis: LRU do processo e, se configurado, o backend
+    compartilhado. Guarda bytes JSON prontos para devolver sem tocar no banco
+    nem no Pydantic.
+    """
+
+    def __init__(self, local: CacheLRU, compartilhado=None):
+        self.local = local
+        self.compartilhado = compartilhado
+
+    def obter(self, chave: str):
+        valor = self.local.obter(chave)
+        if valor is None and self.compartilhado is not None:
+            valor = self.compartilhado.obter(chave)
+            if valor is not None:
+                self.local.guardar(chave, valor)
+        return valor
+
+    def guardar(self, chave: str, valor: bytes):
+        self.local.guardar(chave, valor)
+        if self.compartilhado is not None:
+            self.compartilhado.guardar(chave, valor)
+
+    def remover(self, chave: str):
+        self.local.remover(chave)
+        if self.compartilhado is not None:
+            self.compartilhado.remover(chave)
+
+    def obter_ou_gerar(self, chave: str, gerar):
+        """Devolve a entrada do cache ou chama `gerar()`; None (não encontrado) não é guardado."""
+        valor = self.obter(chave)
+        if valor is None:
+            valor = gerar()
+            if valor is not None:
+                self.guardar(chave, valor)
+        return valor
+
+
+def _criar_cache() -> CacheRespostas:
+    if CACHE_COMPARTILHADO:
+        return CacheRespostas(
+            CacheLRU(CACHE_MAX_ITENS, min(CACHE_TTL, CACHE_TTL_LOCAL)),
+            CacheSQLite(CACHE_COMPARTILHADO, CACHE_TTL)
+        )
+    return CacheRespostas(CacheLRU(CACHE_MAX_ITENS, CACHE_TTL))
+
+
+cache_respostas = _criar_cache()
+
+
+# =======================
+# CHAVES DAS ANÁLISES
+# =======================
+
+def chave_analise(analise_id: int) -> str:
+    return f"analise:{analise_id}"
+
+
+def chave_analise_full(analise_id: int) -> str:
+    return f"analise_full:{analise_id}"
+
+
+def _remover_analise(analise_id: int):
+    cache_respostas.remover(chave_analise(analise_id))
+    cache_respostas.remover(chave_analise_full(analise_id))
+
+
+# =======================
+# ESCRITAS x RÉPLICAS
+# =======================
+
+# Depois de uma escrita, uma réplica pode devolver a versão antiga por até esse tempo (segundos)
+JANELA_REPLICA = REPLICA_ATRASO_MAXIMO + REPLICA_VERIFICAR_A_CADA
+
+
+class Varredor:
+    """
+    Remoções adiadas com uma única thread: cada análise invalidada é removida de
+    novo `atraso` segundos depois. Invalidações repetidas da mesma análise dentro
+    desse tempo viram uma remoção só, e a análise fica marcada como recém-escrita.
+    """
+
+    def __init__(self, atraso: float, remover):
+        self.atraso = atraso
+        self.remover = remover
+        # analise_id -> instante da remoção; atraso fixo, então a ordem de inserção é a dos instantes
+        self._agendadas = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def agendar(self, analise_id: int):
+        with self._cond:
+            self._agendadas.pop(analise_id, None)
+            self._agendadas[analise_id] = time.monotonic() + self.atraso
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._varrer, name="cache-varredor", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def recente(self, analise_id: int) -> bool:
+        with self._cond:
+            return analise_id in self._agendadas
+
+    def _varrer(self):
+        while True:
+            with self._cond:
+                while not self._agendadas:
+                    self._cond.wait()
+                analise_id, quando = next(iter(self._agendadas.items()))
+                espera = quando - time.monotonic()
+                if espera > 0:
+                    self._cond.wait(espera)
+                    continue
+                del self._agendadas[analise_id]
+            self.remover(analise_id)
+
+
+_varredor = Varredor(JANELA_REPLICA, _remover_analise)
+
+
+def invalidar_analise(analise_id: int):
+    """Remove as respostas em cache da análise. Chamar após o commit de qualquer escrita nela."""
+    _remover_analise(analise_id)
+    if DATABASE_REPLICA_URLS:
+        # Uma leitura numa réplica ainda atrasada pode recolocar a versão antiga no cache
+        # (inclusive em outro worker); a segunda remoção, passada a janela, descarta essa entrada
+        _varredor.agendar(analise_id)
+
+
+def obter_ou_gerar_analise(analise_id: int, chave: str, gerar):
+    """
+    obter_ou_gerar das respostas de uma análise. Dentro da janela de atraso das
+    réplicas após uma escrita neste processo, a resposta gerada pode ter vindo de
+    uma réplica atrasada: é devolvida, mas não vai para o cache.
+    """
+    if not DATABASE_REPLICA_URLS or not _varredor.recente(analise_id):
+        return cache_respostas.obter_ou_gerar(chave, gerar)
+    return cache_respostas.obter(chave) or gerar()
@@ -0,0 +1,197 @@
+# Busca de uma pessoa (CPF/CNPJ) em todas as análises
+# consulta_documento.py
+from datetime import datetime
+
+from typing import List
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import and_, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from arquivamento import analises_do_documento, linhas_arquivadas
+from db import get_db_leitura
+from documentos import normalizar, tipo_documento, validar_em_lote
+from models import Analise, CertidaoJob, CertidaoResultado, EsposaSocio, Proprietario, StatusCertidao
+from urls import resolver
+
+router = APIRouter()
+
+# Papel da pessoa na análise
+PAPEL_PROPRIETARIO = "proprietario"
+PAPEL_REPRESENTANTE = "representante"
+PAPEL_CONJUGE = "conjuge"
+
+
+def _colunas_analise(papel: str, nome):
+    return [
+        Analise.id.label("analise_id"),
+        Analise.status.label("status"),
+        Analise.data.label("data"),
+        Analise.risco.label("risco"),
+        literal(papel).label("papel"),
+        Proprietario.id.label("proprietario_id"),
+        nome.label("nome"),
+    ]
+
+
+_SEM_CERTIDAO = [
+    null().label("emissor"),
+    null().label("finalizado_em"),
+    null().label("arquivo"),
+    null().label("validade"),
+    null().label("pendencia"),
+]
+
+
+def consulta_documento(documento: str):
+    """
+    Um único SELECT (UNION ALL de três buscas pelos índices de documento):
+    o documento como proprietário (com as certidões emitidas com sucesso para
+    ele, não para o representante; certidao_job.documento guarda só dígitos),
+    como representante da empresa e como cônjuge/sócio.
+    """
+    como_proprietario = (
+        select(
+            *_colunas_analise(PAPEL_PROPRIETARIO, Proprietario.nome_razao),
+            CertidaoJob.emissor.label("emissor"),
+            CertidaoJob.finalizado_em.label("finalizado_em"),
+            CertidaoJob.arquivo.label("arquivo"),
+            CertidaoResultado.validade.label("validade"),
+            CertidaoResultado.pendencia.label("pendencia"),
+        )
+        .join(Analise, Analise.id == Proprietario.analise_id)
+        .outerjoin(CertidaoJob, and_(
+            CertidaoJob.proprietario_id == Proprietario.id,
+            CertidaoJob.documento == documento,
+            CertidaoJob.status == StatusCertidao.sucesso.value,
+        ))
+        .outerjoin(CertidaoResultado, CertidaoResultado.job_id == CertidaoJob.id)
+        .where(Proprietario.documento == documento)
+    )
+    como_representante = (
+        select(*_colunas_analise(PAPEL_REPRESENTANTE, Proprietario.nome_representante), *_SEM_CERTIDAO)
+        .join(Analise, Analise.id == Proprietario.analise_id)
+        .where(Proprietario.documento_representante == documento)
+    )
+    como_conjuge = (
+        select(*_colunas_analise(PAPEL_CONJUGE, EsposaSocio.nome), *_SEM_CERTIDAO)
+        .select_from(EsposaSocio)
+        .join(Proprietario, Proprietario.id == EsposaSocio.proprietario_id)
+        .join(Analise, Analise.id == Proprietario.analise_id)
+        .where(EsposaSocio.documento == documento)
+    )
+    return union_all(como_proprietario, como_representante, como_conjuge)
+
+
+def _do_arquivo(db: Session, documento: str) -> list:
+    """
+    As mesmas linhas de consulta_documento para as análises arquivadas em que o
+    documento aparece (documento_arquivo leva às análises; o conteúdo é descomprimido).
+    """
+    resultado = []
+    for analise_id in analises_do_documento(db, documento):
+        linhas = linhas_arquivadas(db, analise_id, tipados=True)
+        if not linhas:
+            continue
+        analise = linhas["analise"][0]
+        resultados = {linha["job_id"]: linha for linha in linhas["certidao_resultado"]}
+
+        def linha(papel, proprietario_id, nome, job=None):
+            certidao = resultados.get(job["id"], {}) if job else {}
+            return {
+                "analise_id": analise["id"], "status": analise["status"], "data": analise["data"],
+                "risco": analise["risco"], "papel": papel, "proprietario_id": proprietario_id, "nome": nome,
+                "emissor": job and job["emissor"], "finalizado_em": job and job["finalizado_em"],
+                "arquivo": job and job["arquivo"], "validade": certidao.get("validade"),
+                "pendencia": certidao.get("pendencia"),
+            }
+
+        for proprietario in linhas["proprietario"]:
+            if (proprietario["documento"] or normalizar(proprietario["cpf_cnpj"])) == documento:
+                jobs = [
+                    job for job in linhas["certidao_job"]
+                    if job["proprietario_id"] == proprietario["id"]
+                    and job["status"] == StatusCertidao.sucesso.value
+                    and normalizar(job["documento"]) == documento
+                ]
+                resultado += [linha(PAPEL_PROPRIETARIO, proprietario["id"], proprietario["nome_razao"], job) for job in jobs]
+                if not jobs:
+                    resultado.append(linha(PAPEL_PROPRIETARIO, proprietario["id"], proprietario["nome_razao"]))
+            if (proprietario["documento_representante"] or normalizar(proprietario["cpf_representante"])) == documento:
+                resultado.append(linha(PAPEL_REPRESENTANTE, proprietario["id"], proprietario["nome_representante"]))
+        for conjuge in linhas["esposa_socio"]:
+            if (conjuge["documento"] or normalizar(conjuge["cpf"])) == documento:
+                resultado.append(linha(PAPEL_CONJUGE, conjuge["proprietario_id"], conjuge["nome"]))
+    return resultado
+
+
+def buscar_documento(db: Session, documento: str):
+    """
+    Análises em que o documento aparece e a certidão mais recente de cada emissor,
+    incluindo as análises arquivadas.
+    """
+    analises, certidoes = {}, {}
+    linhas = list(db.execute(consulta_documento(documento)).mappings()) + _do_arquivo(db, documento)
+    for linha in linhas:
+        chave = (linha["analise_id"], linha["papel"], linha["proprietario_id"])
+        if chave not in analises:
+            analises[chave] = {
+                campo: linha[campo]
+                for campo in ("analise_id", "status", "data", "risco", "papel", "proprietario_id", "nome")
+            }
+        if linha["emissor"] is None:
+            continue
+        atual = certidoes.get(linha["emissor"])
+        if atual is None or (linha["finalizado_em"] or datetime.min) > (atual["finalizado_em"] or datetime.min):
+            certidoes[linha["emissor"]] = {
+                "emissor": linha["emissor"],
+                "analise_id": linha["analise_id"],
+                "finalizado_em": linha["finalizado_em"],
+                "validade": linha["validade"],
+                "pendencia": None if linha["pendencia"] is None else bool(linha["pendencia"]),
+                "arquivo": linha["arquivo"],
+            }
+    if not analises:
+        return None
+    for certidao in certidoes.values():
+        certidao["arquivo_url"] = resolver(certidao.pop("arquivo"))
+    return {
+        "documento": documento,
+        "tipo": tipo_documento(documento),
+        "analises": sorted(analises.values(), key=lambda analise: (analise["analise_id"], analise["papel"])),
+        "certidoes": sorted(certidoes.values(), key=lambda certidao: certidao["emissor"]),
+    }
+
+
+@router.post("/documentos/validar/")
+def validar_documentos(documentos: List[str] = Body(...), tipo: str = None):
+    """
+    Confere os dígitos verificadores de uma lista de CPFs/CNPJs (pré-validação de
+    importações em massa). tipo=CPF ou CNPJ restringe; sem tipo, vale o tamanho.
+    """
+    validos = validar_em_lote(documentos, tipo.upper() if tipo else None)
+    return ORJSONResponse({
+        "total": len(documentos),
+        "invalidos": [
+            {"indice": indice, "documento": documento}
+            for indice, (documento, valido) in enumerate(zip(documentos, validos)) if not valido
+        ],
+    })
+
+
+# path: o CNPJ pontuado tem '/' (12.345.678/0001-90)
+@router.get("/documentos/{documento:path}")
+def get_documento(documento: str, db: Session = Depends(get_db_leitura)):
+    """
+    Todas as análises em que o CPF/CNPJ aparece (como proprietário, representante
+    ou cônjuge/sócio) e as últimas certidões emitidas para ele. Aceita o documento
+    com ou sem pontuação.
+    """
+    digitos = normalizar(documento)
+    if not digitos:
+        raise HTTPException(status_code=400, detail="Documento inválido")
+    resultado = buscar_documento(db, digitos)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Documento não encontrado em nenhuma análise")
+    return ORJSONResponse(resultado)
@@ -1,24 +1,206 @@
+import itertools
+import logging
+import os
+import threading
+import time
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, Enum as SAEnum
+from fastapi import Request
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
+from sqlalchemy.orm import sessionmaker
 
 
 # Configurações do Banco de Dados
-DATABASE_URL = "mysql+mysqlconnector://root:@localhost/api_docs"
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-    pool_recycle=280
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+mysqlconnector://root:@localhost/api_docs")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Réplicas de leitura (URLs separadas por vírgula); vazio = tudo no primário
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Réplica com atraso acima disso (segundos) sai do rodízio até alcançar o primário
+REPLICA_ATRASO_MAXIMO = float(os.getenv("REPLICA_ATRASO_MAXIMO", "5"))
+# Intervalo entre medições do atraso de cada réplica
+REPLICA_VERIFICAR_A_CADA = float(os.getenv("REPLICA_VERIFICAR_A_CADA", "10"))
+# Depois de uma escrita, o mesmo cliente lê do primário por esse tempo (read-your-writes)
+LEITURA_APOS_ESCRITA = float(os.getenv("LEITURA_APOS_ESCRITA", str(2 * REPLICA_ATRASO_MAXIMO)))
+COOKIE_ESCRITA = "ultima_escrita"
+
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
+# O engine (e o driver do MySQL) só é criado na primeira sessão: importar os
+# módulos da API não abre conexão nem carrega o driver
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    DATABASE_URL,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_pre_ping=True,
+                    pool_recycle=280
+                )
+    return _engine
+
+
+def configurar_pool(pool_size: int, max_overflow: int):
+    """Ajusta o pool antes do primeiro uso (ex.: por worker, em servidor.py)."""
+    global DB_POOL_SIZE, DB_MAX_OVERFLOW
+    if _engine is not None or _replicas is not None:
+        raise RuntimeError("O engine já foi criado; configure o pool antes da primeira sessão")
+    DB_POOL_SIZE, DB_MAX_OVERFLOW = pool_size, max_overflow
+
+
+# =======================
+# RÉPLICAS DE LEITURA
+# =======================
+
+class _Replica:
+    """Engine de uma réplica e o último atraso medido (segundos; None = ainda não medido)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=280
+        )
+        self.atraso = None
+        self._medido_em = 0.0
+        self._medindo = threading.Lock()
+
+    def _medir(self) -> float:
+        if self.engine.dialect.name != "mysql":
+            return 0.0
+        with self.engine.connect() as conexao:
+            try:
+                status = conexao.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                campo = "Seconds_Behind_Source"
+            except Exception:
+                # MySQL < 8.0.22
+                status = conexao.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                campo = "Seconds_Behind_Master"
+        if status is None or status[campo] is None:
+            return float("inf")  # replicação parada ou servidor não é réplica
+        return float(status[campo])
+
+    def saudavel(self) -> bool:
+        # Uma thread mede por vez; as demais usam o último valor
+        if time.monotonic() - self._medido_em >= REPLICA_VERIFICAR_A_CADA and self._medindo.acquire(blocking=False):
+            try:
+                self.atraso = self._medir()
+            except Exception:
+                logger.warning("Réplica %s indisponível", self.engine.url.host, exc_info=True)
+                self.atraso = float("inf")
+            finally:
+                self._medido_em = time.monotonic()
+                self._medindo.release()
+        return self.atraso is not None and self.atraso <= REPLICA_ATRASO_MAXIMO
+
+
+_replicas = None
+_rodizio = None
+
+
+def _get_replicas() -> list:
+    global _replicas, _rodizio
+    if _replicas is None:
+        with _engine_lock:
+            if _replicas is None:
+                _rodizio = itertools.count()
+                _replicas = [_Replica(url) for url in DATABASE_REPLICA_URLS]
+    return _replicas
+
+
+def get_engine_leitura(ultima_escrita: float = None):
+    """
+    Engine para consultas que aceitam dados um pouco atrasados: a próxima réplica
+    saudável em rodízio, ou o primário se não houver nenhuma ou se o cliente
+    escreveu há menos de LEITURA_APOS_ESCRITA segundos.
+    """
+    replicas = _get_replicas()
+    if not replicas or (ultima_escrita and time.time() - ultima_escrita < LEITURA_APOS_ESCRITA):
+        return get_engine()
+    inicio = next(_rodizio)
+    for deslocamento in range(len(replicas)):
+        replica = replicas[(inicio + deslocamento) % len(replicas)]
+        if replica.saudavel():
+            return replica.engine
+    return get_engine()
+
+
+class LeituraAposEscrita:
+    """
+    Middleware ASGI: respostas de sucesso a POST/PUT/PATCH/DELETE gravam no cliente
+    o instante da escrita (cookie), e get_db_leitura manda as leituras seguintes
+    desse cliente ao primário até a réplica alcançá-lo.
+    """
+
+    METODOS_LEITURA = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in self.METODOS_LEITURA:
+            return await self.app(scope, receive, send)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start" and mensagem["status"] < 400:
+                cookie = (
+                    f"{COOKIE_ESCRITA}={time.time():.3f}; Max-Age={max(int(LEITURA_APOS_ESCRITA), 1)}; "
+                    "Path=/; HttpOnly; SameSite=lax"
+                )
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(mensagem)
+
+        await self.app(scope, receive, enviar)
+
+
+def _ultima_escrita(request: Request):
+    try:
+        return float(request.cookies.get(COOKIE_ESCRITA, ""))
+    except ValueError:
+        return None
+
+
+class _SessionmakerPreguicoso(sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _SessionmakerPreguicoso(autocommit=False, autoflush=False)
+
+
+def __getattr__(nome):
+    # Compatibilidade: `from db import engine` continua funcionando, criando o engine na hora
+    if nome == "engine":
+        return get_engine()
+    raise AttributeError(nome)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_db_leitura(request: Request):
+    """Como get_db, mas para endpoints só de leitura: a sessão pode apontar para uma réplica."""
+    db = SessionLocal(bind=get_engine_leitura(_ultima_escrita(request)))
+    try:
+        yield db
+    finally:
+        db.close()
@@ -30,7 +30,13 @@ CREATE TABLE IF NOT EXISTS `api_docs`.`analise` (
   `resumo` VARCHAR(255) NULL,
   `data` DATETIME NULL,
   `usuario_id` VARCHAR(45) NULL,
-  PRIMARY KEY (`id_analise`))
+  `risco` VARCHAR(20) NULL DEFAULT 'pendente',
+  `total_certidoes` INT(11) NOT NULL DEFAULT 0,
+  `total_pendencias` INT(11) NOT NULL DEFAULT 0,
+  `total_erros` INT(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id_analise`),
+  INDEX `idx_analise_usuario` (`usuario_id` ASC),
+  INDEX `idx_analise_risco` (`risco` ASC))
 ENGINE = InnoDB
 DEFAULT CHARACTER SET = utf8mb4;
 
@@ -62,8 +68,13 @@ CREATE TABLE IF NOT EXISTS `api_docs`.`proprietario` (
   `pdf_tjdf_eleitoral` VARCHAR(255) NULL,
   `pdf_tjdf_civel` VARCHAR(255) NULL,
   `ad` VARCHAR(255) NULL,
+  `documento` VARCHAR(14) NULL,
+  `tipo_documento` VARCHAR(4) NULL,
+  `documento_representante` VARCHAR(14) NULL,
   PRIMARY KEY (`id_proprietario`),
   INDEX `fk_proprietario_analise` (`analise_id` ASC),
+  INDEX `idx_proprietario_documento` (`documento` ASC),
+  INDEX `idx_proprietario_documento_representante` (`documento_representante` ASC),
   CONSTRAINT `fk_proprietario_analise`
     FOREIGN KEY (`analise_id`)
     REFERENCES `api_docs`.`analise` (`id_analise`)
@@ -93,8 +104,11 @@ CREATE TABLE IF NOT EXISTS `api_docs`.`esposa_socio` (
   `pdf_tjdf_eleitoral` VARCHAR(255) NULL,
   `pdf_tjdf_civel` VARCHAR(255) NULL,
   `ad` VARCHAR(255) NULL,
+  `documento` VARCHAR(14) NULL,
+  `tipo_documento` VARCHAR(4) NULL,
   PRIMARY KEY (`id_esposa_socio`),
   UNIQUE INDEX `unique_proprietario` (`proprietario_id` ASC),
+  INDEX `idx_esposa_socio_documento` (`documento` ASC),
   CONSTRAINT `fk_esposa_socio_proprietario`
     FOREIGN KEY (`proprietario_id`)
     REFERENCES `api_docs`.`proprietario` (`id_proprietario`)
@@ -125,6 +139,210 @@ ENGINE = InnoDB
 DEFAULT CHARACTER SET = utf8mb4;
 
 
+-- -----------------------------------------------------
+-- Table `api_docs`.`lote_emissao`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`lote_emissao` (
+  `id_lote_emissao` INT(11) NOT NULL AUTO_INCREMENT,
+  `filtro` VARCHAR(255) NULL,
+  `total_analises` INT(11) NOT NULL DEFAULT 0,
+  `total_certidoes` INT(11) NOT NULL DEFAULT 0,
+  `criado_em` DATETIME NOT NULL,
+  PRIMARY KEY (`id_lote_emissao`))
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`certidao_job`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`certidao_job` (
+  `id_certidao_job` INT(11) NOT NULL AUTO_INCREMENT,
+  `analise_id` INT(11) NOT NULL,
+  `proprietario_id` INT(11) NULL,
+  `lote_id` INT(11) NULL,
+  `emissor` VARCHAR(45) NOT NULL,
+  `tipo_documento` VARCHAR(4) NOT NULL,
+  `documento` VARCHAR(45) NOT NULL,
+  `status` VARCHAR(45) NOT NULL DEFAULT 'pendente',
+  `tentativas` INT(11) NOT NULL DEFAULT 0,
+  `criado_em` DATETIME NOT NULL,
+  `agendado_em` DATETIME NULL,
+  `iniciado_em` DATETIME NULL,
+  `finalizado_em` DATETIME NULL,
+  `duracao_ms` INT(11) NULL,
+  `erro` VARCHAR(255) NULL,
+  `arquivo` VARCHAR(255) NULL,
+  `arquivo_url` VARCHAR(255) NULL,
+  `estado_resumo` VARCHAR(20) NULL,
+  PRIMARY KEY (`id_certidao_job`),
+  UNIQUE INDEX `unique_job_emissor_documento` (`analise_id` ASC, `emissor` ASC, `documento` ASC),
+  INDEX `idx_job_documento_emissor` (`documento` ASC, `emissor` ASC, `status` ASC),
+  INDEX `fk_certidao_job_proprietario` (`proprietario_id` ASC),
+  INDEX `fk_certidao_job_lote` (`lote_id` ASC),
+  CONSTRAINT `fk_certidao_job_analise`
+    FOREIGN KEY (`analise_id`)
+    REFERENCES `api_docs`.`analise` (`id_analise`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_certidao_job_proprietario`
+    FOREIGN KEY (`proprietario_id`)
+    REFERENCES `api_docs`.`proprietario` (`id_proprietario`)
+    ON DELETE SET NULL,
+  CONSTRAINT `fk_certidao_job_lote`
+    FOREIGN KEY (`lote_id`)
+    REFERENCES `api_docs`.`lote_emissao` (`id_lote_emissao`)
+    ON DELETE SET NULL)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`certidao_resultado`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`certidao_resultado` (
+  `id_certidao_resultado` INT(11) NOT NULL AUTO_INCREMENT,
+  `job_id` INT(11) NOT NULL,
+  `analise_id` INT(11) NOT NULL,
+  `emissor` VARCHAR(45) NOT NULL,
+  `tipo_doc` VARCHAR(45) NULL,
+  `documento` VARCHAR(14) NULL,
+  `nome` VARCHAR(255) NULL,
+  `pendencia` TINYINT NULL,
+  `data_emissao` DATE NULL,
+  `validade` DATE NULL,
+  `texto` MEDIUMBLOB NULL,
+  `texto_tamanho` INT(11) NULL,
+  `criado_em` DATETIME NOT NULL,
+  PRIMARY KEY (`id_certidao_resultado`),
+  UNIQUE INDEX `unique_resultado_job` (`job_id` ASC),
+  INDEX `idx_resultado_analise` (`analise_id` ASC),
+  INDEX `idx_resultado_documento` (`documento` ASC),
+  INDEX `idx_resultado_pendencia` (`pendencia` ASC),
+  CONSTRAINT `fk_certidao_resultado_job`
+    FOREIGN KEY (`job_id`)
+    REFERENCES `api_docs`.`certidao_job` (`id_certidao_job`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_certidao_resultado_analise`
+    FOREIGN KEY (`analise_id`)
+    REFERENCES `api_docs`.`analise` (`id_analise`)
+    ON DELETE CASCADE)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`chave_idempotencia`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`chave_idempotencia` (
+  `id_chave_idempotencia` INT(11) NOT NULL AUTO_INCREMENT,
+  `chave_hash` CHAR(64) NOT NULL,
+  `rota` VARCHAR(45) NOT NULL,
+  `impressao` CHAR(64) NOT NULL,
+  `resposta` TEXT NOT NULL,
+  `criado_em` DATETIME NOT NULL,
+  PRIMARY KEY (`id_chave_idempotencia`),
+  UNIQUE INDEX `unique_chave_idempotencia` (`chave_hash` ASC),
+  INDEX `idx_chave_idempotencia_criado_em` (`criado_em` ASC))
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`webhook_assinatura`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`webhook_assinatura` (
+  `id_webhook_assinatura` INT(11) NOT NULL AUTO_INCREMENT,
+  `usuario_id` VARCHAR(45) NOT NULL,
+  `url` VARCHAR(500) NOT NULL,
+  `segredo` VARCHAR(64) NOT NULL,
+  `eventos` VARCHAR(100) NOT NULL,
+  `ativo` INT(11) NOT NULL DEFAULT 1,
+  `criado_em` DATETIME NOT NULL,
+  PRIMARY KEY (`id_webhook_assinatura`),
+  INDEX `idx_webhook_assinatura_usuario` (`usuario_id` ASC))
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`webhook_falha`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`webhook_falha` (
+  `id_webhook_falha` INT(11) NOT NULL AUTO_INCREMENT,
+  `assinatura_id` INT(11) NOT NULL,
+  `url` VARCHAR(500) NOT NULL,
+  `eventos` MEDIUMTEXT NOT NULL,
+  `tentativas` INT(11) NOT NULL DEFAULT 0,
+  `erro` VARCHAR(255) NULL DEFAULT NULL,
+  `criado_em` DATETIME NOT NULL,
+  `reenviado_em` DATETIME NULL DEFAULT NULL,
+  PRIMARY KEY (`id_webhook_falha`),
+  INDEX `fk_webhook_falha_assinatura_idx` (`assinatura_id` ASC),
+  INDEX `idx_webhook_falha_criado_em` (`criado_em` ASC),
+  CONSTRAINT `fk_webhook_falha_assinatura`
+    FOREIGN KEY (`assinatura_id`)
+    REFERENCES `api_docs`.`webhook_assinatura` (`id_webhook_assinatura`)
+    ON DELETE CASCADE)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`analise_arquivo`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`analise_arquivo` (
+  `id_analise` INT(11) NOT NULL,
+  `status` VARCHAR(45) NULL DEFAULT NULL,
+  `link_pdf` VARCHAR(255) NULL DEFAULT NULL,
+  `resumo` VARCHAR(255) NULL DEFAULT NULL,
+  `data` DATETIME NOT NULL,
+  `usuario_id` VARCHAR(45) NULL DEFAULT NULL,
+  `risco` VARCHAR(20) NULL DEFAULT NULL,
+  `total_certidoes` INT(11) NOT NULL DEFAULT 0,
+  `total_pendencias` INT(11) NOT NULL DEFAULT 0,
+  `total_erros` INT(11) NOT NULL DEFAULT 0,
+  `arquivos` TEXT NULL DEFAULT NULL,
+  `conteudo` MEDIUMBLOB NOT NULL,
+  `arquivada_em` DATETIME NOT NULL,
+  PRIMARY KEY (`id_analise`),
+  INDEX `idx_analise_arquivo_usuario_data` (`usuario_id` ASC, `data` ASC),
+  INDEX `idx_analise_arquivo_data` (`data` ASC))
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`proprietario_arquivo`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`proprietario_arquivo` (
+  `id_proprietario` INT(11) NOT NULL,
+  `analise_id` INT(11) NOT NULL,
+  PRIMARY KEY (`id_proprietario`),
+  INDEX `fk_proprietario_arquivo_analise_idx` (`analise_id` ASC),
+  CONSTRAINT `fk_proprietario_arquivo_analise`
+    FOREIGN KEY (`analise_id`)
+    REFERENCES `api_docs`.`analise_arquivo` (`id_analise`)
+    ON DELETE CASCADE)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
+-- -----------------------------------------------------
+-- Table `api_docs`.`documento_arquivo`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `api_docs`.`documento_arquivo` (
+  `documento` VARCHAR(14) NOT NULL,
+  `analise_id` INT(11) NOT NULL,
+  PRIMARY KEY (`documento`, `analise_id`),
+  INDEX `fk_documento_arquivo_analise_idx` (`analise_id` ASC),
+  CONSTRAINT `fk_documento_arquivo_analise`
+    FOREIGN KEY (`analise_id`)
+    REFERENCES `api_docs`.`analise_arquivo` (`id_analise`)
+    ON DELETE CASCADE)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = utf8mb4;
+
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
@@ -0,0 +1,214 @@
+# Números de documento (CPF/CNPJ) normalizados para busca e comparação
+# documentos.py
+#
+# O cadastro guarda o documento como foi digitado ('123.456.789-09' ou '12345678909');
+# as colunas normalizadas (só dígitos, indexadas) são preenchidas pelos modelos
+# a cada escrita (ver @validates em models.py).
+import re
+
+_NAO_DIGITOS = re.compile(r"\D")
+
+TIPO_CPF = "CPF"
+TIPO_CNPJ = "CNPJ"
+
+
+def normalizar(valor):
+    """Só os dígitos do documento; None se não há nenhum."""
+    if valor is None:
+        return None
+    return _NAO_DIGITOS.sub("", str(valor)) or None
+
+
+def tipo_documento(digitos):
+    """CPF (11 dígitos), CNPJ (14) ou None."""
+    if not digitos:
+        return None
+    return {11: TIPO_CPF, 14: TIPO_CNPJ}.get(len(digitos))
+
+
+# =======================
+# DÍGITOS VERIFICADORES
+# =======================
+
+_PESOS_CPF = (tuple(range(10, 1, -1)), tuple(range(11, 1, -1)))
+_PESOS_CNPJ = ((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+
+
+def _dv_cpf(soma: int) -> int:
+    resto = soma * 10 % 11
+    return 0 if resto == 10 else resto
+
+
+def _dv_cnpj(soma: int) -> int:
+    resto = soma % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def _confere(digitos: str, tamanho: int, pesos: tuple, dv) -> bool:
+    # Sequências repetidas (000.000.000-00, 11.111.111/1111-11) passam na conta mas não existem
+    if len(digitos) != tamanho or not digitos.isdigit() or digitos == digitos[0] * tamanho:
+        return False
+    numeros = [ord(c) - 48 for c in digitos]
+    for pesos_dv in pesos:
+        posicao = len(pesos_dv)
+        if dv(sum(n * p for n, p in zip(numeros, pesos_dv))) != numeros[posicao]:
+            return False
+    return True
+
+
+def cpf_valido(digitos: str) -> bool:
+    return _confere(digitos, 11, _PESOS_CPF, _dv_cpf)
+
+
+def cnpj_valido(digitos: str) -> bool:
+    return _confere(digitos, 14, _PESOS_CNPJ, _dv_cnpj)
+
+
+def documento_valido(valor, tipo: str = None) -> bool:
+    """Confere os dígitos verificadores; sem tipo, decide pelo tamanho (11 = CPF, 14 = CNPJ)."""
+    digitos = normalizar(valor)
+    tipo = tipo or tipo_documento(digitos)
+    if tipo == TIPO_CPF:
+        return cpf_valido(digitos or "")
+    if tipo == TIPO_CNPJ:
+        return cnpj_valido(digitos or "")
+    return False
+
+
+def validar(valor, tipo: str = None) -> str:
+    """Dígitos do documento, ou ValueError se os verificadores não conferem (usado nos schemas)."""
+    digitos = normalizar(valor)
+    if not documento_valido(digitos, tipo):
+        raise ValueError(f"{tipo or 'CPF/CNPJ'} inválido: {valor}")
+    return digitos
+
+
+# =======================
+# VALIDAÇÃO EM LOTE
+# =======================
+
+def _validos_numpy(np, digitos: list, tamanho: int, pesos: tuple, cpf: bool):
+    # Uma linha por documento, uma coluna por dígito: as somas ponderadas viram um produto de matrizes
+    matriz = (np.frombuffer("".join(digitos).encode("ascii"), dtype=np.uint8) - 48).reshape(-1, tamanho).astype(np.int32)
+    validos = ~(matriz == matriz[:, :1]).all(axis=1)
+    for pesos_dv in pesos:
+        posicao = len(pesos_dv)
+        soma = matriz[:, :posicao] @ np.array(pesos_dv, dtype=np.int32)
+        if cpf:
+            dv = soma * 10 % 11
+            dv[dv == 10] = 0
+        else:
+            resto = soma % 11
+            dv = np.where(resto < 2, 0, 11 - resto)
+        validos &= dv == matriz[:, posicao]
+    return validos
+
+
+# Bytes que não são dígito nem a quebra de linha usada para juntar os documentos
+_REMOVER = bytes(b for b in range(256) if not (48 <= b <= 57 or b == 10))
+
+
+def _normalizar_todos(valores) -> list:
+    # Uma única passada (bytes.translate, em C) sobre todos os documentos juntos
+    valores = ["" if valor is None else str(valor) for valor in valores]
+    texto = "\n".join(valores).encode("utf-8", "ignore").translate(None, _REMOVER)
+    normalizados = texto.decode("ascii").split("\n")
+    if len(normalizados) != len(valores):  # algum valor tinha quebra de linha
+        normalizados = [normalizar(valor) or "" for valor in valores]
+    return normalizados
+
+
+def validar_em_lote(valores, tipo: str = None) -> list:
+    """
+    Validade de muitos documentos de uma vez (importações em massa), na mesma
+    ordem da entrada. Com numpy instalado, os dígitos verificadores de todos os
+    CPFs e de todos os CNPJs são calculados em operações vetoriais; sem ele,
+    documento a documento.
+    """
+    normalizados = _normalizar_todos(valores)
+    try:
+        import numpy as np
+    except ImportError:
+        return [documento_valido(digitos, tipo) for digitos in normalizados]
+
+    resultado = [False] * len(normalizados)
+    for tipo_grupo, tamanho, pesos in ((TIPO_CPF, 11, _PESOS_CPF), (TIPO_CNPJ, 14, _PESOS_CNPJ)):
+        if tipo and tipo != tipo_grupo:
+            continue
+        indices = [i for i, digitos in enumerate(normalizados) if len(digitos) == tamanho]
+        if not indices:
+            continue
+        validos = _validos_numpy(np, [normalizados[i] for i in indices], tamanho, pesos, tipo_grupo == TIPO_CPF)
+        for i, valido in zip(indices, validos.tolist()):
+            resultado[i] = valido
+    return resultado
+
+
+def preencher_documentos(db, lote: int = 1000) -> int:
+    """
+    Preenche as colunas normalizadas das linhas gravadas antes delas existirem
+    e deixa certidao_job.documento só com dígitos, em lotes por chave primária
+    (python manage.py documentos). Retorna quantas linhas mudaram.
+    """
+    from models import EsposaSocio, Proprietario
+
+    alteradas = 0
+    for modelo, origem in ((Proprietario, "cpf_cnpj"), (EsposaSocio, "cpf")):
+        ultimo_id = 0
+        while True:
+            linhas = (
+                db.query(modelo)
+                .filter(modelo.id > ultimo_id)
+                .order_by(modelo.id)
+                .limit(lote)
+                .all()
+            )
+            if not linhas:
+                break
+            for linha in linhas:
+                antes = (linha.documento, getattr(linha, "documento_representante", None))
+                # Reatribuir dispara os @validates que calculam as colunas normalizadas
+                setattr(linha, origem, getattr(linha, origem))
+                if modelo is Proprietario:
+                    linha.cpf_representante = linha.cpf_representante
+                if (linha.documento, getattr(linha, "documento_representante", None)) != antes:
+                    alteradas += 1
+            ultimo_id = linhas[-1].id
+            db.commit()
+    return alteradas + _normalizar_jobs(db, lote)
+
+
+def _normalizar_jobs(db, lote: int) -> int:
+    """
+    certidao_job.documento só com dígitos (jobs gravados antes da normalização).
+    Se a análise já tem o job do emissor com o documento normalizado, a linha
+    antiga é mantida como está: a chave única (analise, emissor, documento) não deixa trocar.
+    """
+    from sqlalchemy import select
+
+    from models import CertidaoJob
+
+    alterados, ultimo_id = 0, 0
+    while True:
+        jobs = db.execute(
+            select(CertidaoJob).where(CertidaoJob.id > ultimo_id).order_by(CertidaoJob.id).limit(lote)
+        ).scalars().all()
+        if not jobs:
+            return alterados
+        ultimo_id = jobs[-1].id
+        for job in jobs:
+            digitos = normalizar(job.documento)
+            if not digitos or digitos == job.documento:
+                continue
+            ocupado = db.execute(
+                select(CertidaoJob.id).where(
+                    CertidaoJob.analise_id == job.analise_id,
+                    CertidaoJob.emissor == job.emissor,
+                    CertidaoJob.documento == digitos,
+                )
+            ).first()
+            if ocupado is None:
+                job.documento = digitos
+                db.flush()
+                alterados += 1
+        db.commit()
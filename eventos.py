@@ -0,0 +1,301 @@
+# Canal de notificações das análises (SSE e long-poll)
+# eventos.py
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from db import SessionLocal
+from models import Analise, AnaliseArquivada, StatusAnalise
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Intervalo (segundos) entre comentários de keep-alive no stream SSE
+SSE_KEEPALIVE = 15
+# Tempo máximo (segundos) que uma requisição de long-poll fica aguardando
+LONG_POLL_TIMEOUT_MAX = 60
+# Diretório dos sockets do barramento compartilhado entre os processos da máquina
+# (vazio = barramento só do processo; servidor.py define um com mais de um worker)
+EVENTOS_COMPARTILHADO = os.getenv("EVENTOS_COMPARTILHADO")
+# Status em que a análise não muda mais sem nova emissão
+STATUS_FINAIS = {StatusAnalise.concluida.value, StatusAnalise.concluida_com_erros.value}
+
+
+# =======================
+# BARRAMENTO DE EVENTOS
+# =======================
+
+class BarramentoLocal:
+    """
+    Pub/sub em memória do processo.
+    Cada assinante recebe uma fila asyncio própria. A publicação é thread-safe,
+    pois process_certidoes roda no threadpool das BackgroundTasks.
+    Um broker local pode substituir esta classe desde que exponha
+    assinar / cancelar / publicar com a mesma assinatura.
+    """
+
+    def __init__(self, tamanho_fila: int = 100):
+        self.tamanho_fila = tamanho_fila
+        self._lock = threading.Lock()
+        # analise_id -> conjunto de (loop, fila); a chave None recebe todos os eventos
+        self._assinantes = {}
+
+    def assinar(self, analise_id=None, tamanho_fila: int = None) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        fila = asyncio.Queue(maxsize=tamanho_fila or self.tamanho_fila)
+        with self._lock:
+            self._assinantes.setdefault(analise_id, set()).add((loop, fila))
+        return fila
+
+    def cancelar(self, fila: asyncio.Queue, analise_id=None):
+        with self._lock:
+            assinantes = self._assinantes.get(analise_id)
+            if not assinantes:
+                return
+            for item in [a for a in assinantes if a[1] is fila]:
+                assinantes.discard(item)
+            if not assinantes:
+                del self._assinantes[analise_id]
+
+    def publicar(self, evento: dict):
+        analise_id = evento.get("analise_id")
+        with self._lock:
+            destinos = list(self._assinantes.get(analise_id, ()))
+            if analise_id is not None:
+                destinos += list(self._assinantes.get(None, ()))
+        for loop, fila in destinos:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, evento)
+            except RuntimeError:
+                # Loop já encerrado: o assinante morreu sem cancelar
+                self.cancelar(fila, analise_id)
+
+    @staticmethod
+    def _entregar(fila: asyncio.Queue, evento: dict):
+        # Assinante lento: descarta o evento mais antigo em vez de bloquear quem publica
+        if fila.full():
+            fila.get_nowait()
+        fila.put_nowait(evento)
+
+
+class BarramentoCompartilhado(BarramentoLocal):
+    """
+    Barramento entre os workers da mesma máquina: cada processo com assinantes
+    escuta um socket Unix (datagrama) em `diretorio` e quem publica envia o
+    evento a todos os sockets. Assim o stream SSE e o long-poll recebem os
+    eventos de análises executadas em outro worker.
+    Assinantes de todos os eventos (chave None, ex.: o despachante de webhooks)
+    só recebem os do próprio processo, para cada evento ser tratado uma vez.
+    """
+
+    def __init__(self, diretorio: str, tamanho_fila: int = 100):
+        super().__init__(tamanho_fila)
+        self.diretorio = diretorio
+        self._caminho = None
+        self._envio = None
+        self._iniciar_lock = threading.Lock()
+
+    def _escutar(self):
+        # Socket de recepção criado com o primeiro assinante (processos só de publicação não escutam)
+        with self._iniciar_lock:
+            if self._caminho is not None:
+                return
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho = os.path.join(self.diretorio, f"{os.getpid()}.sock")
+            if os.path.exists(caminho):
+                os.unlink(caminho)  # pid reaproveitado de um processo que morreu
+            recepcao = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            recepcao.bind(caminho)
+            self._caminho = caminho
+            atexit.register(self._remover_socket)
+            threading.Thread(target=self._receber, args=(recepcao,), name="barramento", daemon=True).start()
+
+    def _remover_socket(self):
+        try:
+            os.unlink(self._caminho)
+        except OSError:
+            pass
+
+    def _receber(self, recepcao):
+        while True:
+            dados = recepcao.recv(65536)
+            try:
+                self._publicar_local(json.loads(dados), remoto=True)
+            except Exception:
+                logger.exception("Evento inválido no barramento compartilhado")
+
+    def assinar(self, analise_id=None, tamanho_fila: int = None) -> asyncio.Queue:
+        self._escutar()
+        return super().assinar(analise_id, tamanho_fila)
+
+    def publicar(self, evento: dict):
+        self._publicar_local(evento, remoto=False)
+        if evento.get("analise_id") is None:
+            return
+        dados = json.dumps(evento, default=str).encode()
+        if self._envio is None:
+            envio = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            envio.setblocking(False)  # receptor travado perde o evento, quem publica não espera
+            self._envio = envio
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            return
+        for nome in nomes:
+            caminho = os.path.join(self.diretorio, nome)
+            if not nome.endswith(".sock") or caminho == self._caminho:
+                continue
+            try:
+                self._envio.sendto(dados, caminho)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Processo encerrado sem remover o socket
+                try:
+                    os.unlink(caminho)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Barramento: fila do socket %s cheia, evento descartado", nome)
+
+    def _publicar_local(self, evento: dict, remoto: bool):
+        analise_id = evento.get("analise_id")
+        with self._lock:
+            destinos = list(self._assinantes.get(analise_id, ()))
+            if analise_id is not None and not remoto:
+                destinos += list(self._assinantes.get(None, ()))
+        for loop, fila in destinos:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, evento)
+            except RuntimeError:
+                self.cancelar(fila, analise_id)
+
+
+_barramento = BarramentoCompartilhado(EVENTOS_COMPARTILHADO) if EVENTOS_COMPARTILHADO else BarramentoLocal()
+
+
+def get_barramento():
+    return _barramento
+
+
+def definir_barramento(barramento):
+    """Troca o barramento em uso (ex.: por um broker local compartilhado entre workers)."""
+    global _barramento
+    _barramento = barramento
+
+
+def publicar_evento(analise_id: int, tipo: str, **dados):
+    """
+    Publica um evento de análise.
+    tipo: 'status' (mudança de Analise.status) ou 'certidao' (certidão finalizada).
+    """
+    evento = {
+        "analise_id": analise_id,
+        "tipo": tipo,
+        "data": datetime.utcnow().isoformat(),
+    }
+    evento.update(dados)
+    _barramento.publicar(evento)
+
+
+# =======================
+# ENDPOINTS
+# =======================
+
+def _consultar_status(analise_id: int):
+    # Sessão curta: não segura conexão do pool durante o stream
+    db = SessionLocal()
+    try:
+        analise = db.query(Analise.status).filter(Analise.id == analise_id).first()
+        if analise:
+            return analise.status
+        # Arquivada: o status está em coluna do arquivo, sem descomprimir o conteúdo
+        return db.query(AnaliseArquivada.status).filter(AnaliseArquivada.id == analise_id).scalar()
+    finally:
+        db.close()
+
+
+def _formatar_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+
+
+@router.get("/analises/{analise_id}/eventos/", tags=["Eventos"])
+async def stream_eventos_analise(analise_id: int, request: Request):
+    """
+    Stream SSE com as mudanças de status da análise e cada certidão finalizada.
+    O primeiro evento traz o status atual; o stream encerra quando a análise é concluída.
+    """
+    barramento = get_barramento()
+    # Assina antes de ler o status para não perder eventos entre a leitura e a assinatura
+    fila = barramento.assinar(analise_id)
+    status = await run_in_threadpool(_consultar_status, analise_id)
+    if status is None:
+        barramento.cancelar(fila, analise_id)
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+
+    async def gerar():
+        try:
+            yield _formatar_sse({"analise_id": analise_id, "tipo": "status", "status": status})
+            if status in STATUS_FINAIS:
+                return
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _formatar_sse(evento)
+                if evento["tipo"] == "status" and evento.get("status") in STATUS_FINAIS:
+                    break
+        finally:
+            barramento.cancelar(fila, analise_id)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(gerar(), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/analises/{analise_id}/aguardar/", tags=["Eventos"])
+async def aguardar_analise(analise_id: int, status: str = None, timeout: int = 30, certidoes: bool = False):
+    """
+    Long-poll: responde assim que a análise sair do `status` informado pelo cliente
+    (ou imediatamente, se já estiver diferente). Com certidoes=True responde também
+    a cada certidão finalizada. Sem mudança até `timeout` segundos, devolve o
+    status atual com mudou=False.
+    """
+    timeout = max(1, min(timeout, LONG_POLL_TIMEOUT_MAX))
+    barramento = get_barramento()
+    fila = barramento.assinar(analise_id)
+    try:
+        atual = await run_in_threadpool(_consultar_status, analise_id)
+        if atual is None:
+            raise HTTPException(status_code=404, detail="Análise não encontrada")
+        if status is None or atual != status:
+            return {"analise_id": analise_id, "status": atual, "mudou": atual != status, "eventos": []}
+
+        eventos = []
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + timeout
+        while True:
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=restante)
+            except asyncio.TimeoutError:
+                break
+            eventos.append(evento)
+            if evento["tipo"] == "status" and evento.get("status") != status:
+                return {"analise_id": analise_id, "status": evento["status"], "mudou": True, "eventos": eventos}
+            if certidoes and evento["tipo"] == "certidao":
+                return {"analise_id": analise_id, "status": atual, "mudou": False, "eventos": eventos}
+        return {"analise_id": analise_id, "status": atual, "mudou": False, "eventos": eventos}
+    finally:
+        barramento.cancelar(fila, analise_id)
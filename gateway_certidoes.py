@@ -1,42 +1,425 @@
 # gateway_certidoes.py
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-# PDFs
-from PyPDF2 import PdfMerger
+# PDFs (relatorio_pdf, que carrega o PyPDF2, é importado só ao mesclar)
+from armazenamento import get_armazenamento
+from relatorio import RELATORIO_MODO
+from urls import caminho_relatorio, resolver
+import importlib
 import os
+import tempfile
+import time
 import uuid
+from datetime import date, datetime, timedelta
 
 
 # Importa os modelos e a função de obtenção do banco de dados do seu app
  # :contentReference[oaicite:4]{index=4}&#8203;:contentReference[oaicite:5]{index=5}
-from models import Analise,Proprietario
-from db import get_db
-# Importa as funções de emissão de certidões do módulo post_trf1.py
-from post_trf1 import (
-    process_cnpj_criminal,
-    process_cnpj_civel,
-    process_cnpj_eleitoral,
-    process_cpf_criminal,
-    process_cpf_civel,
-    process_cpf_eleitoral
-)  # :contentReference[oaicite:6]{index=6}&#8203;:contentReference[oaicite:7]{index=7}
-
-from post_nada_consta import (
-   process_nada_consta_especial 
-)
-
-from post_receita import (
-    process_cpf_receita
-)
+from models import Analise,Proprietario,CertidaoJob,CertidaoResultado,LoteEmissao,StatusAnalise,StatusCertidao
+from db import get_db, SessionLocal
+from eventos import publicar_evento, STATUS_FINAIS
+from agendador import agendador, PRIORIDADE_INTERATIVA, PRIORIDADE_LOTE
+from schemas import LoteEmissaoPayload
+from cache import invalidar_analise
+from documentos import documento_valido, normalizar, validar
+from arquivamento import linhas_arquivadas
+from resultados_certidoes import descomprimir_texto, salvar_resultado
+from resumo import registrar_resultado, estado_do_resultado
 
 router = APIRouter()
 
-def process_certidoes(analise_id: int, cnpj_cpf: str, nome_mae: str, doc_type: str, db: Session):
+# Um job na fila/executando há mais tempo que isso é considerado perdido e pode ser reagendado
+JOB_TIMEOUT = timedelta(minutes=int(os.getenv("JOB_TIMEOUT_MINUTOS", "30")))
+# Prazo (segundos) dado às emissões interativas; o agendador adianta as que estão para vencer
+PRAZO_INTERATIVO = int(os.getenv("PRAZO_INTERATIVO_SEGUNDOS", "300"))
+# Validade (dias desde a emissão) das certidões cujo texto não traz a data de validade;
+# CERTIDAO_VALIDADE_DIAS_<EMISSOR> ajusta por emissor (ex.: CERTIDAO_VALIDADE_DIAS_RECEITA=180)
+CERTIDAO_VALIDADE_DIAS = int(os.getenv("CERTIDAO_VALIDADE_DIAS", "30"))
+
+# Emissores por tipo de documento: emissor -> (função, coluna do Proprietario, usa nome da mãe)
+# A função é "modulo:nome": os módulos post_* (requests, PyPDF2) só são importados na primeira emissão
+EMISSORES = {
+    "CPF": {
+        "tjdf_criminal": ("post_trf1:process_cpf_criminal", "pdf_tjdf_criminal", False),
+        "tjdf_civel": ("post_trf1:process_cpf_civel", "pdf_tjdf_civel", False),
+        "tjdf_eleitoral": ("post_trf1:process_cpf_eleitoral", "pdf_tjdf_eleitoral", False),
+        "nada_consta_especial": ("post_nada_consta:process_nada_consta_especial", "pdf_nada_consta_especial", True),
+        "receita": ("post_receita:process_cpf_receita", "pdf_receita", False),
+    },
+    "CNPJ": {
+        "tjdf_criminal": ("post_trf1:process_cnpj_criminal", "pdf_tjdf_criminal", False),
+        "tjdf_civel": ("post_trf1:process_cnpj_civel", "pdf_tjdf_civel", False),
+        "tjdf_eleitoral": ("post_trf1:process_cnpj_eleitoral", "pdf_tjdf_eleitoral", False),
+    },
+}
+
+
+def _funcao_emissora(referencia):
+    if callable(referencia):
+        return referencia
+    modulo, nome = referencia.split(":")
+    return getattr(importlib.import_module(modulo), nome)
+
+def validade_do_emissor(emissor: str) -> int:
+    return int(os.getenv(f"CERTIDAO_VALIDADE_DIAS_{emissor.upper()}", CERTIDAO_VALIDADE_DIAS))
+
+def _em_andamento(job: CertidaoJob, agora: datetime) -> bool:
+    # Job na fila ou executando há menos de JOB_TIMEOUT: não agenda de novo.
+    # Passado o timeout, o processo que o agendou provavelmente morreu.
+    if job.status == StatusCertidao.pendente.value:
+        referencia = job.agendado_em
+    elif job.status == StatusCertidao.executando.value:
+        referencia = job.iniciado_em
+    else:
+        return False
+    return referencia is not None and agora - referencia < JOB_TIMEOUT
+
+def _vigente(job: CertidaoJob, validade: date, data_emissao: date, hoje: date) -> bool:
+    """
+    Certidão emitida com sucesso que ainda vale hoje: pela validade lida no texto
+    ou, sem ela, pela data de emissão (ou do job) mais a validade do emissor.
+    """
+    if job.status != StatusCertidao.sucesso.value or not (job.arquivo or job.arquivo_url):
+        return False
+    if validade:
+        return validade >= hoje
+    emitida = data_emissao or (job.finalizado_em.date() if job.finalizado_em else None)
+    return emitida is not None and emitida + timedelta(days=validade_do_emissor(job.emissor)) >= hoje
+
+def _vigentes_do_documento(db: Session, analise_id: int, documento: str, emissores, hoje: date) -> dict:
+    """emissor -> job de outra análise com a certidão mais recente do documento, se ainda vigente."""
+    linhas = (
+        db.query(CertidaoJob, CertidaoResultado.validade, CertidaoResultado.data_emissao)
+        .outerjoin(CertidaoResultado, CertidaoResultado.job_id == CertidaoJob.id)
+        .filter(
+            CertidaoJob.documento == documento,
+            CertidaoJob.emissor.in_(list(emissores)),
+            CertidaoJob.status == StatusCertidao.sucesso.value,
+            CertidaoJob.analise_id != analise_id
+        )
+        .order_by(CertidaoJob.finalizado_em.desc())
+    )
+    vigentes, vistos = {}, set()
+    for job, validade, data_emissao in linhas:
+        if job.emissor in vistos:
+            continue
+        vistos.add(job.emissor)
+        if _vigente(job, validade, data_emissao, hoje):
+            vigentes[job.emissor] = job
+    return vigentes
+
+def _reaproveitar(db: Session, job: CertidaoJob, origem: CertidaoJob):
+    """
+    Marca o job como emitido com o arquivo e o resultado da certidão vigente de
+    outra análise, sem chamar o emissor. Os tempos são os da emissão original,
+    para a validade continuar contando dela.
+    """
+    job.status = StatusCertidao.sucesso.value
+    job.arquivo, job.arquivo_url = origem.arquivo, origem.arquivo_url
+    job.iniciado_em, job.finalizado_em = origem.iniciado_em, origem.finalizado_em
+    job.duracao_ms = 0
+    job.erro = None
+    pendencia = None
+    if origem.resultado is not None:
+        resultado = job.resultado
+        if resultado is None:
+            resultado = CertidaoResultado(job=job, analise_id=job.analise_id, emissor=job.emissor)
+            db.add(resultado)
+        for campo in ("tipo_doc", "documento", "nome", "pendencia", "data_emissao", "validade", "texto", "texto_tamanho"):
+            setattr(resultado, campo, getattr(origem.resultado, campo))
+        resultado.criado_em = datetime.utcnow()
+        pendencia = origem.resultado.pendencia
+    registrar_resultado(db, job, estado_do_resultado(True, pendencia))
+
+def planejar_jobs(db: Session, analise_id: int, proprietario_id, documento: str, doc_type: str,
+                  lote_id: int = None, force: bool = False) -> list:
+    """
+    Garante um registro em certidao_job para cada emissor do tipo de documento
+    e retorna apenas os que precisam ir ao emissor: o conjunto pedido menos as
+    certidões já guardadas e vigentes, desta análise ou de outra com o mesmo
+    documento (estas são copiadas sem nova emissão). Jobs já na fila do
+    agendador não são devolvidos de novo. force=True reemite todas.
+    Arquivos nas colunas pdf_* sem job (cadastros antigos) não têm data nem
+    resultado para conferir a validade, então são emitidos de novo.
+    """
+    # Só dígitos: o mesmo documento digitado com ou sem pontuação encontra os mesmos jobs
+    documento = normalizar(documento) or documento
+    agora = datetime.utcnow()
+    hoje = agora.date()
+    existentes = {
+        job.emissor: (job, validade, data_emissao)
+        for job, validade, data_emissao in (
+            db.query(CertidaoJob, CertidaoResultado.validade, CertidaoResultado.data_emissao)
+            .outerjoin(CertidaoResultado, CertidaoResultado.job_id == CertidaoJob.id)
+            .filter(CertidaoJob.analise_id == analise_id, CertidaoJob.documento == documento)
+        )
+    }
+    emissores = EMISSORES[doc_type]
+    de_outras = {} if force else _vigentes_do_documento(db, analise_id, documento, emissores, hoje)
+    proprietario = db.get(Proprietario, proprietario_id) if proprietario_id else None
+    a_executar, reaproveitados = [], []
+    for emissor, (_referencia, coluna, _usa_mae) in emissores.items():
+        job, validade, data_emissao = existentes.get(emissor, (None, None, None))
+        if job is None:
+            job = CertidaoJob(
+                analise_id=analise_id,
+                proprietario_id=proprietario_id,
+                emissor=emissor,
+                tipo_documento=doc_type,
+                documento=documento,
+                status=StatusCertidao.pendente.value,
+                tentativas=0
+            )
+            db.add(job)
+        elif _em_andamento(job, agora):
+            continue
+        elif not force and _vigente(job, validade, data_emissao, hoje):
+            if proprietario is not None and not getattr(proprietario, coluna):
+                setattr(proprietario, coluna, job.arquivo or job.arquivo_url)
+            continue
+        if emissor in de_outras:
+            _reaproveitar(db, job, de_outras[emissor])
+            if proprietario is not None:
+                setattr(proprietario, coluna, job.arquivo or job.arquivo_url)
+            reaproveitados.append(job)
+            continue
+        job.status = StatusCertidao.pendente.value
+        job.agendado_em = agora
+        job.lote_id = lote_id
+        a_executar.append(job)
+    db.commit()
+    if reaproveitados:
+        invalidar_analise(analise_id)
+    for job in reaproveitados:
+        publicar_evento(
+            analise_id, "certidao",
+            emissor=job.emissor,
+            tipo_doc=job.resultado.tipo_doc if job.resultado else None,
+            status=job.status,
+            tentativas=job.tentativas,
+            arquivo_url=resolver(job.arquivo or job.arquivo_url),
+            pendencia=bool(job.resultado.pendencia) if job.resultado else None,
+            mensagem=None,
+            reaproveitada=True,
+        )
+    return a_executar
+
+def executar_job(db: Session, job: CertidaoJob, nome_mae: str, proprietario) -> dict:
+    """
+    Emite a certidão de um job, registrando tentativa, tempos e erro,
+    e grava o arquivo na coluna correspondente do proprietário.
+    """
+    referencia, coluna, usa_nome_mae = EMISSORES[job.tipo_documento][job.emissor]
+    funcao = _funcao_emissora(referencia)
+    job.status = StatusCertidao.executando.value
+    job.tentativas = (job.tentativas or 0) + 1
+    job.iniciado_em = datetime.utcnow()
+    job.erro = None
+    db.commit()
+
+    inicio = time.monotonic()
+    try:
+        cert = funcao(job.documento, nome_mae) if usa_nome_mae else funcao(job.documento)
+    except Exception as e:
+        # Falha de rede/parsing de um emissor não derruba as demais certidões
+        cert = {"status": "erro", "mensagem": f"Erro ao emitir a certidão: {e}"}
+    job.duracao_ms = int((time.monotonic() - inicio) * 1000)
+    job.finalizado_em = datetime.utcnow()
+
+    if cert.get("status") == "finalizado":
+        job.status = StatusCertidao.sucesso.value
+        # Só a chave do armazenamento vai para o banco; a URL é montada na resposta (urls.py)
+        job.arquivo = cert.get("arquivo")
+        job.arquivo_url = None
+        # Guarda texto e campos extraídos para não reabrir o PDF depois
+        salvar_resultado(db, job, cert)
+        if proprietario:
+            setattr(proprietario, coluna, job.arquivo)
+    else:
+        job.status = StatusCertidao.erro.value
+        job.erro = (cert.get("mensagem") or "Erro desconhecido")[:255]
+    # Atualiza resumo e risco da análise apenas com a diferença trazida por esta certidão
+    registrar_resultado(
+        db, job,
+        estado_do_resultado(job.status == StatusCertidao.sucesso.value, cert.get("pendencia"))
+    )
+    db.commit()
+    invalidar_analise(job.analise_id)
+
+    # Notifica os assinantes da certidão finalizada
+    publicar_evento(
+        job.analise_id, "certidao",
+        emissor=job.emissor,
+        tipo_doc=cert.get("tipo_doc"),
+        status=job.status,
+        tentativas=job.tentativas,
+        arquivo_url=resolver(job.arquivo or job.arquivo_url),
+        pendencia=cert.get("pendencia"),
+        mensagem=job.erro,
+    )
+    return cert
+
+def finalizar_analise(db: Session, analise: Analise):
+    """
+    Define o status final da análise a partir dos jobs e aponta link_pdf para
+    o PDF mesclado das certidões emitidas com sucesso (montado sob demanda em
+    relatorio.py, ou já aqui com RELATORIO_MODO=eager).
+    """
+    jobs = (
+        db.query(CertidaoJob)
+        .filter(CertidaoJob.analise_id == analise.id)
+        .order_by(CertidaoJob.id)
+        .all()
+    )
+    sucesso = [job for job in jobs if job.status == StatusCertidao.sucesso.value]
+    if len(sucesso) == len(jobs):
+        analise.status = StatusAnalise.concluida.value
+    else:
+        analise.status = StatusAnalise.concluida_com_erros.value
+    if sucesso and RELATORIO_MODO == "eager":
+        merged_pdf_filename = merge_certidoes_pdfs([{"arquivo": job.arquivo} for job in sucesso])
+        analise.link_pdf = merged_pdf_filename
+    elif sucesso:
+        analise.link_pdf = caminho_relatorio(analise.id)
+    db.commit()
+    invalidar_analise(analise.id)
+    publicar_evento(analise.id, "status", status=analise.status, link_pdf=resolver(analise.link_pdf))
+
+def finalizar_se_completa(db: Session, analise_id: int):
+    """
+    Finaliza a análise quando não restam jobs na fila nem executando.
+    A linha da análise é travada para que só o último job a terminar finalize.
+    """
+    analise = (
+        db.query(Analise)
+        .filter(Analise.id == analise_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+    if not analise or analise.status in STATUS_FINAIS:
+        db.rollback()
+        return
+    por_status = dict(
+        db.query(CertidaoJob.status, func.count(CertidaoJob.id))
+        .filter(CertidaoJob.analise_id == analise_id)
+        .group_by(CertidaoJob.status)
+        .all()
+    )
+    restantes = por_status.get(StatusCertidao.pendente.value, 0) + por_status.get(StatusCertidao.executando.value, 0)
+    if not por_status or restantes:
+        db.rollback()
+        return
+    finalizar_analise(db, analise)
+
+def executar_job_agendado(job_id: int, nome_mae: str):
+    """Executado pelas threads do agendador, cada certidão com a própria sessão."""
+    db = SessionLocal()
+    try:
+        job = db.query(CertidaoJob).filter(CertidaoJob.id == job_id).first()
+        if not job or job.status == StatusCertidao.sucesso.value:
+            return
+        proprietario = None
+        if job.proprietario_id:
+            proprietario = db.query(Proprietario).filter(Proprietario.id == job.proprietario_id).first()
+        executar_job(db, job, nome_mae, proprietario)
+        finalizar_se_completa(db, job.analise_id)
+    finally:
+        db.close()
+
+def agendar_jobs(db: Session, analise: Analise, jobs: list, prioridade: int = PRIORIDADE_INTERATIVA, prazo: float = None):
+    """
+    Coloca os jobs, pares (job, nome_mae), na fila global do agendador e marca
+    a análise como em progresso. A fila divide as vagas de forma justa entre os
+    usuario_id e por prioridade/prazo. Sem nada a emitir, a análise é
+    finalizada na hora com as certidões que já tem.
+    """
+    if not jobs:
+        finalizar_se_completa(db, analise.id)
+        return
+    analise.status = StatusAnalise.em_progresso.value
+    db.commit()
+    invalidar_analise(analise.id)
+    publicar_evento(analise.id, "status", status=analise.status)
+    for job, nome_mae in jobs:
+        agendador.submeter(
+            job.emissor, executar_job_agendado, job.id, nome_mae,
+            prioridade=prioridade, usuario_id=analise.usuario_id, prazo=prazo
+        )
+
+def liberar_descartadas(descartadas: list) -> int:
+    """
+    Certidões tiradas da fila do agendador sem executar (encerramento do worker):
+    o job continua 'pendente', sem agendado_em, para retomar_jobs_pendentes (ou
+    uma nova emissão) agendá-lo de novo sem esperar JOB_TIMEOUT.
+    """
+    job_ids = [args[0] for funcao, args in descartadas if funcao is executar_job_agendado]
+    if not job_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        liberados = (
+            db.query(CertidaoJob)
+            .filter(CertidaoJob.id.in_(job_ids), CertidaoJob.status == StatusCertidao.pendente.value)
+            .update({CertidaoJob.agendado_em: None}, synchronize_session=False)
+        )
+        db.commit()
+        return liberados
+    finally:
+        db.close()
+
+def retomar_jobs_pendentes() -> int:
+    """
+    Na partida do worker, agenda os jobs 'pendente' que nenhum processo tem na
+    fila: liberados num encerramento ou agendados há mais de JOB_TIMEOUT por um
+    processo que morreu. Cada job é reservado com um UPDATE condicional em
+    agendado_em, então workers subindo juntos não agendam o mesmo job duas vezes.
     """
-    Processa a emissão das certidões em background e atualiza o registro da análise.
+    db = SessionLocal()
+    try:
+        corte = datetime.utcnow() - JOB_TIMEOUT
+        livre = (CertidaoJob.agendado_em.is_(None)) | (CertidaoJob.agendado_em < corte)
+        candidatos = (
+            db.query(CertidaoJob.id, CertidaoJob.emissor, CertidaoJob.lote_id, Proprietario.nome_mae, Analise.usuario_id)
+            .join(Analise, Analise.id == CertidaoJob.analise_id)
+            .outerjoin(Proprietario, Proprietario.id == CertidaoJob.proprietario_id)
+            .filter(CertidaoJob.status == StatusCertidao.pendente.value, livre)
+            .order_by(CertidaoJob.id)
+            .all()
+        )
+        retomados = 0
+        for job_id, emissor, lote_id, nome_mae, usuario_id in candidatos:
+            reservado = (
+                db.query(CertidaoJob)
+                .filter(CertidaoJob.id == job_id, CertidaoJob.status == StatusCertidao.pendente.value, livre)
+                .update({CertidaoJob.agendado_em: datetime.utcnow()}, synchronize_session=False)
+            )
+            db.commit()
+            if not reservado:
+                continue
+            # Sem o pedido original: lote volta como lote, o resto como interativa com prazo novo
+            if lote_id is not None:
+                prioridade, prazo = PRIORIDADE_LOTE, None
+            else:
+                prioridade, prazo = PRIORIDADE_INTERATIVA, time.time() + PRAZO_INTERATIVO
+            agendador.submeter(
+                emissor, executar_job_agendado, job_id, nome_mae,
+                prioridade=prioridade, usuario_id=usuario_id, prazo=prazo
+            )
+            retomados += 1
+        return retomados
+    finally:
+        db.close()
+
+def process_certidoes(analise_id: int, cnpj_cpf: str, nome_mae: str, doc_type: str, db: Session, force: bool = False):
+    """
+    Planeja a emissão das certidões e as entrega ao agendador global.
     O parâmetro doc_type define se o documento é para CPF ou CNPJ.
+    Só vão ao emissor as certidões que faltam, falharam ou venceram; uma nova
+    chamada sem nada vencido não faz nenhuma emissão. force=True reemite todas.
     """
     # Busca a análise pelo ID
     analise = db.query(Analise).filter(Analise.id == analise_id).first()
@@ -44,51 +427,18 @@ def process_certidoes(analise_id: int, cnpj_cpf: str, nome_mae: str, doc_type: s
         # Se a análise não for encontrada, encerra o processamento
         return
 
-    # Emite as certidões conforme o tipo (CPF ou CNPJ)
-    certidoes = []
-    if doc_type.upper() == "CPF":
-        cert_criminal = process_cpf_criminal(cnpj_cpf)
-        cert_civel = process_cpf_civel(cnpj_cpf)
-        cert_eleitoral = process_cpf_eleitoral(cnpj_cpf)
-        cert_nada_consta_especial = process_nada_consta_especial(cnpj_cpf, nome_mae)
-        cert_receita = process_cpf_receita(cnpj_cpf)
-        certidoes = [cert_criminal, cert_civel, cert_eleitoral, cert_nada_consta_especial, cert_receita]
-    elif doc_type.upper() == "CNPJ":
-        cert_criminal = process_cnpj_criminal(cnpj_cpf)
-        cert_civel = process_cnpj_civel(cnpj_cpf)
-        cert_eleitoral = process_cnpj_eleitoral(cnpj_cpf)
-        certidoes = [cert_criminal, cert_civel, cert_eleitoral]
-    else:
+    doc_type = doc_type.upper()
+    if doc_type not in EMISSORES:
         # Se o tipo não for reconhecido, encerra ou lança exceção conforme necessário
         return
 
-    # Exemplo de atualização dos dados no primeiro proprietário associado à análise
+    # As certidões são vinculadas ao primeiro proprietário associado à análise
     proprietario = db.query(Proprietario).filter(Proprietario.analise_id == analise_id).first()
-    if proprietario:
-        for cert in certidoes:
-            tipo_doc = cert.get("tipo_doc")
-            arquivo_url = cert.get("arquivo_url")
-            # Atualiza campos diferentes conforme o tipo de certidão
-            if tipo_doc == "CRIMINAL":
-                proprietario.pdf_tjdf_criminal = arquivo_url
-            elif tipo_doc == "CIVEL":
-                proprietario.pdf_tjdf_civel = arquivo_url
-            elif tipo_doc == "ELEITORAL":
-                proprietario.pdf_tjdf_eleitoral = arquivo_url
-            elif tipo_doc == "ESPECIAL":
-                proprietario.pdf_nada_consta_especial = arquivo_url
-            elif tipo_doc == "RECEITA":
-                proprietario.pdf_receita = arquivo_url
-            # Adicione outras condições conforme a necessidade para outros tipos de certidões
-
-    # Atualiza o status da análise e, opcionalmente, define um link principal
-    analise.status = "concluida"
-    if certidoes:
-        merged_pdf_filename = merge_certidoes_pdfs(certidoes)
-        analise.link_pdf = f"http://local.juk.re:8000/files/{merged_pdf_filename}"
-        # analise.link_pdf = certidoes[0].get("arquivo_url")
-    
-    db.commit()
+    jobs = planejar_jobs(db, analise_id, proprietario.id if proprietario else None, cnpj_cpf, doc_type, force=force)
+    agendar_jobs(
+        db, analise, [(job, nome_mae) for job in jobs],
+        prioridade=PRIORIDADE_INTERATIVA, prazo=time.time() + PRAZO_INTERATIVO
+    )
 
 def merge_certidoes_pdfs(certidoes: list) -> str:
     """
@@ -96,18 +446,20 @@ def merge_certidoes_pdfs(certidoes: list) -> str:
     Cada dicionário em `certidoes` deve conter a chave "arquivo" com o nome do arquivo PDF gerado.
     Retorna o novo nome do arquivo mesclado.
     """
-    merger = PdfMerger()
-    for cert in certidoes:
-        pdf_filename = cert.get("arquivo")
-        if pdf_filename:
-            file_path = os.path.join("files", pdf_filename)
-            if os.path.exists(file_path):
-                merger.append(file_path)
+    from relatorio_pdf import mesclar_pdfs
+
+    armazenamento = get_armazenamento()
     # Gera um novo nome para o PDF mesclado
     merged_filename = f"{str(uuid.uuid4())}_merged.pdf"
-    merged_filepath = os.path.join("files", merged_filename)
-    merger.write(merged_filepath)
-    merger.close()
+    descritor, merged_filepath = tempfile.mkstemp(suffix="_merged.pdf")
+    os.close(descritor)
+    try:
+        with armazenamento.arquivos_locais([cert["arquivo"] for cert in certidoes if cert.get("arquivo")]) as caminhos:
+            mesclar_pdfs(caminhos, merged_filepath)
+        armazenamento.enviar_arquivo(merged_filename, merged_filepath)
+    finally:
+        if os.path.exists(merged_filepath):
+            os.remove(merged_filepath)
     return merged_filename
 
 @router.post("/analises/certidoes/")
@@ -117,6 +469,7 @@ def emitir_certidoes_endpoint(
     nome_mae: str,
     doc_type: str,
     background_tasks: BackgroundTasks,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -125,6 +478,175 @@ def emitir_certidoes_endpoint(
       - analise_id: ID da análise cadastrada
       - cnpj_cpf: CPF ou CNPJ a ser processado
       - doc_type: 'CPF' ou 'CNPJ', definindo qual fluxo utilizar
+      - force: reemite também as certidões já guardadas e vigentes
     """
-    background_tasks.add_task(process_certidoes, analise_id, cnpj_cpf, nome_mae, doc_type, db)
+    # Número inválido falharia em cada emissor, depois de uma chamada lenta para cada um.
+    # Segue só com os dígitos, como no lote: a chave única dos jobs compara o documento gravado
+    if doc_type.upper() in EMISSORES:
+        try:
+            cnpj_cpf = validar(cnpj_cpf, doc_type.upper())
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    background_tasks.add_task(process_certidoes, analise_id, cnpj_cpf, nome_mae, doc_type, db, force)
     return {"message": "Emissão das certidões iniciada em background."}
+
+
+@router.get("/analises/{analise_id}/certidoes/")
+def get_progresso_certidoes(analise_id: int, db: Session = Depends(get_db)):
+    """
+    Progresso por certidão da análise: contagem por status (para dashboards)
+    e o detalhe de cada job (emissor, tentativas, tempos, erro e arquivo).
+    Análises arquivadas são lidas do arquivo (arquivamento.py).
+    """
+    atributos = CertidaoJob.__mapper__.column_attrs.keys()
+    jobs = [
+        {nome: getattr(job, nome) for nome in atributos}
+        for job in db.query(CertidaoJob).filter(CertidaoJob.analise_id == analise_id).order_by(CertidaoJob.id)
+    ]
+    if not jobs:
+        arquivada = linhas_arquivadas(db, analise_id, tipados=True)
+        jobs = sorted(arquivada["certidao_job"], key=lambda job: job["id"]) if arquivada else []
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Nenhuma certidão encontrada para esta análise")
+    resumo = {status.value: 0 for status in StatusCertidao}
+    for job in jobs:
+        resumo[job["status"]] = resumo.get(job["status"], 0) + 1
+    certidoes = []
+    for job in jobs:
+        certidao = {nome: job.get(nome) for nome in atributos}
+        certidao["arquivo_url"] = resolver(job["arquivo"] or job["arquivo_url"])
+        certidoes.append(certidao)
+    return {"analise_id": analise_id, "total": len(jobs), "por_status": resumo, "certidoes": certidoes}
+
+
+@router.get("/analises/{analise_id}/certidoes/resultados/")
+def get_resultados_certidoes(analise_id: int, texto: bool = False, db: Session = Depends(get_db)):
+    """
+    Campos extraídos de cada certidão emitida (nome, documento, datas e pendência),
+    lidos das colunas indexadas (ou do arquivo, se a análise foi arquivada).
+    texto=true inclui o texto completo da certidão.
+    """
+    atributos = CertidaoResultado.__mapper__.column_attrs.keys()
+    resultados = [
+        {nome: getattr(resultado, nome) for nome in atributos}
+        for resultado in (
+            db.query(CertidaoResultado)
+            .filter(CertidaoResultado.analise_id == analise_id)
+            .order_by(CertidaoResultado.job_id)
+        )
+    ]
+    if not resultados:
+        arquivada = linhas_arquivadas(db, analise_id, tipados=True)
+        if arquivada:
+            resultados = sorted(arquivada["certidao_resultado"], key=lambda resultado: resultado["job_id"])
+    if not resultados:
+        raise HTTPException(status_code=404, detail="Nenhum resultado de certidão para esta análise")
+    return [
+        {
+            "job_id": resultado["job_id"],
+            "emissor": resultado["emissor"],
+            "tipo_doc": resultado["tipo_doc"],
+            "documento": resultado["documento"],
+            "nome": resultado["nome"],
+            "pendencia": bool(resultado["pendencia"]),
+            "data_emissao": resultado["data_emissao"],
+            "validade": resultado["validade"],
+            "texto": descomprimir_texto(resultado["texto"]) if texto else None,
+        }
+        for resultado in resultados
+    ]
+
+
+@router.post("/analises/certidoes/lote/")
+def emitir_certidoes_lote(payload: LoteEmissaoPayload, db: Session = Depends(get_db)):
+    """
+    Emite as certidões de várias análises com uma chamada: lista de analise_ids
+    ou filtro por status (ex.: todas as análises 'pendente'). Os documentos vêm
+    dos proprietários cadastrados; as certidões entram no agendador global, que
+    respeita o limite de concorrência de cada emissor. Por padrão o lote tem
+    prioridade 'lote' e não atrasa as emissões interativas; um prazo adianta as
+    certidões quando está para vencer, em rodízio com as dos outros usuários.
+    """
+    if not payload.analise_ids and not payload.status:
+        raise HTTPException(status_code=400, detail="Informe analise_ids ou status")
+    # Prazo já conferido no schema (futuro, com fuso)
+    prazo = payload.prazo.timestamp() if payload.prazo else None
+    consulta = db.query(Analise)
+    if payload.analise_ids:
+        consulta = consulta.filter(Analise.id.in_(payload.analise_ids))
+    if payload.status:
+        consulta = consulta.filter(Analise.status == payload.status)
+    analises = consulta.order_by(Analise.id).all()
+    if not analises:
+        raise HTTPException(status_code=404, detail="Nenhuma análise encontrada para o lote")
+
+    filtro = f"status={payload.status}" if payload.status else ""
+    if payload.analise_ids:
+        filtro = f"{filtro} ids={len(payload.analise_ids)}".strip()
+    lote = LoteEmissao(filtro=filtro, total_analises=len(analises))
+    db.add(lote)
+    db.commit()
+
+    proprietarios = {}
+    for prop in (
+        db.query(Proprietario)
+        .filter(Proprietario.analise_id.in_([analise.id for analise in analises]))
+        .order_by(Proprietario.id)
+    ):
+        proprietarios.setdefault(prop.analise_id, []).append(prop)
+
+    total_certidoes = 0
+    documentos_invalidos = 0
+    for analise in analises:
+        jobs_analise = []
+        for prop in proprietarios.get(analise.id, []):
+            if not prop.cpf_cnpj:
+                continue
+            doc_type = "CNPJ" if prop.e_empresa else "CPF"
+            # Cadastros anteriores à validação nos schemas podem ter número inválido
+            if not documento_valido(prop.cpf_cnpj, doc_type):
+                documentos_invalidos += 1
+                continue
+            jobs = planejar_jobs(db, analise.id, prop.id, prop.cpf_cnpj, doc_type, lote_id=lote.id, force=payload.force)
+            jobs_analise += [(job, prop.nome_mae) for job in jobs]
+        total_certidoes += len(jobs_analise)
+        agendar_jobs(db, analise, jobs_analise, prioridade=PRIORIDADE_LOTE, prazo=prazo)
+
+    lote.total_certidoes = total_certidoes
+    db.commit()
+    return {
+        "lote_id": lote.id,
+        "total_analises": lote.total_analises,
+        "total_certidoes": total_certidoes,
+        "documentos_invalidos": documentos_invalidos,
+    }
+
+
+@router.get("/analises/certidoes/lote/{lote_id}/")
+def get_progresso_lote(lote_id: int, db: Session = Depends(get_db)):
+    """Progresso agregado do lote: certidões por status e análises já finalizadas."""
+    lote = db.query(LoteEmissao).filter(LoteEmissao.id == lote_id).first()
+    if not lote:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    por_status = {status.value: 0 for status in StatusCertidao}
+    for status, total in (
+        db.query(CertidaoJob.status, func.count(CertidaoJob.id))
+        .filter(CertidaoJob.lote_id == lote_id)
+        .group_by(CertidaoJob.status)
+    ):
+        por_status[status] = total
+    analises_lote = db.query(CertidaoJob.analise_id).filter(CertidaoJob.lote_id == lote_id).distinct()
+    finalizadas = (
+        db.query(func.count(Analise.id))
+        .filter(Analise.id.in_(analises_lote), Analise.status.in_(STATUS_FINAIS))
+        .scalar()
+    )
+    return {
+        "lote_id": lote.id,
+        "criado_em": lote.criado_em,
+        "total_analises": lote.total_analises,
+        "analises_finalizadas": finalizadas,
+        "total_certidoes": lote.total_certidoes,
+        "por_status": por_status,
+        "fila": agendador.estatisticas(),
+    }
@@ -0,0 +1,161 @@
+# Coleta dos arquivos órfãos do armazenamento (PDFs sem referência no banco)
+# gc_arquivos.py
+#
+# Uso: python manage.py gc [--simular] [--intervalo SEGUNDOS]
+#
+# Um arquivo é alcançável se alguma linha do banco aponta para ele: colunas pdf_*
+# de proprietário e cônjuge, imovel.pdf_sefaz, analise.link_pdf e os arquivos dos
+# jobs de certidão (usados pelo relatório e pelo reaproveitamento de certidões),
+# inclusive os das análises arquivadas (analise_arquivo.arquivos).
+# Relatórios em relatorios/<id>_*.pdf pertencem à análise <id> enquanto ela existir.
+#
+# Convivência com emissões em andamento: o arquivo é gravado antes de a chave ir
+# para o banco, então só entram na coleta arquivos mais velhos que GC_CARENCIA_HORAS.
+# Chaves novas no banco são sempre de arquivos recém-gravados (nome com uuid) ou
+# já referenciadas por outra linha, então um arquivo velho fora do retrato do banco
+# não volta a ser referenciado.
+import logging
+import os
+import re
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from armazenamento import chave_do_valor, get_armazenamento
+from models import Analise, AnaliseArquivada, CertidaoJob, EsposaSocio, Imovel, Proprietario
+from relatorio import PREFIXO_RELATORIOS
+from respostas import URLS_CONJUGE, URLS_PROPRIETARIO
+
+logger = logging.getLogger(__name__)
+
+# Idade mínima (desde a gravação) para um arquivo sem referência ser coletado
+GC_CARENCIA_HORAS = float(os.getenv("GC_CARENCIA_HORAS", "24"))
+# "arquivar": move para GC_PREFIXO_ARQUIVO e só apaga depois de GC_RETENCAO_DIAS; "remover": apaga direto
+GC_ACAO = os.getenv("GC_ACAO", "arquivar")
+GC_PREFIXO_ARQUIVO = os.getenv("GC_PREFIXO_ARQUIVO", "arquivados/")
+GC_RETENCAO_DIAS = float(os.getenv("GC_RETENCAO_DIAS", "30"))
+# Arquivos tratados por lote e pausa (segundos) entre lotes, para não disputar I/O com a API
+GC_LOTE = int(os.getenv("GC_LOTE", "500"))
+GC_PAUSA = float(os.getenv("GC_PAUSA", "0.5"))
+
+_RELATORIO = re.compile(rf"^{re.escape(PREFIXO_RELATORIOS)}(\d+)_")
+
+
+def _chave(valor: str):
+    # Chave gravada direto (atual) ou URL antiga .../files/<nome>; caminhos da API ('/analises/...') não são arquivos
+    if not valor or valor.startswith("/"):
+        return None
+    if valor.startswith(("http://", "https://")):
+        return chave_do_valor(valor)
+    return valor
+
+
+def alcancaveis(db: Session, lote: int = 5000) -> set:
+    """Chaves referenciadas pelo banco (lidas em blocos, só as colunas de arquivo)."""
+    consultas = [
+        select(*(getattr(Proprietario, nome) for nome in URLS_PROPRIETARIO)),
+        select(*(getattr(EsposaSocio, nome) for nome in URLS_CONJUGE)),
+        select(Imovel.pdf_sefaz),
+        select(Analise.link_pdf),
+        select(CertidaoJob.arquivo, CertidaoJob.arquivo_url),
+    ]
+    chaves = set()
+    for consulta in consultas:
+        for linha in db.execute(consulta.execution_options(yield_per=lote)):
+            chaves.update(chave for chave in map(_chave, linha) if chave)
+    for arquivos in db.execute(select(AnaliseArquivada.arquivos).execution_options(yield_per=lote)).scalars():
+        chaves.update(chave for chave in map(_chave, (arquivos or "").split("\n")) if chave)
+    return chaves
+
+
+def _travar(db: Session):
+    """
+    Uma coleta por vez entre processos e máquinas (GET_LOCK do MySQL, preso a uma
+    conexão própria). Retorna a conexão da trava, True sem MySQL, ou None se ocupada.
+    """
+    engine = db.get_bind()
+    if engine.dialect.name != "mysql":
+        return True
+    conexao = engine.connect()
+    if conexao.execute(text("SELECT GET_LOCK('gc_arquivos', 0)")).scalar():
+        return conexao
+    conexao.close()
+    return None
+
+
+def _destravar(trava):
+    if trava is not True:
+        trava.execute(text("SELECT RELEASE_LOCK('gc_arquivos')"))
+        trava.close()
+
+
+def _em_lotes(itens, tamanho: int):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def coletar(db: Session, simular: bool = False, acao: str = GC_ACAO, limite: int = None) -> dict:
+    """
+    Uma passada completa: arquiva (ou remove) os órfãos e apaga os arquivados
+    há mais de GC_RETENCAO_DIAS. limite: máximo de arquivos tratados nesta passada.
+    Retorna as contagens (e os bytes liberados) por tipo de ação.
+    """
+    if acao not in ("arquivar", "remover"):
+        raise ValueError(f"GC_ACAO inválida: {acao}")
+    estatisticas = {"analisados": 0, "arquivados": 0, "removidos": 0, "expirados": 0, "bytes": 0}
+    trava = _travar(db)
+    if trava is None:
+        logger.info("Outra coleta em andamento; nada a fazer")
+        return estatisticas
+    try:
+        armazenamento = get_armazenamento()
+        agora = time.time()
+        carencia = agora - GC_CARENCIA_HORAS * 3600
+        retencao = agora - GC_RETENCAO_DIAS * 86400
+        referenciadas = alcancaveis(db)
+        analises = set(db.execute(select(Analise.id)).scalars())
+        analises.update(db.execute(select(AnaliseArquivada.id)).scalars())
+        db.rollback()  # não segura transação (nem snapshot) durante a varredura
+
+        def candidatos():
+            for chave, info in armazenamento.listar_com_info():
+                estatisticas["analisados"] += 1
+                if chave.startswith(GC_PREFIXO_ARQUIVO):
+                    if info["modificado"] < retencao:
+                        yield "expirados", chave, info
+                    continue
+                if info["modificado"] >= carencia or chave in referenciadas:
+                    continue
+                relatorio = _RELATORIO.match(chave)
+                if relatorio and int(relatorio.group(1)) in analises:
+                    continue
+                yield ("arquivados" if acao == "arquivar" else "removidos"), chave, info
+
+        tratados = 0
+        for lote in _em_lotes(candidatos(), GC_LOTE):
+            if limite is not None:
+                lote = lote[:limite - tratados]
+            for tipo, chave, info in lote:
+                if not simular:
+                    if tipo == "arquivados":
+                        armazenamento.mover(chave, f"{GC_PREFIXO_ARQUIVO}{chave}")
+                    else:
+                        armazenamento.remover(chave)
+                estatisticas[tipo] += 1
+                if tipo != "arquivados":
+                    estatisticas["bytes"] += info["tamanho"]
+            tratados += len(lote)
+            logger.info("GC: %s", estatisticas)
+            if limite is not None and tratados >= limite:
+                break
+            time.sleep(GC_PAUSA)
+    finally:
+        _destravar(trava)
+    return estatisticas
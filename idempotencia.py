@@ -0,0 +1,103 @@
+# Repetição segura de POSTs com o cabeçalho Idempotency-Key
+# idempotencia.py
+#
+# O cliente manda a mesma chave ao repetir um pedido (timeout, queda de conexão).
+# A primeira execução grava as linhas e a resposta na mesma transação; as
+# repetições devolvem a resposta gravada, sem criar nada de novo. A mesma chave
+# com outro corpo é recusada (422).
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import ChaveIdempotencia
+
+# Por quanto tempo uma chave devolve a resposta original (depois disso pode ser reutilizada)
+IDEMPOTENCIA_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24")))
+TAMANHO_MAXIMO_CHAVE = 255
+
+
+def hash_chave(rota: str, chave: str) -> str:
+    # Índice único de tamanho fixo, e a mesma chave em rotas diferentes não colide
+    return hashlib.sha256(f"{rota}:{chave}".encode()).hexdigest()
+
+
+def impressao(payload) -> str:
+    """sha256 do corpo em JSON canônico (chaves ordenadas, sem espaços)."""
+    canonico = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonico.encode()).hexdigest()
+
+
+def _resposta_gravada(db: Session, chave_hash: str, impressao_corpo: str):
+    registro = db.execute(
+        select(ChaveIdempotencia.impressao, ChaveIdempotencia.resposta, ChaveIdempotencia.criado_em)
+        .where(ChaveIdempotencia.chave_hash == chave_hash)
+    ).first()
+    if registro is None:
+        return None
+    if registro.criado_em < datetime.utcnow() - IDEMPOTENCIA_TTL:
+        # Vencida: libera a chave (a remoção vai junto no commit da nova execução)
+        db.execute(delete(ChaveIdempotencia).where(ChaveIdempotencia.chave_hash == chave_hash))
+        return None
+    if registro.impressao != impressao_corpo:
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada com outro corpo")
+    return json.loads(registro.resposta)
+
+
+def executar_idempotente(db: Session, rota: str, chave, payload, criar) -> tuple:
+    """
+    Executa criar() (que só faz add/flush, sem commit) e grava tudo em um único commit.
+    Com chave, a resposta fica registrada e as repetições a recebem de volta.
+    Retorna (resposta, repetida).
+    """
+    if not chave:
+        resposta = criar()
+        db.commit()
+        return resposta, False
+    if len(chave) > TAMANHO_MAXIMO_CHAVE:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key maior que {TAMANHO_MAXIMO_CHAVE} caracteres")
+
+    chave_hash, impressao_corpo = hash_chave(rota, chave), impressao(payload)
+    gravada = _resposta_gravada(db, chave_hash, impressao_corpo)
+    if gravada is not None:
+        return gravada, True
+
+    resposta = criar()
+    db.add(ChaveIdempotencia(
+        chave_hash=chave_hash,
+        rota=rota,
+        impressao=impressao_corpo,
+        resposta=json.dumps(jsonable_encoder(resposta)),
+        criado_em=datetime.utcnow()
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Outra requisição com a mesma chave gravou primeiro: esta é desfeita inteira
+        db.rollback()
+        gravada = _resposta_gravada(db, chave_hash, impressao_corpo)
+        if gravada is None:
+            raise
+        return gravada, True
+    return resposta, False
+
+
+def limpar_vencidas(db: Session, lote: int = 1000) -> int:
+    """Apaga as chaves vencidas em lotes (python manage.py idempotencia)."""
+    limite = datetime.utcnow() - IDEMPOTENCIA_TTL
+    total = 0
+    while True:
+        ids = db.execute(
+            select(ChaveIdempotencia.id).where(ChaveIdempotencia.criado_em < limite).limit(lote)
+        ).scalars().all()
+        if not ids:
+            return total
+        db.execute(delete(ChaveIdempotencia).where(ChaveIdempotencia.id.in_(ids)))
+        db.commit()
+        total += len(ids)
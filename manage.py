@@ -0,0 +1,195 @@
+# Comandos de manutenção (fora do processo da API)
+# manage.py
+#
+#   python manage.py schema          cria as tabelas que ainda não existem
+#   python manage.py schema --sql    só mostra o DDL, sem conectar ao banco
+#   python manage.py idempotencia    apaga as Idempotency-Keys vencidas
+#   python manage.py gc              arquiva/remove os arquivos órfãos (--simular, --intervalo)
+#   python manage.py documentos      preenche os documentos normalizados das linhas antigas (e dos jobs)
+#   python manage.py arquivar        move as análises concluídas antigas para o arquivo (--meses, --restaurar, --indexar)
+#   python manage.py webhook-receptor recebe e mostra webhooks localmente (--segredo, --falhar;
+#                                     a API precisa de WEBHOOK_REDES_PERMITIDAS=127.0.0.1/32)
+import argparse
+import sys
+
+
+def comando_schema(args):
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    import models  # noqa: F401  (registra as tabelas no Base)
+    from db import Base, DATABASE_URL, get_engine
+
+    if args.sql:
+        from sqlalchemy import create_mock_engine
+
+        dialeto = create_mock_engine(DATABASE_URL, lambda *a, **kw: None).dialect
+        for tabela in Base.metadata.sorted_tables:
+            print(f"{str(CreateTable(tabela).compile(dialect=dialeto)).strip()};\n")
+            for indice in tabela.indexes:
+                print(f"{str(CreateIndex(indice).compile(dialect=dialeto)).strip()};\n")
+        return 0
+    engine = get_engine()
+    existentes = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    criadas = [tabela.name for tabela in Base.metadata.sorted_tables if tabela.name not in existentes]
+    print(f"Tabelas criadas: {', '.join(criadas)}" if criadas else "Schema já atualizado")
+    return 0
+
+
+def comando_idempotencia(args):
+    from db import SessionLocal
+    from idempotencia import limpar_vencidas
+
+    db = SessionLocal()
+    try:
+        print(f"Chaves vencidas apagadas: {limpar_vencidas(db)}")
+    finally:
+        db.close()
+    return 0
+
+
+def comando_gc(args):
+    import logging
+    import time
+
+    from db import SessionLocal
+    from gc_arquivos import GC_ACAO, coletar
+
+    logging.basicConfig(level=logging.INFO)
+    while True:
+        db = SessionLocal()
+        try:
+            estatisticas = coletar(db, simular=args.simular, acao=args.acao or GC_ACAO, limite=args.limite)
+        finally:
+            db.close()
+        print(("[simulação] " if args.simular else "") + ", ".join(f"{k}: {v}" for k, v in estatisticas.items()))
+        if not args.intervalo:
+            return 0
+        time.sleep(args.intervalo)
+
+
+def comando_documentos(args):
+    from db import SessionLocal
+    from documentos import preencher_documentos
+
+    db = SessionLocal()
+    try:
+        print(f"Linhas atualizadas: {preencher_documentos(db, lote=args.lote)}")
+    finally:
+        db.close()
+    return 0
+
+
+def comando_arquivar(args):
+    import logging
+
+    from arquivamento import ARQUIVAR_APOS_MESES, arquivar, indexar_documentos, restaurar
+    from db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if args.restaurar is not None:
+            if not restaurar(db, args.restaurar):
+                print(f"Análise {args.restaurar} não está no arquivo")
+                return 1
+            print(f"Análise {args.restaurar} restaurada")
+            return 0
+        if args.indexar:
+            print(f"{indexar_documentos(db)} análises arquivadas indexadas por documento")
+            return 0
+        estatisticas = arquivar(db, meses=args.meses or ARQUIVAR_APOS_MESES, simular=args.simular, limite=args.limite)
+    finally:
+        db.close()
+    print(("[simulação] " if args.simular else "") + ", ".join(f"{k}: {v}" for k, v in estatisticas.items()))
+    return 0
+
+
+def comando_webhook_receptor(args):
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from webhooks import assinatura_valida
+
+    falhas = {"restantes": args.falhar}
+
+    class Receptor(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            valida = args.segredo is None or assinatura_valida(
+                args.segredo, self.headers.get("X-Webhook-Timestamp"), corpo, self.headers.get("X-Webhook-Assinatura")
+            )
+            if falhas["restantes"] > 0:
+                falhas["restantes"] -= 1
+                status = 503  # exercita as retentativas do despachante
+            else:
+                status = 204 if valida else 401
+            eventos = json.loads(corpo or b"{}").get("eventos", [])
+            print(
+                f"{status} lote {self.headers.get('X-Webhook-Id')} tentativa {self.headers.get('X-Webhook-Tentativa')}: "
+                f"{len(eventos)} eventos, assinatura {'ok' if valida else 'inválida'}",
+                flush=True,
+            )
+            for evento in eventos:
+                print(f"    {json.dumps(evento, ensure_ascii=False)}", flush=True)
+            self.send_response(status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((args.host, args.porta), Receptor)
+    print(f"Recebendo webhooks em http://{args.host}:{args.porta}/", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção da API de análises")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    schema = comandos.add_parser("schema", help="cria as tabelas que faltam (create_all)")
+    schema.add_argument("--sql", action="store_true", help="mostra o DDL em vez de aplicar")
+    schema.set_defaults(funcao=comando_schema)
+
+    idempotencia = comandos.add_parser("idempotencia", help="apaga as Idempotency-Keys vencidas")
+    idempotencia.set_defaults(funcao=comando_idempotencia)
+
+    gc = comandos.add_parser("gc", help="arquiva ou remove os arquivos sem referência no banco")
+    gc.add_argument("--simular", action="store_true", help="só conta, sem mover nem apagar")
+    gc.add_argument("--acao", choices=["arquivar", "remover"], help="padrão: GC_ACAO")
+    gc.add_argument("--limite", type=int, help="máximo de arquivos tratados por passada")
+    gc.add_argument("--intervalo", type=float, help="repete a cada N segundos (processo de fundo)")
+    gc.set_defaults(funcao=comando_gc)
+
+    documentos = comandos.add_parser("documentos", help="preenche as colunas de documento normalizado")
+    documentos.add_argument("--lote", type=int, default=1000)
+    documentos.set_defaults(funcao=comando_documentos)
+
+    arquivar = comandos.add_parser("arquivar", help="move as análises concluídas antigas para analise_arquivo")
+    arquivar.add_argument("--meses", type=int, help="idade mínima da análise (padrão: ARQUIVAR_APOS_MESES)")
+    arquivar.add_argument("--simular", action="store_true", help="só conta as candidatas")
+    arquivar.add_argument("--limite", type=int, help="máximo de análises arquivadas nesta execução")
+    arquivar.add_argument("--restaurar", type=int, metavar="ID", help="devolve a análise às tabelas quentes")
+    arquivar.add_argument("--indexar", action="store_true", help="indexa por CPF/CNPJ as análises já arquivadas")
+    arquivar.set_defaults(funcao=comando_arquivar)
+
+    receptor = comandos.add_parser("webhook-receptor", help="servidor HTTP local que recebe e mostra webhooks")
+    receptor.add_argument("--host", default="127.0.0.1")
+    receptor.add_argument("--porta", type=int, default=9000)
+    receptor.add_argument("--segredo", help="confere a assinatura HMAC (401 se inválida)")
+    receptor.add_argument("--falhar", type=int, default=0, help="responde 503 aos N primeiros lotes")
+    receptor.set_defaults(funcao=comando_webhook_receptor)
+
+    args = parser.parse_args(argv)
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
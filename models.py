@@ -1,16 +1,32 @@
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, Enum as SAEnum
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, ForeignKey, Text, LargeBinary, Index, UniqueConstraint, Enum as SAEnum
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
+from sqlalchemy.orm import sessionmaker, relationship, validates, Session
 from datetime import datetime, date
 import enum
-from db import Base, engine
+from db import Base
+from documentos import normalizar, tipo_documento
 
 # Enum para status da análise
 class StatusAnalise(enum.Enum):
     pendente = "pendente"
     em_progresso = "em_progresso"
     concluida = "concluida"
+    concluida_com_erros = "concluida_com_erros"  # alguma certidão falhou após a emissão
+
+# Enum para o veredito de risco da análise (mantido incrementalmente em resumo.py)
+class RiscoAnalise(enum.Enum):
+    pendente = "pendente"              # nenhuma certidão emitida ainda
+    sem_pendencias = "sem_pendencias"
+    com_pendencias = "com_pendencias"
+    inconclusivo = "inconclusivo"      # sem pendências, mas alguma certidão falhou
+
+# Enum para status de cada certidão (job de emissão)
+class StatusCertidao(enum.Enum):
+    pendente = "pendente"
+    executando = "executando"
+    sucesso = "sucesso"
+    erro = "erro"
 
 class Analise(Base):
     __tablename__ = "analise"
@@ -19,10 +35,16 @@ class Analise(Base):
     link_pdf = Column(String(255), nullable=True)
     resumo = Column(String(255), nullable=True)
     data = Column(DateTime, nullable=False, default=datetime.utcnow)
-    usuario_id = Column(String(45), nullable=True)  # No novo banco, é VARCHAR(45)
+    usuario_id = Column(String(45), nullable=True, index=True)  # No novo banco, é VARCHAR(45)
+    # Contadores e veredito atualizados a cada certidão (ver resumo.py)
+    risco = Column(String(20), nullable=True, index=True, default=RiscoAnalise.pendente.value)
+    total_certidoes = Column(Integer, nullable=False, default=0)
+    total_pendencias = Column(Integer, nullable=False, default=0)
+    total_erros = Column(Integer, nullable=False, default=0)
     # Relacionamentos
     proprietarios = relationship("Proprietario", back_populates="analise", cascade="all, delete")
     imovel = relationship("Imovel", back_populates="analise", uselist=False, cascade="all, delete")
+    certidoes = relationship("CertidaoJob", back_populates="analise", cascade="all, delete")
 
 
 class Proprietario(Base):
@@ -51,10 +73,25 @@ class Proprietario(Base):
     pdf_tjdf_eleitoral = Column(String(255), nullable=True)
     pdf_tjdf_civel = Column(String(255), nullable=True)
     ad = Column(String(255), nullable=True)
+    # Documentos só com dígitos, mantidos a partir de cpf_cnpj/cpf_representante (busca entre análises)
+    documento = Column(String(14), nullable=True, index=True)
+    tipo_documento = Column(String(4), nullable=True)  # CPF ou CNPJ
+    documento_representante = Column(String(14), nullable=True, index=True)
     # Relacionamentos
     analise = relationship("Analise", back_populates="proprietarios")
     conjuge = relationship("EsposaSocio", back_populates="proprietario", uselist=False, cascade="all, delete")
 
+    @validates("cpf_cnpj")
+    def _normalizar_documento(self, chave, valor):
+        self.documento = normalizar(valor)
+        self.tipo_documento = tipo_documento(self.documento)
+        return valor
+
+    @validates("cpf_representante")
+    def _normalizar_representante(self, chave, valor):
+        self.documento_representante = normalizar(valor)
+        return valor
+
 
 class EsposaSocio(Base):
     __tablename__ = "esposa_socio"
@@ -75,9 +112,18 @@ class EsposaSocio(Base):
     pdf_tjdf_eleitoral = Column(String(255), nullable=True)
     pdf_tjdf_civel = Column(String(255), nullable=True)
     ad = Column(String(255), nullable=True)
+    # Documento só com dígitos, mantido a partir de cpf
+    documento = Column(String(14), nullable=True, index=True)
+    tipo_documento = Column(String(4), nullable=True)  # CPF ou CNPJ
     # Relacionamento
     proprietario = relationship("Proprietario", back_populates="conjuge")
 
+    @validates("cpf")
+    def _normalizar_documento(self, chave, valor):
+        self.documento = normalizar(valor)
+        self.tipo_documento = tipo_documento(self.documento)
+        return valor
+
 
 class Imovel(Base):
     __tablename__ = "imovel"
@@ -93,7 +139,137 @@ class Imovel(Base):
     analise = relationship("Analise", back_populates="imovel")
 
 
-# Cria as tabelas (caso não existam)
-Base.metadata.create_all(bind=engine)
+class LoteEmissao(Base):
+    """Emissão disparada para várias análises de uma vez (POST /analises/certidoes/lote/)."""
+    __tablename__ = "lote_emissao"
+    id = Column("id_lote_emissao", Integer, primary_key=True, index=True)
+    filtro = Column(String(255), nullable=True)  # Descrição da seleção (ids ou status)
+    total_analises = Column(Integer, nullable=False, default=0)
+    total_certidoes = Column(Integer, nullable=False, default=0)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CertidaoJob(Base):
+    """Uma certidão (emissor + documento) a ser emitida para a análise."""
+    __tablename__ = "certidao_job"
+    __table_args__ = (
+        UniqueConstraint("analise_id", "emissor", "documento", name="unique_job_emissor_documento"),
+        # Certidão vigente do mesmo documento em qualquer análise (planejar_jobs)
+        Index("idx_job_documento_emissor", "documento", "emissor", "status"),
+    )
+    id = Column("id_certidao_job", Integer, primary_key=True, index=True)
+    analise_id = Column(Integer, ForeignKey("analise.id_analise"), nullable=False, index=True)
+    proprietario_id = Column(Integer, ForeignKey("proprietario.id_proprietario"), nullable=True)
+    lote_id = Column(Integer, ForeignKey("lote_emissao.id_lote_emissao"), nullable=True, index=True)
+    emissor = Column(String(45), nullable=False)  # Ex.: tjdf_criminal, nada_consta_especial, receita
+    tipo_documento = Column(String(4), nullable=False)  # CPF ou CNPJ
+    documento = Column(String(45), nullable=False)
+    status = Column(String(45), nullable=False, default=StatusCertidao.pendente.value)
+    tentativas = Column(Integer, nullable=False, default=0)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    agendado_em = Column(DateTime, nullable=True)  # Última vez que entrou na fila do agendador
+    iniciado_em = Column(DateTime, nullable=True)
+    finalizado_em = Column(DateTime, nullable=True)
+    duracao_ms = Column(Integer, nullable=True)
+    erro = Column(String(255), nullable=True)
+    arquivo = Column(String(255), nullable=True)
+    arquivo_url = Column(String(255), nullable=True)
+    estado_resumo = Column(String(20), nullable=True)  # Como o job está contabilizado no resumo da análise
+    # Relacionamentos
+    analise = relationship("Analise", back_populates="certidoes")
+    resultado = relationship("CertidaoResultado", back_populates="job", uselist=False, cascade="all, delete")
+
+
+class CertidaoResultado(Base):
+    """Texto extraído (comprimido com zlib) e campos estruturados da certidão emitida."""
+    __tablename__ = "certidao_resultado"
+    id = Column("id_certidao_resultado", Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("certidao_job.id_certidao_job"), nullable=False, unique=True)
+    analise_id = Column(Integer, ForeignKey("analise.id_analise"), nullable=False, index=True)
+    emissor = Column(String(45), nullable=False)
+    tipo_doc = Column(String(45), nullable=True)  # CRIMINAL, CIVEL, ELEITORAL, ESPECIAL, RECEITA...
+    documento = Column(String(14), nullable=True, index=True)  # Documento lido na certidão (só dígitos)
+    nome = Column(String(255), nullable=True)
+    pendencia = Column(Integer, nullable=True, index=True)  # 1 para True, 0 para False
+    data_emissao = Column(Date, nullable=True)
+    validade = Column(Date, nullable=True)
+    texto = Column(LargeBinary(length=16777215), nullable=True)  # MEDIUMBLOB no MySQL
+    texto_tamanho = Column(Integer, nullable=True)  # Tamanho do texto original, em caracteres
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Relacionamento
+    job = relationship("CertidaoJob", back_populates="resultado")
+
+
+class ChaveIdempotencia(Base):
+    """Resposta de um POST com Idempotency-Key, devolvida quando o cliente repete o pedido (ver idempotencia.py)."""
+    __tablename__ = "chave_idempotencia"
+    id = Column("id_chave_idempotencia", Integer, primary_key=True, index=True)
+    chave_hash = Column(String(64), nullable=False, unique=True)  # sha256(rota:chave)
+    rota = Column(String(45), nullable=False)
+    impressao = Column(String(64), nullable=False)  # sha256 do corpo canônico
+    resposta = Column(Text, nullable=False)  # JSON devolvido na primeira execução
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class WebhookAssinatura(Base):
+    """URL do usuário que recebe os eventos das suas análises (ver webhooks.py)."""
+    __tablename__ = "webhook_assinatura"
+    id = Column("id_webhook_assinatura", Integer, primary_key=True, index=True)
+    usuario_id = Column(String(45), nullable=False, index=True)
+    url = Column(String(500), nullable=False)
+    segredo = Column(String(64), nullable=False)  # Chave do HMAC enviado em X-Webhook-Assinatura
+    eventos = Column(String(100), nullable=False)  # Ex.: "analise.finalizada,certidao.finalizada"
+    ativo = Column(Integer, nullable=False, default=1)  # 1 para True, 0 para False
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class WebhookFalha(Base):
+    """Lote de eventos que esgotou as tentativas de entrega (dead letter), para reenvio manual."""
+    __tablename__ = "webhook_falha"
+    id = Column("id_webhook_falha", Integer, primary_key=True, index=True)
+    assinatura_id = Column(Integer, ForeignKey("webhook_assinatura.id_webhook_assinatura"), nullable=False, index=True)
+    url = Column(String(500), nullable=False)
+    eventos = Column(Text, nullable=False)  # JSON com a lista de eventos do lote
+    tentativas = Column(Integer, nullable=False, default=0)
+    erro = Column(String(255), nullable=True)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    reenviado_em = Column(DateTime, nullable=True)
+
+
+class AnaliseArquivada(Base):
+    """
+    Análise antiga fora das tabelas quentes (ver arquivamento.py). As colunas da
+    análise ficam em colunas (listagens e filtros); as linhas de todas as tabelas
+    da análise ficam em conteudo, JSON comprimido com zlib.
+    """
+    __tablename__ = "analise_arquivo"
+    __table_args__ = (
+        Index("idx_analise_arquivo_usuario_data", "usuario_id", "data"),
+    )
+    id = Column("id_analise", Integer, primary_key=True, autoincrement=False)
+    status = Column(String(45), nullable=True)
+    link_pdf = Column(String(255), nullable=True)
+    resumo = Column(String(255), nullable=True)
+    data = Column(DateTime, nullable=False, index=True)
+    usuario_id = Column(String(45), nullable=True)
+    risco = Column(String(20), nullable=True)
+    total_certidoes = Column(Integer, nullable=False, default=0)
+    total_pendencias = Column(Integer, nullable=False, default=0)
+    total_erros = Column(Integer, nullable=False, default=0)
+    arquivos = Column(Text, nullable=True)  # Chaves de arquivo referenciadas, uma por linha (gc_arquivos.py)
+    conteudo = Column(LargeBinary(length=16777215), nullable=False)  # MEDIUMBLOB no MySQL
+    arquivada_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ProprietarioArquivado(Base):
+    """Proprietário de uma análise arquivada -> análise (leituras por proprietario_id)."""
+    __tablename__ = "proprietario_arquivo"
+    id = Column("id_proprietario", Integer, primary_key=True, autoincrement=False)
+    analise_id = Column(Integer, ForeignKey("analise_arquivo.id_analise"), nullable=False, index=True)
 
 
+class DocumentoArquivado(Base):
+    """CPF/CNPJ (só dígitos) de proprietário, representante ou cônjuge de uma análise arquivada -> análise."""
+    __tablename__ = "documento_arquivo"
+    documento = Column(String(14), primary_key=True)
+    analise_id = Column(Integer, ForeignKey("analise_arquivo.id_analise"), primary_key=True, index=True)
@@ -0,0 +1,114 @@
+# Classificação do texto das certidões (nome, documento, datas e pendência)
+# parser_certidoes.py
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Uma única expressão com alternativas nomeadas: o texto é percorrido uma vez
+# e cada campo fica com a primeira ocorrência encontrada.
+PADRAO_CERTIDAO = re.compile(
+    r"CPF/CNPJ de:\s*\n\s*(?P<nome_cpf_cnpj_de>[^\n]+)"          # Nada Consta (TJDFT)
+    r"|Nome:[ \t]*(?P<nome_campo>[^\n]+?)[ \t]*\nCPF"                # Receita Federal
+    r"|(?<=\n)(?P<nome_ou>[^\n]+)(?=\nOU\n)"                         # TJDF/TRF1
+    r"|(?P<negativo>N[ÃA]O\s+CONSTAM|NADA\s+CONSTA)"
+    r"|(?:emitida|expedida|emiss[ãa]o)[^\n\d]{0,40}?(?P<data_emissao>\d{2}/\d{2}/\d{4})"
+    r"|(?:v[áa]lida\s+at[ée]|validade)[^\n\d]{0,40}?(?P<validade>\d{2}/\d{2}/\d{4})"
+    r"|(?<!\d)(?P<documento>\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}|\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?!\d)",
+    re.IGNORECASE
+)
+_NAO_DIGITO = re.compile(r"\D")
+# Frase que torna a certidão negativa, por família de emissor: a de uma família não
+# vale para as outras (ex.: "nada consta" citado numa certidão do TJDF/TRF1).
+# Cada trecho capturado pelo grupo "negativo" é conferido contra estas expressões.
+NEGATIVO = {
+    "tjdf": re.compile(r"N[ÃA]O\s+CONSTAM"),
+    "nada_consta": re.compile(r"NADA\s+CONSTA", re.IGNORECASE),
+    "receita": re.compile(r"N[ÃA]O\s+CONSTAM", re.IGNORECASE),
+}
+
+# Ordem de preferência do padrão de nome para cada família de emissor
+PRIORIDADE_NOME = {
+    "tjdf": ("nome_ou", "nome_cpf_cnpj_de", "nome_campo"),
+    "nada_consta": ("nome_cpf_cnpj_de", "nome_campo", "nome_ou"),
+    "receita": ("nome_campo", "nome_cpf_cnpj_de", "nome_ou"),
+}
+PRIORIDADE_PADRAO = ("nome_campo", "nome_cpf_cnpj_de", "nome_ou")
+
+
+def _data(valor: str):
+    try:
+        return datetime.strptime(valor, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def classificar_texto(texto: str, familia: str = None) -> dict:
+    """
+    Extrai em uma passada sobre o texto: nome, documento (só dígitos),
+    data de emissão, validade e pendência.
+    familia: 'tjdf', 'nada_consta' ou 'receita' (define qual padrão de nome prevalece
+    e qual frase torna a certidão negativa: "NÃO CONSTAM" em maiúsculas, "NADA
+    CONSTA" e "NÃO CONSTAM" em qualquer caixa, respectivamente; sem família, vale
+    qualquer uma delas).
+    Sem a frase da família no texto, a certidão é considerada com pendência.
+    """
+    campos = {}
+    negativas = set()  # famílias cuja frase negativa apareceu no texto
+    for match in PADRAO_CERTIDAO.finditer(texto or ""):
+        grupo = match.lastgroup
+        if grupo == "negativo":
+            negativas.update(f for f, frase in NEGATIVO.items() if frase.fullmatch(match.group(grupo)))
+        elif grupo not in campos:
+            campos[grupo] = match.group(grupo)
+
+    nome = ""
+    for grupo in PRIORIDADE_NOME.get(familia, PRIORIDADE_PADRAO):
+        if campos.get(grupo):
+            nome = campos[grupo].strip()
+            break
+
+    # Uma linha consumida como nome não chega à alternativa "negativo"
+    familias = (familia,) if familia in NEGATIVO else tuple(NEGATIVO)
+    negativo = any(f in negativas for f in familias) or any(
+        NEGATIVO[f].search(campos[grupo]) for f in familias for grupo in PRIORIDADE_PADRAO if campos.get(grupo)
+    )
+    documento = campos.get("documento")
+    return {
+        "nome": nome,
+        "documento": _NAO_DIGITO.sub("", documento) if documento else None,
+        "data_emissao": _data(campos.get("data_emissao")),
+        "validade": _data(campos.get("validade")),
+        "pendencia": not negativo,
+    }
+
+
+def _classificar_bloco(args):
+    textos, familia = args
+    return [classificar_texto(texto, familia) for texto in textos]
+
+
+def classificar_lote(textos, familia: str = None, processos: int = 1, tamanho_bloco: int = 500) -> list:
+    """
+    Reclassifica muitos textos (ex.: texto_doc já armazenados), na mesma ordem de entrada.
+    Com processos > 1 os textos são divididos em blocos entre processos.
+    """
+    textos = list(textos)
+    if processos <= 1 or len(textos) <= tamanho_bloco:
+        return [classificar_texto(texto, familia) for texto in textos]
+    blocos = [(textos[i:i + tamanho_bloco], familia) for i in range(0, len(textos), tamanho_bloco)]
+    resultado = []
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for parcial in executor.map(_classificar_bloco, blocos):
+            resultado.extend(parcial)
+    return resultado
+
+
+# Conferência das frases negativas por família: python parser_certidoes.py
+if __name__ == "__main__":
+    for texto in ("Certidão\nNÃO CONSTAM pendências", "Certidão\nnão constam pendências"):
+        assert not classificar_texto(texto, "receita")["pendencia"], texto
+    assert not classificar_texto("Certidão\nNÃO CONSTAM processos", "tjdf")["pendencia"]
+    assert classificar_texto("Certidão\nnão constam processos", "tjdf")["pendencia"]
+    assert classificar_texto("Certidão\nNADA CONSTA", "receita")["pendencia"]
+    assert not classificar_texto("Certidão\nNada consta", "nada_consta")["pendencia"]
+    print("ok")
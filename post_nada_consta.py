@@ -1,11 +1,13 @@
 # Acessa a API que tira as certidões do Nada Consta
 # post_nada_consta.py
-import os
-import re
+import io
 import uuid
 import requests
 from PyPDF2 import PdfReader
 
+from armazenamento import get_armazenamento
+from parser_certidoes import classificar_texto
+
 def process_nada_consta_civel(cpf: str, nome_mae: str) -> dict:
     # 1. Requisição à API com CPF e nome da mãe
     api_url = "https://docs.zukcode.com/tjdft/nada_consta/civel"
@@ -31,18 +33,13 @@ def process_nada_consta_civel(cpf: str, nome_mae: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{cpf}_nada_consta_civel.pdf"
     
-    # Cria a pasta "files" se ela não existir
-    folder = "files"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    
-    file_path = os.path.join(folder, novo_nome_arquivo)
-    with open(file_path, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3)
+    conteudo = file_response.content
+    get_armazenamento().salvar(novo_nome_arquivo, conteudo)
     
     # 3. Abre o PDF e extrai o texto para identificar pendências e o nome da pessoa
     try:
-        reader = PdfReader(file_path)
+        reader = PdfReader(io.BytesIO(conteudo))
         text = ""
         for page in reader.pages:
             page_text = page.extract_text()
@@ -51,24 +48,25 @@ def process_nada_consta_civel(cpf: str, nome_mae: str) -> dict:
     except Exception as e:
         return {"status": "erro", "mensagem": f"Erro ao extrair texto do PDF: {e}"}
     
+    # Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto contiver "NADA CONSTA", a pendência é negativa (pendencia = False)
-    pendencia = not ("NADA CONSTA" in text.upper())
+    classificacao = classificar_texto(text, "nada_consta")
+    pendencia = classificacao["pendencia"]
     
-    # Extrai o nome da pessoa: procura o padrão onde o nome está logo após "CPF/CNPJ de:"
-    nome = ""
-    match = re.search(r"CPF/CNPJ de:\s*\n\s*([^\n]+)", text)
-    if match:
-        nome = match.group(1).strip()
+    # Nome da pessoa: logo após "CPF/CNPJ de:"
+    nome = classificacao["nome"]
     
     # Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"https://docx.juk.re/files/{novo_nome_arquivo}",
         "tipo_doc": "CIVEL",
         "texto_doc": text,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -98,18 +96,13 @@ def process_nada_consta_criminal(cpf: str, nome_mae: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{cpf}_nada_consta_criminal.pdf"
     
-    # Cria a pasta "files" se ela não existir
-    folder = "files"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    
-    file_path = os.path.join(folder, novo_nome_arquivo)
-    with open(file_path, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3)
+    conteudo = file_response.content
+    get_armazenamento().salvar(novo_nome_arquivo, conteudo)
     
     # 3. Abre o PDF e extrai o texto para identificar pendências e o nome da pessoa
     try:
-        reader = PdfReader(file_path)
+        reader = PdfReader(io.BytesIO(conteudo))
         text = ""
         for page in reader.pages:
             page_text = page.extract_text()
@@ -118,24 +111,25 @@ def process_nada_consta_criminal(cpf: str, nome_mae: str) -> dict:
     except Exception as e:
         return {"status": "erro", "mensagem": f"Erro ao extrair texto do PDF: {e}"}
     
+    # Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto contiver "NADA CONSTA", a pendência é negativa (pendencia = False)
-    pendencia = not ("NADA CONSTA" in text.upper())
+    classificacao = classificar_texto(text, "nada_consta")
+    pendencia = classificacao["pendencia"]
     
-    # Extrai o nome da pessoa: procura o padrão onde o nome está logo após "CPF/CNPJ de:"
-    nome = ""
-    match = re.search(r"CPF/CNPJ de:\s*\n\s*([^\n]+)", text)
-    if match:
-        nome = match.group(1).strip()
+    # Nome da pessoa: logo após "CPF/CNPJ de:"
+    nome = classificacao["nome"]
     
     # Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"https://docx.juk.re/files/{novo_nome_arquivo}",
         "tipo_doc": "CRIMINAL",
         "texto_doc": text,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -165,18 +159,13 @@ def process_nada_consta_falencia(cpf: str, nome_mae: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{cpf}_nada_consta_falencia.pdf"
     
-    # Cria a pasta "files" se ela não existir
-    folder = "files"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    
-    file_path = os.path.join(folder, novo_nome_arquivo)
-    with open(file_path, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3)
+    conteudo = file_response.content
+    get_armazenamento().salvar(novo_nome_arquivo, conteudo)
     
     # 3. Abre o PDF e extrai o texto para identificar pendências e o nome da pessoa
     try:
-        reader = PdfReader(file_path)
+        reader = PdfReader(io.BytesIO(conteudo))
         text = ""
         for page in reader.pages:
             page_text = page.extract_text()
@@ -185,24 +174,25 @@ def process_nada_consta_falencia(cpf: str, nome_mae: str) -> dict:
     except Exception as e:
         return {"status": "erro", "mensagem": f"Erro ao extrair texto do PDF: {e}"}
     
+    # Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto contiver "NADA CONSTA", a pendência é negativa (pendencia = False)
-    pendencia = not ("NADA CONSTA" in text.upper())
+    classificacao = classificar_texto(text, "nada_consta")
+    pendencia = classificacao["pendencia"]
     
-    # Extrai o nome da pessoa: procura o padrão onde o nome está logo após "CPF/CNPJ de:"
-    nome = ""
-    match = re.search(r"CPF/CNPJ de:\s*\n\s*([^\n]+)", text)
-    if match:
-        nome = match.group(1).strip()
+    # Nome da pessoa: logo após "CPF/CNPJ de:"
+    nome = classificacao["nome"]
     
     # Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"https://docx.juk.re/files/{novo_nome_arquivo}",
         "tipo_doc": "FALENCIA",
         "texto_doc": text,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -232,18 +222,13 @@ def process_nada_consta_especial(cpf: str, nome_mae: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{cpf}_nada_consta_especial.pdf"
     
-    # Cria a pasta "files" se ela não existir
-    folder = "files"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    
-    file_path = os.path.join(folder, novo_nome_arquivo)
-    with open(file_path, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3)
+    conteudo = file_response.content
+    get_armazenamento().salvar(novo_nome_arquivo, conteudo)
     
     # 3. Abre o PDF e extrai o texto para identificar pendências e o nome da pessoa
     try:
-        reader = PdfReader(file_path)
+        reader = PdfReader(io.BytesIO(conteudo))
         text = ""
         for page in reader.pages:
             page_text = page.extract_text()
@@ -252,24 +237,25 @@ def process_nada_consta_especial(cpf: str, nome_mae: str) -> dict:
     except Exception as e:
         return {"status": "erro", "mensagem": f"Erro ao extrair texto do PDF: {e}"}
     
+    # Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto contiver "NADA CONSTA", a pendência é negativa (pendencia = False)
-    pendencia = not ("NADA CONSTA" in text.upper())
+    classificacao = classificar_texto(text, "nada_consta")
+    pendencia = classificacao["pendencia"]
     
-    # Extrai o nome da pessoa: procura o padrão onde o nome está logo após "CPF/CNPJ de:"
-    nome = ""
-    match = re.search(r"CPF/CNPJ de:\s*\n\s*([^\n]+)", text)
-    if match:
-        nome = match.group(1).strip()
+    # Nome da pessoa: logo após "CPF/CNPJ de:"
+    nome = classificacao["nome"]
     
     # Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"https://docx.juk.re/files/{novo_nome_arquivo}",
         "tipo_doc": "ESPECIAL",
         "texto_doc": text,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -1,22 +1,27 @@
 # Acessa a API que tira as certidões
 # post_receita.py
-import os
+import io
 import re
 import uuid
 import requests
 import PyPDF2
 
+from armazenamento import get_armazenamento
+from parser_certidoes import classificar_texto
 
-def extrair_texto_pdf(caminho_arquivo):
+# Espaços e tabulações repetidos no texto extraído
+ESPACOS = re.compile(r'[ \t]+')
+
+def extrair_texto_pdf(arquivo):
+    # arquivo: caminho ou stream (ex.: io.BytesIO com o PDF baixado)
     texto_extraido = ""
-    with open(caminho_arquivo, "rb") as f:
-        leitor = PyPDF2.PdfReader(f)
-        for pagina in leitor.pages:
-            texto_extraido += pagina.extract_text() or ""
+    leitor = PyPDF2.PdfReader(arquivo)
+    for pagina in leitor.pages:
+        texto_extraido += pagina.extract_text() or ""
     # Substitui caracteres não desejados (ex: non-breaking space \xa0) por espaço comum
     texto_limpo = texto_extraido.replace('\xa0', ' ')
     # Remove espaços extras e tabulações
-    texto_limpo = re.sub(r'[ \t]+', ' ', texto_limpo)
+    texto_limpo = ESPACOS.sub(' ', texto_limpo)
     # Remove linhas vazias e ajusta as quebras de linha
     texto_limpo = "\n".join([linha.strip() for linha in texto_limpo.splitlines() if linha.strip()])
     return texto_limpo
@@ -49,37 +54,33 @@ def process_cpf_receita(cpf: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
-    
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3)
+    conteudo = file_response.content
+    get_armazenamento().salvar(novo_nome_arquivo, conteudo)
 
      # Se a API não extraiu o texto, extraímos do PDF baixado
     if not texto:
-        texto = extrair_texto_pdf(caminho_arquivo)
+        texto = extrair_texto_pdf(io.BytesIO(conteudo))
     
-    # 4. Determina se há pendência
-    # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "não constam" not in texto
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
+    # Se o texto conter "NÃO CONSTAM" (qualquer caixa) a pendência é False
+    classificacao = classificar_texto(texto, "receita")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"Nome:(.+?)\nCPF", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "Nome:" e "\nCPF"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "RECEITA",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
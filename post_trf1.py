@@ -1,10 +1,13 @@
 # Acessa a API que tira as certidões do TJDF (trf1)
 # post_tjdf.py
-import os
-import re
 import uuid
 import requests
 
+from armazenamento import get_armazenamento
+from parser_certidoes import classificar_texto
+
+BLOCO_DOWNLOAD = 256 * 1024
+
 # CNPJ
 
 def process_cnpj_criminal(cnpj: str) -> dict:
@@ -24,7 +27,7 @@ def process_cnpj_criminal(cnpj: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -32,33 +35,28 @@ def process_cnpj_criminal(cnpj: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
-    
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "CRIMINAL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -80,7 +78,7 @@ def process_cnpj_civel(cnpj: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -88,33 +86,28 @@ def process_cnpj_civel(cnpj: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
-    
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "CIVEL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -136,7 +129,7 @@ def process_cnpj_eleitoral(cnpj: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -144,33 +137,28 @@ def process_cnpj_eleitoral(cnpj: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
-    
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "ELEITORAL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -194,7 +182,7 @@ def process_cpf_criminal(cpf: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -202,33 +190,28 @@ def process_cpf_criminal(cpf: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
-    
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "CRIMINAL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -250,7 +233,7 @@ def process_cpf_civel(cpf: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -258,33 +241,28 @@ def process_cpf_civel(cpf: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
-    
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "CIVEL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
@@ -306,7 +284,7 @@ def process_cpf_eleitoral(cpf: str) -> dict:
     
     # 2. Download do arquivo PDF
     download_url = f"https://docs.zukcode.com/docs/{arquivo_api}"
-    file_response = requests.get(download_url)
+    file_response = requests.get(download_url, stream=True)
     if file_response.status_code != 200:
         return {"status": "erro", "mensagem": f"Erro ao baixar o arquivo: {file_response.status_code}"}
     
@@ -314,33 +292,28 @@ def process_cpf_eleitoral(cpf: str) -> dict:
     unique_id = str(uuid.uuid4())
     novo_nome_arquivo = f"{unique_id}_{arquivo_api}"
     
-    # Cria a pasta "files" caso não exista
-    pasta = "files"
-    if not os.path.exists(pasta):
-        os.makedirs(pasta)
-    
-    caminho_arquivo = os.path.join(pasta, novo_nome_arquivo)
-    with open(caminho_arquivo, "wb") as f:
-        f.write(file_response.content)
+    # Grava no armazenamento configurado (pasta local ou S3) à medida que baixa
+    get_armazenamento().salvar(novo_nome_arquivo, file_response.iter_content(BLOCO_DOWNLOAD))
     
-    # 4. Determina se há pendência
+    # 4. Classifica o texto em uma passada (pendência, nome, documento e datas)
     # Se o texto conter "NÃO CONSTAM" a pendência é False
-    pendencia = "NÃO CONSTAM" not in texto
+    classificacao = classificar_texto(texto, "tjdf")
+    pendencia = classificacao["pendencia"]
     
-    # 5. Extrai o nome do texto.
-    # Busca o nome que está entre "\n" e "\nOU\n"
-    match = re.search(r"\n(.+?)\nOU\n", texto)
-    nome = match.group(1).strip() if match else ""
+    # 5. Nome extraído do texto: está entre "\n" e "\nOU\n"
+    nome = classificacao["nome"]
     
     # 6. Monta o resultado final
     resultado = {
         "status": "finalizado",
         "arquivo": novo_nome_arquivo,
-        "arquivo_url": f"http://local.juk.re:8000/files/{novo_nome_arquivo}",
         "tipo_doc": "ELEITORAL",
         "texto_doc": texto,
         "pendencia": pendencia,
-        "nome": nome
+        "nome": nome,
+        "documento": classificacao["documento"],
+        "data_emissao": classificacao["data_emissao"],
+        "validade": classificacao["validade"]
     }
     
     return resultado
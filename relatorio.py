@@ -0,0 +1,113 @@
+# Relatório (PDF mesclado) da análise gerado sob demanda
+# relatorio.py
+import hashlib
+import os
+import tempfile
+import threading
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from sqlalchemy.orm import Session
+
+from armazenamento import get_armazenamento
+from arquivamento import linhas_arquivadas
+from db import get_db
+from models import CertidaoJob, StatusCertidao
+
+router = APIRouter()
+
+# "lazy": link_pdf aponta para GET /analises/{id}/relatorio/ e o PDF só é montado no primeiro download;
+# "eager": mescla ao concluir a análise, como antes
+RELATORIO_MODO = os.getenv("RELATORIO_MODO", "lazy")
+PREFIXO_RELATORIOS = "relatorios/"
+
+# Locks fixos, escolhidos pelo id da análise: dois downloads simultâneos do mesmo
+# relatório montam o PDF uma vez só, sem um lock novo (e eterno) por análise
+RELATORIO_LOCKS = int(os.getenv("RELATORIO_LOCKS", "64"))
+_locks = [threading.Lock() for _ in range(RELATORIO_LOCKS)]
+
+
+def arquivos_do_relatorio(db: Session, analise_id: int) -> list:
+    """Arquivos das certidões emitidas com sucesso, na ordem dos jobs (a mesma do merge na conclusão)."""
+    linhas = (
+        db.query(CertidaoJob.arquivo)
+        .filter(
+            CertidaoJob.analise_id == analise_id,
+            CertidaoJob.status == StatusCertidao.sucesso.value,
+            CertidaoJob.arquivo.isnot(None),
+        )
+        .order_by(CertidaoJob.id)
+        .all()
+    )
+    if not linhas:
+        arquivada = linhas_arquivadas(db, analise_id)
+        if arquivada:
+            jobs = sorted(arquivada["certidao_job"], key=lambda job: job["id"])
+            return [job["arquivo"] for job in jobs if job["status"] == StatusCertidao.sucesso.value and job["arquivo"]]
+    return [arquivo for (arquivo,) in linhas]
+
+
+def assinatura(arquivos: list) -> str:
+    """
+    Identifica o conjunto de certidões do relatório. Cada emissão grava um arquivo
+    novo (nome com uuid), então os nomes bastam, sem consultar o armazenamento.
+    """
+    return hashlib.sha256("\n".join(arquivos).encode()).hexdigest()[:32]
+
+
+def _lock(analise_id: int) -> threading.Lock:
+    return _locks[hash(analise_id) % len(_locks)]
+
+
+def obter_relatorio(db: Session, analise_id: int):
+    """
+    Chave (no armazenamento) do PDF mesclado e sua assinatura, montando-o se as
+    certidões mudaram desde a última montagem. Retorna (None, None) se não há certidões emitidas.
+    """
+    arquivos = arquivos_do_relatorio(db, analise_id)
+    if not arquivos:
+        return None, None
+    armazenamento = get_armazenamento()
+    assinatura_atual = assinatura(arquivos)
+    chave = f"{PREFIXO_RELATORIOS}{analise_id}_{assinatura_atual}.pdf"
+    if armazenamento.existe(chave):
+        return chave, assinatura_atual
+    # PyPDF2 só é carregado quando um relatório precisa ser montado
+    from relatorio_pdf import mesclar_pdfs
+
+    with _lock(analise_id):
+        if not armazenamento.existe(chave):
+            descritor, temporario = tempfile.mkstemp(suffix=".pdf")
+            os.close(descritor)
+            try:
+                with armazenamento.arquivos_locais(arquivos) as caminhos:
+                    mesclar_pdfs(caminhos, temporario)
+                armazenamento.enviar_arquivo(chave, temporario)
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+            # Versões anteriores (certidões reemitidas) deixam de ser servidas
+            for antiga in list(armazenamento.listar(f"{PREFIXO_RELATORIOS}{analise_id}_")):
+                if antiga != chave:
+                    armazenamento.remover(antiga)
+    return chave, assinatura_atual
+
+
+@router.get("/analises/{analise_id}/relatorio/", tags=["Arquivos"])
+def baixar_relatorio(analise_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    PDF com todas as certidões emitidas da análise. Montado no primeiro download
+    e reaproveitado até alguma certidão mudar (ETag = assinatura das certidões).
+    """
+    chave, assinatura_atual = obter_relatorio(db, analise_id)
+    if chave is None:
+        raise HTTPException(status_code=404, detail="Nenhuma certidão emitida para esta análise")
+    etag = f'"{assinatura_atual}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    nome_download = f"relatorio_analise_{analise_id}.pdf"
+    armazenamento = get_armazenamento()
+    caminho = armazenamento.caminho_local(chave)
+    if caminho is None:
+        return RedirectResponse(armazenamento.url_assinada(chave, nome_download=nome_download))
+    return FileResponse(caminho, filename=nome_download, media_type="application/pdf", headers={"ETag": etag})
@@ -0,0 +1,209 @@
+# Geração do PDF mesclado das certidões, página a página, com memória limitada
+# relatorio_pdf.py
+import logging
+import mmap
+import os
+import threading
+
+from PyPDF2 import PdfMerger, PdfReader
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mesclagens simultâneas no processo: o pico de memória fica em
+# MESCLAGENS_SIMULTANEAS x (maior certidão de entrada), não na soma das entradas
+MESCLAGENS_SIMULTANEAS = int(os.getenv("MESCLAGENS_SIMULTANEAS", "2"))
+_vagas = threading.BoundedSemaphore(MESCLAGENS_SIMULTANEAS)
+
+# Atributos que a página herda dos nós /Pages e que precisam ir junto ao copiá-la
+_HERDAVEIS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Objetos 1 e 2 do arquivo de saída
+_ID_CATALOGO = 1
+_ID_PAGINAS = 2
+
+
+def _paginas(reader: PdfReader, nos: list):
+    """
+    Percorre a árvore de páginas em ordem: (referência da página, atributos herdados).
+    As referências dos nós intermediários (/Pages) são acrescentadas a `nos`.
+    """
+    raiz = reader.trailer["/Root"].get_object().raw_get("/Pages")
+
+    def visitar(ref, herdados):
+        no = ref.get_object()
+        if no.get("/Type") == "/Pages" or "/Kids" in no:
+            nos.append(ref)
+            herdados = {**herdados, **{chave: no.raw_get(chave) for chave in _HERDAVEIS if chave in no}}
+            for filho in no["/Kids"]:
+                yield from visitar(filho, herdados)
+        else:
+            yield ref, herdados
+
+    yield from visitar(raiz, {})
+
+
+class _Saida:
+    """Escreve objetos direto no arquivo de saída, guardando só o offset de cada um."""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.offsets = {}
+        self.proximo_id = _ID_PAGINAS + 1
+        arquivo.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def novo_id(self) -> int:
+        novo = self.proximo_id
+        self.proximo_id += 1
+        return novo
+
+    def escrever(self, numero: int, objeto):
+        self.offsets[numero] = self.arquivo.tell()
+        self.arquivo.write(f"{numero} 0 obj\n".encode())
+        objeto.write_to_stream(self.arquivo, None)
+        self.arquivo.write(b"\nendobj\n")
+
+    def fechar(self, kids: list):
+        self.escrever(_ID_PAGINAS, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(kid, 0, None) for kid in kids),
+            NameObject("/Count"): NumberObject(len(kids)),
+        }))
+        self.escrever(_ID_CATALOGO, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(_ID_PAGINAS, 0, None),
+        }))
+        inicio_xref = self.arquivo.tell()
+        tamanho = self.proximo_id
+        linhas = [f"xref\n0 {tamanho}\n", "0000000000 65535 f \n"]
+        for numero in range(1, tamanho):
+            if numero in self.offsets:
+                linhas.append(f"{self.offsets[numero]:010d} 00000 n \n")
+            else:
+                linhas.append("0000000000 65535 f \n")
+        linhas.append(
+            f"trailer\n<< /Size {tamanho} /Root {_ID_CATALOGO} 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n"
+        )
+        self.arquivo.write("".join(linhas).encode())
+
+
+class _Copia:
+    """
+    Copia as páginas de um PDF de entrada para a saída. Só os objetos alcançáveis
+    a partir das páginas são lidos; streams vão com os bytes ainda codificados
+    (sem descomprimir conteúdo nem imagens) e cada objeto é gravado assim que lido.
+    """
+
+    def __init__(self, reader: PdfReader, saida: _Saida):
+        self.reader = reader
+        self.saida = saida
+        self.ids = {}       # (idnum, geração) na entrada -> id na saída
+        self.pendentes = []
+
+    def _id(self, ref: IndirectObject) -> int:
+        chave = (ref.idnum, ref.generation)
+        if chave not in self.ids:
+            self.ids[chave] = self.saida.novo_id()
+            self.pendentes.append(ref)
+        return self.ids[chave]
+
+    def _traduzir(self, objeto):
+        if isinstance(objeto, IndirectObject):
+            return IndirectObject(self._id(objeto), 0, None)
+        if isinstance(objeto, StreamObject):
+            copia = StreamObject()
+            copia._data = objeto._data
+            copia.update({chave: self._traduzir(valor) for chave, valor in objeto.items() if chave != "/Length"})
+            return copia
+        if isinstance(objeto, DictionaryObject):
+            return DictionaryObject({chave: self._traduzir(valor) for chave, valor in objeto.items()})
+        if isinstance(objeto, ArrayObject):
+            return ArrayObject(self._traduzir(valor) for valor in objeto)
+        return objeto
+
+    def _esvaziar(self):
+        while self.pendentes:
+            ref = self.pendentes.pop()
+            objeto = self.reader.get_object(ref)
+            copia = NullObject() if objeto is None else self._traduzir(objeto)
+            self.saida.escrever(self.ids[(ref.idnum, ref.generation)], copia)
+
+    def copiar(self) -> list:
+        # Páginas e nós da árvore ganham id antes de tudo: uma referência a elas
+        # (link, anotação com /P) não pode puxar a árvore de origem inteira
+        nos = []
+        paginas = list(_paginas(self.reader, nos))
+        for ref in nos:
+            self.ids[(ref.idnum, ref.generation)] = _ID_PAGINAS
+        for ref, _ in paginas:
+            self.ids[(ref.idnum, ref.generation)] = self.saida.novo_id()
+        kids = []
+        for ref, herdados in paginas:
+            numero = self.ids[(ref.idnum, ref.generation)]
+            pagina = ref.get_object()
+            copia = DictionaryObject({
+                chave: self._traduzir(valor) for chave, valor in pagina.items() if chave != "/Parent"
+            })
+            for chave, valor in herdados.items():
+                if chave not in copia:
+                    copia[NameObject(chave)] = self._traduzir(valor)
+            copia[NameObject("/Parent")] = IndirectObject(_ID_PAGINAS, 0, None)
+            self.saida.escrever(numero, copia)
+            self._esvaziar()
+            kids.append(numero)
+        return kids
+
+
+def mesclar_pdfs(caminhos: list, destino: str) -> int:
+    """
+    Mescla `caminhos` em `destino` e devolve o número de páginas.
+    Cada entrada é mapeada em memória (mmap) e tem suas páginas copiadas e gravadas
+    antes de a próxima ser aberta: o que fica em memória é uma entrada por vez mais
+    a tabela de offsets da saída. Entradas inexistentes são ignoradas; se alguma
+    não puder ser copiada assim (PDF malformado), a mesclagem toda é refeita com PdfMerger.
+    """
+    with _vagas:
+        try:
+            return _mesclar_streaming(caminhos, destino)
+        except Exception:
+            logger.exception("Falha na mesclagem por páginas de %s; usando PdfMerger", destino)
+            return mesclar_pdfs_pdfmerger(caminhos, destino)
+
+
+def _mesclar_streaming(caminhos: list, destino: str) -> int:
+    kids = []
+    with open(destino, "wb") as arquivo:
+        saida = _Saida(arquivo)
+        for caminho in caminhos:
+            if not os.path.exists(caminho) or not os.path.getsize(caminho):
+                continue
+            with open(caminho, "rb") as entrada, mmap.mmap(entrada.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                reader = PdfReader(mapa)
+                if reader.is_encrypted:
+                    reader.decrypt("")
+                kids.extend(_Copia(reader, saida).copiar())
+                # O reader forma ciclos com os próprios objetos; limpar o cache
+                # libera os dados desta entrada sem esperar o coletor de ciclos
+                reader.resolved_objects.clear()
+        saida.fechar(kids)
+    return len(kids)
+
+
+def mesclar_pdfs_pdfmerger(caminhos: list, destino: str) -> int:
+    """Caminho anterior (PdfMerger carrega todas as entradas antes de gravar); mantido como fallback e referência."""
+    merger = PdfMerger()
+    for caminho in caminhos:
+        if os.path.exists(caminho):
+            merger.append(caminho)
+    paginas = len(merger.pages)
+    merger.write(destino)
+    merger.close()
+    return paginas
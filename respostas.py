@@ -0,0 +1,180 @@
+# Montagem das respostas a partir de consultas por coluna (sem hidratar entidades ORM)
+# respostas.py
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from arquivamento import analise_do_proprietario, linhas_arquivadas
+from models import Analise, AnaliseArquivada, Proprietario, EsposaSocio, Imovel
+from schemas import AnaliseResponse, ImovelResponse, EsposaSocioResponse, ProprietarioResponse
+from urls import resolver_urls
+
+
+def dumps(dados) -> bytes:
+    """Serializa com orjson (datetime em ISO 8601, igual ao Pydantic)."""
+    return orjson.dumps(dados)
+
+
+def colunas(modelo, schema, *extras) -> list:
+    """Colunas do modelo correspondentes aos campos do schema de resposta (mais `extras`)."""
+    nomes = [nome for nome in schema.model_fields if nome in modelo.__mapper__.column_attrs]
+    nomes += [nome for nome in extras if nome not in nomes]
+    return [getattr(modelo, nome) for nome in nomes]
+
+
+COLUNAS_ANALISE = colunas(Analise, AnaliseResponse)
+COLUNAS_IMOVEL = colunas(Imovel, ImovelResponse)
+# proprietario_id só é usado para encaixar o cônjuge no proprietário e é removido depois
+COLUNAS_CONJUGE = colunas(EsposaSocio, EsposaSocioResponse, "proprietario_id")
+COLUNAS_PROPRIETARIO = colunas(Proprietario, ProprietarioResponse)
+
+# Colunas que guardam chave de arquivo (ou URL antiga) e saem como URL pública
+URLS_ANALISE = ("link_pdf",)
+URLS_PROPRIETARIO = tuple(nome for nome in Proprietario.__mapper__.column_attrs.keys() if nome.startswith("pdf_"))
+URLS_CONJUGE = tuple(nome for nome in EsposaSocio.__mapper__.column_attrs.keys() if nome.startswith("pdf_"))
+
+# Visões prontas para as telas de listagem; "detalhe" devolve todas as colunas
+VISOES_ANALISE = {
+    "resumo": ["id", "status", "data", "usuario_id", "risco"],
+}
+VISOES_PROPRIETARIO = {
+    "resumo": ["id", "analise_id", "nome_razao", "cpf_cnpj", "e_empresa"],
+}
+
+
+def projetar(colunas_base: list, fields: str = None, visao: str = None, visoes: dict = None) -> list:
+    """
+    Restringe `colunas_base` a partir de `fields` (nomes separados por vírgula)
+    ou de uma visão nomeada. O id sempre acompanha a projeção.
+    """
+    if fields:
+        por_nome = {coluna.key: coluna for coluna in colunas_base}
+        nomes = [nome.strip() for nome in fields.split(",") if nome.strip()]
+        invalidos = [nome for nome in nomes if nome not in por_nome]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+        if "id" not in nomes:
+            nomes.insert(0, "id")
+        return [por_nome[nome] for nome in dict.fromkeys(nomes)]
+    if visao and visao != "detalhe":
+        if not visoes or visao not in visoes:
+            raise HTTPException(status_code=400, detail=f"Visão inválida: {visao}")
+        por_nome = {coluna.key: coluna for coluna in colunas_base}
+        return [por_nome[nome] for nome in visoes[visao]]
+    return colunas_base
+
+
+def _linhas(db: Session, consulta, urls: tuple = ()) -> list:
+    return [resolver_urls(dict(linha), urls) for linha in db.execute(consulta).mappings()]
+
+
+def _do_arquivo(linhas: list, colunas: list, urls: tuple = ()) -> list:
+    """Linhas de uma análise arquivada (arquivamento.linhas_arquivadas) no formato das consultas."""
+    nomes = [coluna.key for coluna in colunas]
+    linhas = sorted(linhas, key=lambda linha: linha["id"])
+    return [resolver_urls({nome: linha.get(nome) for nome in nomes}, urls) for linha in linhas]
+
+
+def carregar_analise(db: Session, analise_id: int):
+    linhas = _linhas(db, select(*COLUNAS_ANALISE).where(Analise.id == analise_id), URLS_ANALISE)
+    if not linhas:
+        # Arquivada: as colunas da análise estão em colunas, sem descomprimir o conteúdo
+        arquivada = [getattr(AnaliseArquivada, coluna.key) for coluna in COLUNAS_ANALISE]
+        linhas = _linhas(db, select(*arquivada).where(AnaliseArquivada.id == analise_id), URLS_ANALISE)
+    return linhas[0] if linhas else None
+
+
+def listar_analises(db: Session, usuario_id: str = None, colunas: list = None, risco: str = None) -> list:
+    """Análises das tabelas quentes e do arquivo, na ordem do id."""
+    consultas = []
+    for modelo in (Analise, AnaliseArquivada):
+        consulta = select(*(getattr(modelo, coluna.key).label(coluna.key) for coluna in colunas or COLUNAS_ANALISE))
+        if usuario_id is not None:
+            consulta = consulta.where(modelo.usuario_id == usuario_id)
+        if risco is not None:
+            consulta = consulta.where(modelo.risco == risco)
+        consultas.append(consulta)
+    unidas = union_all(*consultas).subquery()
+    return _linhas(db, select(unidas).order_by(unidas.c.id), URLS_ANALISE)
+
+
+def listar_proprietarios(db: Session, analise_id: int = None, proprietario_id: int = None, colunas: list = None) -> list:
+    consulta = select(*(colunas or COLUNAS_PROPRIETARIO)).order_by(Proprietario.id)
+    if analise_id is not None:
+        consulta = consulta.where(Proprietario.analise_id == analise_id)
+    if proprietario_id is not None:
+        consulta = consulta.where(Proprietario.id == proprietario_id)
+    linhas = _linhas(db, consulta, URLS_PROPRIETARIO)
+    if linhas or (analise_id is None and proprietario_id is None):
+        return linhas
+    if analise_id is None:
+        analise_id = analise_do_proprietario(db, proprietario_id)
+    arquivada = linhas_arquivadas(db, analise_id) if analise_id is not None else None
+    if arquivada is None:
+        return linhas
+    proprietarios = [
+        linha for linha in arquivada["proprietario"] if proprietario_id is None or linha["id"] == proprietario_id
+    ]
+    return _do_arquivo(proprietarios, colunas or COLUNAS_PROPRIETARIO, URLS_PROPRIETARIO)
+
+
+def carregar_conjuges(db: Session, proprietario_ids: list) -> dict:
+    """proprietario_id -> dicionário do cônjuge, em uma única consulta."""
+    if not proprietario_ids:
+        return {}
+    conjuges = {}
+    consulta = select(*COLUNAS_CONJUGE).where(EsposaSocio.proprietario_id.in_(proprietario_ids))
+    for linha in _linhas(db, consulta, URLS_CONJUGE):
+        conjuges[linha.pop("proprietario_id")] = linha
+    return conjuges
+
+
+def carregar_conjuge(db: Session, proprietario_id: int):
+    """Cônjuge do proprietário (com proprietario_id), nas tabelas quentes ou no arquivo."""
+    linhas = _linhas(db, select(*COLUNAS_CONJUGE).where(EsposaSocio.proprietario_id == proprietario_id), URLS_CONJUGE)
+    if linhas:
+        return linhas[0]
+    analise_id = analise_do_proprietario(db, proprietario_id)
+    arquivada = linhas_arquivadas(db, analise_id) if analise_id is not None else None
+    if arquivada is None:
+        return None
+    conjuges = [linha for linha in arquivada["esposa_socio"] if linha["proprietario_id"] == proprietario_id]
+    return _do_arquivo(conjuges, COLUNAS_CONJUGE, URLS_CONJUGE)[0] if conjuges else None
+
+
+def _analise_full_arquivada(db: Session, analise_id: int):
+    arquivada = linhas_arquivadas(db, analise_id)
+    if arquivada is None:
+        return None
+    analise = _do_arquivo(arquivada["analise"], COLUNAS_ANALISE, URLS_ANALISE)[0]
+    imoveis = _do_arquivo(arquivada["imovel"], COLUNAS_IMOVEL)
+    proprietarios = _do_arquivo(arquivada["proprietario"], COLUNAS_PROPRIETARIO, URLS_PROPRIETARIO)
+    conjuges = {}
+    for linha in _do_arquivo(arquivada["esposa_socio"], COLUNAS_CONJUGE, URLS_CONJUGE):
+        conjuges[linha.pop("proprietario_id")] = linha
+    return analise, imoveis, proprietarios, conjuges
+
+
+def carregar_analise_full(db: Session, analise_id: int):
+    """
+    Mesmo formato de AnaliseFullResponse, montado com quatro SELECTs por coluna
+    (análise, imóvel, proprietários e cônjuges) em vez de carregar as entidades.
+    Análise arquivada: montado a partir do conteúdo de analise_arquivo.
+    """
+    analise = _linhas(db, select(*COLUNAS_ANALISE).where(Analise.id == analise_id), URLS_ANALISE)
+    if analise:
+        analise = analise[0]
+        imoveis = _linhas(db, select(*COLUNAS_IMOVEL).where(Imovel.analise_id == analise_id))
+        proprietarios = listar_proprietarios(db, analise_id=analise_id)
+        conjuges = carregar_conjuges(db, [prop["id"] for prop in proprietarios])
+    else:
+        arquivada = _analise_full_arquivada(db, analise_id)
+        if arquivada is None:
+            return None
+        analise, imoveis, proprietarios, conjuges = arquivada
+    for prop in proprietarios:
+        prop["conjuge"] = conjuges.get(prop["id"])
+    analise["imovel"] = imoveis[0] if imoveis else None
+    analise["proprietarios"] = proprietarios
+    return analise
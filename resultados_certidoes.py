@@ -0,0 +1,96 @@
+# Persistência do texto e dos campos extraídos das certidões
+# resultados_certidoes.py
+import zlib
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from cache import invalidar_analise
+from models import CertidaoJob, CertidaoResultado
+from parser_certidoes import classificar_lote
+from resumo import recalcular_resumo
+
+
+def familia_do_emissor(emissor: str) -> str:
+    """Família usada pelo parser a partir do nome do emissor (tjdf_*, nada_consta_*, receita)."""
+    for familia in ("tjdf", "nada_consta", "receita"):
+        if emissor.startswith(familia):
+            return familia
+    return None
+
+
+def comprimir_texto(texto: str):
+    return zlib.compress(texto.encode("utf-8"), 6) if texto else None
+
+
+def descomprimir_texto(texto: bytes) -> str:
+    return zlib.decompress(texto).decode("utf-8") if texto else ""
+
+
+def texto_do_resultado(resultado: CertidaoResultado) -> str:
+    return descomprimir_texto(resultado.texto)
+
+
+def salvar_resultado(db: Session, job: CertidaoJob, cert: dict) -> CertidaoResultado:
+    """
+    Grava (ou substitui, em uma nova emissão) o resultado da certidão do job.
+    Não faz commit: o chamador grava junto com o status do job.
+    """
+    resultado = job.resultado
+    if resultado is None:
+        resultado = CertidaoResultado(job=job, analise_id=job.analise_id, emissor=job.emissor)
+        db.add(resultado)
+    texto = cert.get("texto_doc") or ""
+    resultado.tipo_doc = cert.get("tipo_doc")
+    resultado.documento = cert.get("documento")
+    resultado.nome = (cert.get("nome") or "")[:255] or None
+    resultado.pendencia = 1 if cert.get("pendencia") else 0
+    resultado.data_emissao = cert.get("data_emissao")
+    resultado.validade = cert.get("validade")
+    resultado.texto = comprimir_texto(texto)
+    resultado.texto_tamanho = len(texto)
+    resultado.criado_em = datetime.utcnow()
+    return resultado
+
+
+def reclassificar_resultados(db: Session, tamanho_lote: int = 1000, processos: int = 1) -> int:
+    """
+    Reaplica o parser aos textos já armazenados (ex.: após ajustar um padrão),
+    em lotes por chave primária, sem reabrir nenhum PDF. As análises com alguma
+    pendência alterada têm contadores, risco e resumo recalculados ao fim de cada
+    lote. Retorna quantos foram atualizados.
+    """
+    atualizados = 0
+    ultimo_id = 0
+    while True:
+        resultados = (
+            db.query(CertidaoResultado)
+            .filter(CertidaoResultado.id > ultimo_id)
+            .order_by(CertidaoResultado.id)
+            .limit(tamanho_lote)
+            .all()
+        )
+        if not resultados:
+            return atualizados
+        alteradas = set()
+        por_familia = {}
+        for resultado in resultados:
+            por_familia.setdefault(familia_do_emissor(resultado.emissor), []).append(resultado)
+        for familia, grupo in por_familia.items():
+            textos = [texto_do_resultado(resultado) for resultado in grupo]
+            for resultado, campos in zip(grupo, classificar_lote(textos, familia, processos=processos)):
+                resultado.nome = campos["nome"][:255] or None
+                resultado.documento = campos["documento"]
+                pendencia = 1 if campos["pendencia"] else 0
+                if resultado.pendencia != pendencia:
+                    alteradas.add(resultado.analise_id)
+                resultado.pendencia = pendencia
+                resultado.data_emissao = campos["data_emissao"]
+                resultado.validade = campos["validade"]
+        db.commit()
+        for analise_id in sorted(alteradas):
+            recalcular_resumo(db, analise_id)
+            invalidar_analise(analise_id)
+        atualizados += len(resultados)
+        ultimo_id = resultados[-1].id
+        db.expunge_all()
@@ -0,0 +1,111 @@
+# Resumo e veredito de risco da análise, atualizados a cada certidão
+# resumo.py
+from sqlalchemy.orm import Session
+
+from models import Analise, CertidaoJob, CertidaoResultado, RiscoAnalise, StatusCertidao
+
+# Estados com que um job entra na contagem da análise (CertidaoJob.estado_resumo)
+ESTADO_OK = "ok"
+ESTADO_PENDENCIA = "pendencia"
+ESTADO_ERRO = "erro"
+
+
+def estado_do_resultado(sucesso: bool, pendencia: bool) -> str:
+    if not sucesso:
+        return ESTADO_ERRO
+    return ESTADO_PENDENCIA if pendencia else ESTADO_OK
+
+
+def _delta(estado: str, sinal: int) -> dict:
+    delta = {"certidoes": 0, "pendencias": 0, "erros": 0}
+    if estado is None:
+        return delta
+    delta["certidoes"] = sinal
+    if estado == ESTADO_PENDENCIA:
+        delta["pendencias"] = sinal
+    elif estado == ESTADO_ERRO:
+        delta["erros"] = sinal
+    return delta
+
+
+def calcular_risco(total_certidoes: int, total_pendencias: int, total_erros: int) -> str:
+    if total_pendencias:
+        return RiscoAnalise.com_pendencias.value
+    if total_erros:
+        return RiscoAnalise.inconclusivo.value
+    if total_certidoes:
+        return RiscoAnalise.sem_pendencias.value
+    return RiscoAnalise.pendente.value
+
+
+def montar_resumo(total_certidoes: int, total_pendencias: int, total_erros: int) -> str:
+    if not total_certidoes:
+        return None
+    return (
+        f"{total_certidoes} certidão(ões) processada(s): "
+        f"{total_pendencias} com pendência, {total_erros} com erro, "
+        f"{total_certidoes - total_pendencias - total_erros} sem pendência"
+    )[:255]
+
+
+def registrar_resultado(db: Session, job: CertidaoJob, estado: str):
+    """
+    Aplica à análise só a diferença entre o estado anterior do job e o novo
+    (O(1) por certidão, sem reler as demais). Os contadores são incrementados
+    no próprio UPDATE, que trava a linha até o commit do chamador: jobs da
+    mesma análise rodam em paralelo no agendador.
+    """
+    anterior = job.estado_resumo
+    if anterior == estado:
+        return
+    menos, mais = _delta(anterior, -1), _delta(estado, 1)
+    db.query(Analise).filter(Analise.id == job.analise_id).update(
+        {
+            Analise.total_certidoes: Analise.total_certidoes + menos["certidoes"] + mais["certidoes"],
+            Analise.total_pendencias: Analise.total_pendencias + menos["pendencias"] + mais["pendencias"],
+            Analise.total_erros: Analise.total_erros + menos["erros"] + mais["erros"],
+        },
+        synchronize_session=False
+    )
+    analise = db.query(Analise).filter(Analise.id == job.analise_id).populate_existing().first()
+    if analise:
+        _aplicar_veredito(analise)
+    job.estado_resumo = estado
+
+
+def recalcular_resumo(db: Session, analise_id: int):
+    """Reconstrói contadores e resumo a partir dos jobs (carga inicial ou correção manual)."""
+    analise = (
+        db.query(Analise)
+        .filter(Analise.id == analise_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+    if not analise:
+        return
+    linhas = (
+        db.query(CertidaoJob, CertidaoResultado.pendencia)
+        .outerjoin(CertidaoResultado, CertidaoResultado.job_id == CertidaoJob.id)
+        .filter(CertidaoJob.analise_id == analise_id)
+        .all()
+    )
+    analise.total_certidoes = analise.total_pendencias = analise.total_erros = 0
+    for job, pendencia in linhas:
+        if job.status == StatusCertidao.sucesso.value:
+            job.estado_resumo = estado_do_resultado(True, bool(pendencia))
+        elif job.status == StatusCertidao.erro.value:
+            job.estado_resumo = ESTADO_ERRO
+        else:
+            job.estado_resumo = None
+        delta = _delta(job.estado_resumo, 1)
+        analise.total_certidoes += delta["certidoes"]
+        analise.total_pendencias += delta["pendencias"]
+        analise.total_erros += delta["erros"]
+    _aplicar_veredito(analise)
+    db.commit()
+
+
+def _aplicar_veredito(analise: Analise):
+    analise.risco = calcular_risco(analise.total_certidoes, analise.total_pendencias, analise.total_erros)
+    analise.resumo = montar_resumo(analise.total_certidoes, analise.total_pendencias, analise.total_erros)
@@ -4,16 +4,26 @@
 # =======================
 
 from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime, date
+from urllib.parse import urlsplit
+from pydantic import BaseModel, ConfigDict, field_validator
+from datetime import datetime, date, timezone
+
+from documentos import TIPO_CNPJ, TIPO_CPF, validar
 
 # Para cadastro via CPF (pessoa física)
+# Documentos conferidos pelos dígitos verificadores e gravados só com dígitos:
+# número inválido é recusado aqui (422), sem chegar aos emissores
 class ConjugeCPFSchema(BaseModel):
     nome_completo: str
     nome_mae: str
     cpf: str
     data_nascimento: date
 
+    @field_validator("cpf")
+    @classmethod
+    def _validar_cpf(cls, valor):
+        return validar(valor, TIPO_CPF)
+
 class ProprietarioCPFSchema(BaseModel):
     nome_completo: str
     nome_mae: str
@@ -23,6 +33,11 @@ class ProprietarioCPFSchema(BaseModel):
     e_empresa: bool
     conjuge: Optional[ConjugeCPFSchema] = None
 
+    @field_validator("cpf")
+    @classmethod
+    def _validar_cpf(cls, valor):
+        return validar(valor, TIPO_CPF)
+
 class AnaliseEtapa1CPFPayload(BaseModel):
     usuario_id: int
     proprietarios: List[ProprietarioCPFSchema]
@@ -33,6 +48,12 @@ class ConjugeCNPJSchema(BaseModel):
     cnpj: str
     data_nascimento: date
 
+    # Sócio pode ser pessoa física ou jurídica: o tipo sai do tamanho
+    @field_validator("cnpj")
+    @classmethod
+    def _validar_documento(cls, valor):
+        return validar(valor)
+
 class ProprietarioCNPJSchema(BaseModel):
     razao_social: str
     nome_fansasia: str
@@ -44,6 +65,16 @@ class ProprietarioCNPJSchema(BaseModel):
     data_nascimento_representante: date
     conjuge: Optional[ConjugeCNPJSchema] = None
 
+    @field_validator("cnpj")
+    @classmethod
+    def _validar_cnpj(cls, valor):
+        return validar(valor, TIPO_CNPJ)
+
+    @field_validator("cpf_representante")
+    @classmethod
+    def _validar_cpf_representante(cls, valor):
+        return validar(valor, TIPO_CPF)
+
 class AnaliseEtapa1CNPJPayload(BaseModel):
     usuario_id: int
     proprietarios: List[ProprietarioCNPJSchema]
@@ -58,7 +89,162 @@ class ImovelSchema(BaseModel):
     matricula: Optional[str] = None
     pdf_sefaz: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Para emissão de certidões em lote: lista de análises ou filtro por status
+
+class LoteEmissaoPayload(BaseModel):
+    analise_ids: Optional[List[int]] = None
+    status: Optional[str] = None  # Ex.: "pendente" seleciona todas as análises nesse status
+    prioridade: str = "lote"  # Só "lote": a classe interativa é das emissões pedidas na tela
+    prazo: Optional[datetime] = None  # Quando as certidões deveriam estar prontas (sem fuso = UTC)
+    force: bool = False  # Reemite também as certidões já guardadas e vigentes
+
+    @field_validator("prioridade")
+    @classmethod
+    def _validar_prioridade(cls, valor):
+        if valor != "lote":
+            raise ValueError("Emissão em lote tem sempre prioridade 'lote'; use prazo para adiantá-la")
+        return valor
+
+    @field_validator("prazo")
+    @classmethod
+    def _validar_prazo(cls, valor):
+        if valor is None:
+            return None
+        valor = valor if valor.tzinfo else valor.replace(tzinfo=timezone.utc)
+        # Prazo já vencido passaria o lote na frente de todas as emissões
+        if valor <= datetime.now(timezone.utc):
+            raise ValueError("Prazo deve estar no futuro")
+        return valor
+
+# Assinatura de webhook (webhooks.py): eventos das análises do usuário enviados por POST
+
+EVENTOS_WEBHOOK = ("analise.finalizada", "certidao.finalizada")
+class WebhookAssinaturaPayload(BaseModel):
+    usuario_id: int
+    url: str
+    eventos: List[str] = list(EVENTOS_WEBHOOK)
+    segredo: Optional[str] = None  # Chave do HMAC; gerada se não for informada
+
+    @field_validator("url")
+    @classmethod
+    def _validar_url(cls, valor):
+        if not valor.startswith(("http://", "https://")) or len(valor) > 500:
+            raise ValueError("URL deve ser http(s) com até 500 caracteres")
+        try:
+            host = urlsplit(valor).hostname
+        except ValueError:
+            host = None
+        if not host:
+            raise ValueError("URL sem host válido")
+        # Endereços do host (rede interna, SSRF) são conferidos no endpoint, fora do event loop
+        return valor
+
+    @field_validator("eventos")
+    @classmethod
+    def _validar_eventos(cls, valor):
+        desconhecidos = set(valor) - set(EVENTOS_WEBHOOK)
+        if desconhecidos or not valor:
+            raise ValueError(f"Eventos válidos: {', '.join(EVENTOS_WEBHOOK)}")
+        return sorted(set(valor))
+
+    @field_validator("segredo")
+    @classmethod
+    def _validar_segredo(cls, valor):
+        if valor is not None and not 16 <= len(valor) <= 64:
+            raise ValueError("Segredo deve ter de 16 a 64 caracteres")
+        return valor
+
+# =======================
+# MODELOS DE RESPOSTA COMPLETA
+# =======================
+
+class ImovelResponse(BaseModel):
+    id: int
+    cep: Optional[str] = None
+    endereco: Optional[str] = None
+    inscricao_iptu: Optional[str] = None
+    cartorio: Optional[str] = None
+    matricula: Optional[str] = None
+    pdf_sefaz: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class EsposaSocioResponse(BaseModel):
+    id: int
+    nome: Optional[str] = None
+    cpf: Optional[str] = None
+    data_nascimento: Optional[datetime] = None
+    nome_mae: Optional[str] = None
+    pdf_sefaz: Optional[str] = None
+    pdf_trabalho: Optional[str] = None
+    pdf_nada_consta_civel: Optional[str] = None
+    pdf_nada_consta_criminal: Optional[str] = None
+    pdf_nada_consta_falencia: Optional[str] = None
+    pdf_nada_consta_especial: Optional[str] = None
+    pdf_receita: Optional[str] = None
+    pdf_tjdf_criminal: Optional[str] = None
+    pdf_tjdf_eleitoral: Optional[str] = None
+    pdf_tjdf_civel: Optional[str] = None
+    ad: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProprietarioResponse(BaseModel):
+    id: int
+    analise_id: int
+    nome_razao: Optional[str] = None
+    nome_mae: Optional[str] = None
+    cpf_cnpj: Optional[str] = None
+    data_nascimento: Optional[datetime] = None
+    estado_civil: Optional[str] = None
+    e_empresa: Optional[int] = None
+    nome_representante: Optional[str] = None
+    nome_mae_representante: Optional[str] = None
+    cpf_representante: Optional[str] = None
+    data_nascimento_representante: Optional[datetime] = None
+    pdf_sefaz: Optional[str] = None
+    pdf_trabalho: Optional[str] = None
+    pdf_nada_consta_civel: Optional[str] = None
+    pdf_nada_consta_criminal: Optional[str] = None
+    pdf_nada_consta_falencia: Optional[str] = None
+    pdf_nada_consta_especial: Optional[str] = None
+    pdf_receita: Optional[str] = None
+    pdf_tjdf_criminal: Optional[str] = None
+    pdf_tjdf_eleitoral: Optional[str] = None
+    pdf_tjdf_civel: Optional[str] = None
+    ad: Optional[str] = None
+    conjuge: Optional[EsposaSocioResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AnaliseResponse(BaseModel):
+    id: int
+    status: Optional[str] = None
+    link_pdf: Optional[str] = None
+    resumo: Optional[str] = None
+    data: datetime
+    usuario_id: Optional[str] = None
+    risco: Optional[str] = None
+    total_certidoes: Optional[int] = None
+    total_pendencias: Optional[int] = None
+    total_erros: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
 
+class AnaliseFullResponse(BaseModel):
+    id: int
+    status: Optional[str] = None
+    link_pdf: Optional[str] = None
+    resumo: Optional[str] = None
+    data: datetime
+    usuario_id: Optional[str] = None
+    risco: Optional[str] = None
+    total_certidoes: Optional[int] = None
+    total_pendencias: Optional[int] = None
+    total_erros: Optional[int] = None
+    imovel: Optional[ImovelResponse] = None
+    proprietarios: List[ProprietarioResponse] = []
 
+    model_config = ConfigDict(from_attributes=True)
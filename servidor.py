@@ -0,0 +1,212 @@
+# Servidor de produção: N workers (processos) do uvicorn com pool de conexões dividido entre eles
+# servidor.py
+#
+# Uso (na raiz do projeto):
+#   python servidor.py
+#
+# O processo principal decide quantos workers subir e quantas conexões cada um
+# pode abrir, e passa isso aos workers por variável de ambiente. Cada worker:
+#   - configura o pool (db.configurar_pool) antes da primeira sessão;
+#   - aquece as conexões e os módulos dos emissores antes de aceitar requisições;
+#   - agenda os jobs 'pendente' que nenhum processo tem na fila (retomar_jobs_pendentes);
+#   - ao receber SIGTERM/SIGINT, o uvicorn para de aceitar conexões e espera as
+#     requisições em curso; em seguida o agendador conclui as emissões em execução.
+#     As que ainda estavam só na fila são liberadas no banco ('pendente', sem
+#     agendado_em) e retomadas pelo próximo worker que subir.
+#
+# Com mais de um worker, o cache de respostas e o barramento de eventos (SSE,
+# long-poll) precisam ser vistos por todos: sem CACHE_COMPARTILHADO e
+# EVENTOS_COMPARTILHADO definidos, o processo principal usa caminhos no
+# diretório temporário da máquina.
+#
+# Os limites por emissor (LIMITE_EMISSOR_*) e AGENDADOR_WORKERS valem por worker.
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Vazio = um worker por núcleo disponível para o processo
+WEB_WORKERS = os.getenv("WEB_WORKERS", "")
+# max_connections do MySQL; vazio = consulta o servidor na partida (padrão do MySQL: 151)
+MYSQL_MAX_CONNECTIONS = os.getenv("MYSQL_MAX_CONNECTIONS", "")
+# Conexões que ficam de fora (manage.py, réplicas, administração, deploy sobreposto)
+DB_CONEXOES_RESERVADAS = int(os.getenv("DB_CONEXOES_RESERVADAS", "10"))
+# Conexões mantidas abertas por worker para as requisições, além das do agendador
+DB_POOL_REQUISICOES = int(os.getenv("DB_POOL_REQUISICOES", "5"))
+# Conexões abertas na partida de cada worker (vazio = todo o pool_size)
+DB_AQUECER = os.getenv("DB_AQUECER", "")
+# Espera máxima, em segundos, pelas requisições e depois pelas emissões em execução
+DRENAGEM_TIMEOUT = int(os.getenv("DRENAGEM_TIMEOUT", "60"))
+
+# Repassados do processo principal para os workers
+_ENV_POOL = "SERVIDOR_POOL_SIZE"
+_ENV_OVERFLOW = "SERVIDOR_MAX_OVERFLOW"
+
+
+def numero_de_workers() -> int:
+    if WEB_WORKERS:
+        return max(int(WEB_WORKERS), 1)
+    try:
+        return max(len(os.sched_getaffinity(0)), 1)
+    except AttributeError:  # sched_getaffinity não existe em macOS/Windows
+        return os.cpu_count() or 1
+
+
+def max_connections_do_banco() -> int:
+    if MYSQL_MAX_CONNECTIONS:
+        return int(MYSQL_MAX_CONNECTIONS)
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import NullPool
+
+    from db import DATABASE_URL
+
+    # Engine descartável no processo principal: os workers criam o próprio engine depois do fork
+    engine = create_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        with engine.connect() as conexao:
+            return int(conexao.execute(text("SELECT @@max_connections")).scalar())
+    except Exception:
+        logger.warning("Não foi possível ler max_connections do banco; usando 151", exc_info=True)
+        return 151
+    finally:
+        engine.dispose()
+
+
+def dimensionar_pool(workers: int, max_connections: int) -> tuple:
+    """
+    (pool_size, max_overflow) por worker, com workers * (pool_size + max_overflow)
+    dentro de max_connections - DB_CONEXOES_RESERVADAS.
+    O pool_size cobre as threads do agendador (cada emissão segura uma sessão)
+    mais DB_POOL_REQUISICOES; o que sobrar da cota do worker vira overflow.
+    """
+    from agendador import AGENDADOR_WORKERS
+
+    cota = (max_connections - DB_CONEXOES_RESERVADAS) // workers
+    if cota < 2:
+        raise RuntimeError(
+            f"{workers} workers não cabem em max_connections={max_connections} "
+            f"(reservadas: {DB_CONEXOES_RESERVADAS}); reduza WEB_WORKERS"
+        )
+    pool_size = min(AGENDADOR_WORKERS + DB_POOL_REQUISICOES, cota)
+    return pool_size, cota - pool_size
+
+
+def compartilhar_estado():
+    """
+    Define CACHE_COMPARTILHADO e EVENTOS_COMPARTILHADO (se ausentes) antes de os
+    workers subirem: cada worker é um processo novo e lê as variáveis na importação.
+    """
+    base = os.path.join(tempfile.gettempdir(), f"analises-{PORT}")
+    if not os.getenv("CACHE_COMPARTILHADO"):
+        caminho = base + "-cache.sqlite"
+        # Entradas da execução anterior podem estar velhas (alterações feitas com o servidor parado)
+        for arquivo in (caminho, caminho + "-wal", caminho + "-shm"):
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+        os.environ["CACHE_COMPARTILHADO"] = caminho
+    if not os.getenv("EVENTOS_COMPARTILHADO"):
+        os.environ["EVENTOS_COMPARTILHADO"] = base + "-eventos"
+    logger.info(
+        "Cache compartilhado em %s, eventos em %s",
+        os.environ["CACHE_COMPARTILHADO"], os.environ["EVENTOS_COMPARTILHADO"],
+    )
+
+
+# =======================
+# Worker
+# =======================
+
+def aquecer(conexoes: int):
+    """Abre as conexões do pool e importa os módulos carregados sob demanda."""
+    from sqlalchemy import text
+
+    from db import get_engine
+
+    abertas = []
+    try:
+        for _ in range(conexoes):
+            conexao = get_engine().connect()
+            abertas.append(conexao)
+            conexao.execute(text("SELECT 1"))
+    except Exception:
+        # Banco fora no boot não impede a partida: o pool_pre_ping reconecta depois
+        logger.warning("Aquecimento do pool interrompido após %d conexões", len(abertas), exc_info=True)
+    finally:
+        for conexao in abertas:
+            conexao.close()  # volta para o pool, aberta
+
+    import gateway_certidoes
+    import relatorio_pdf  # noqa: F401
+
+    for emissores in gateway_certidoes.EMISSORES.values():
+        for referencia, _coluna, _usa_mae in emissores.values():
+            gateway_certidoes._funcao_emissora(referencia)
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    from starlette.concurrency import run_in_threadpool
+
+    pool_size = int(os.getenv(_ENV_POOL, "0"))
+    await run_in_threadpool(aquecer, int(DB_AQUECER) if DB_AQUECER else pool_size)
+    from agendador import agendador
+    from gateway_certidoes import liberar_descartadas, retomar_jobs_pendentes
+
+    try:
+        retomadas = await run_in_threadpool(retomar_jobs_pendentes)
+        if retomadas:
+            logger.info("Worker %d retomou %d certidões pendentes", os.getpid(), retomadas)
+    except Exception:
+        logger.warning("Falha ao retomar as certidões pendentes", exc_info=True)
+    logger.info("Worker %d pronto (pool_size=%d)", os.getpid(), pool_size)
+    yield
+    descartadas = await run_in_threadpool(agendador.encerrar, DRENAGEM_TIMEOUT, True)
+    if descartadas:
+        liberadas = await run_in_threadpool(liberar_descartadas, descartadas)
+        logger.warning(
+            "Worker %d encerrado com %d certidões na fila; %d liberadas para retomar",
+            os.getpid(), len(descartadas), liberadas,
+        )
+
+
+def criar_app_producao():
+    """Fábrica chamada pelo uvicorn em cada worker."""
+    from app import criar_app
+    from db import configurar_pool
+
+    if os.getenv(_ENV_POOL):
+        configurar_pool(int(os.getenv(_ENV_POOL)), int(os.getenv(_ENV_OVERFLOW, "0")))
+    return criar_app(lifespan=ciclo_de_vida)
+
+
+def main():
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    workers = numero_de_workers()
+    max_connections = max_connections_do_banco()
+    pool_size, max_overflow = dimensionar_pool(workers, max_connections)
+    os.environ[_ENV_POOL], os.environ[_ENV_OVERFLOW] = str(pool_size), str(max_overflow)
+    if workers > 1:
+        compartilhar_estado()
+    logger.info(
+        "%d workers, pool %d + overflow %d por worker (%d de %d conexões)",
+        workers, pool_size, max_overflow, workers * (pool_size + max_overflow), max_connections,
+    )
+    uvicorn.run(
+        "servidor:criar_app_producao",
+        factory=True,
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        timeout_graceful_shutdown=DRENAGEM_TIMEOUT,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# URLs públicas de arquivos e relatórios, resolvidas no momento da resposta
+# urls.py
+import hashlib
+import hmac
+import math
+import os
+import time
+from urllib.parse import quote, urlsplit
+
+from armazenamento import get_armazenamento
+
+# Endereço público da API (relatórios e GET /files/...), por ambiente
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://local.juk.re:8000").rstrip("/")
+# Host de borda (CDN) que serve os arquivos, com a API ou o bucket como origem; vazio = arquivos pela API
+CDN_BASE_URL = os.getenv("CDN_BASE_URL", "").rstrip("/")
+# "s3": sem CDN e com ARMAZENAMENTO=s3, entrega URLs pré-assinadas do bucket em vez de /files/...
+ARQUIVOS_URL = os.getenv("ARQUIVOS_URL", "api")
+# Com segredo, as URLs de arquivo levam expira + assinatura (HMAC-SHA256), conferidas pela CDN ou por GET /files/
+URL_SEGREDO = os.getenv("URL_SEGREDO")
+URL_EXPIRA = int(os.getenv("URL_EXPIRA", "3600"))
+# O vencimento é arredondado para a janela: pedidos na mesma janela recebem a mesma URL,
+# que continua cacheável na borda e no cache de respostas (URL_EXPIRA deve passar de CACHE_TTL)
+URL_JANELA = int(os.getenv("URL_JANELA", "600"))
+# Hosts das URLs absolutas gravadas antes das chaves; URLs deles sob /files/ são tratadas como chave
+URL_HOSTS_LEGADOS = {
+    host.strip() for host in os.getenv("URL_HOSTS_LEGADOS", "local.juk.re:8000,docx.juk.re").split(",") if host.strip()
+}
+
+
+def caminho_relatorio(analise_id: int) -> str:
+    """Valor gravado em link_pdf no modo lazy: caminho da API, resolvido contra PUBLIC_BASE_URL."""
+    return f"/analises/{analise_id}/relatorio/"
+
+
+def assinar(chave: str, expira: int) -> str:
+    return hmac.new(URL_SEGREDO.encode(), f"{chave}:{expira}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def assinatura_valida(chave: str, expira: int, assinatura: str) -> bool:
+    if not URL_SEGREDO:
+        return True
+    if not expira or not assinatura or expira < time.time():
+        return False
+    return hmac.compare_digest(assinar(chave, expira), assinatura)
+
+
+def url_arquivo(chave: str) -> str:
+    """URL pública de um arquivo do armazenamento."""
+    if CDN_BASE_URL:
+        url = f"{CDN_BASE_URL}/{quote(chave)}"
+    elif ARQUIVOS_URL == "s3":
+        url = get_armazenamento().url_assinada(chave)
+        if url:
+            return url
+        url = f"{PUBLIC_BASE_URL}/files/{quote(chave)}"
+    else:
+        url = f"{PUBLIC_BASE_URL}/files/{quote(chave)}"
+    if URL_SEGREDO:
+        expira = math.ceil((time.time() + URL_EXPIRA) / URL_JANELA) * URL_JANELA
+        url = f"{url}?expira={expira}&assinatura={assinar(chave, expira)}"
+    return url
+
+
+def resolver(valor: str):
+    """
+    Valor gravado no banco -> URL pública. Aceita chave do armazenamento,
+    caminho da API ('/analises/...') ou URL absoluta antiga (devolvida como está,
+    salvo as dos hosts em URL_HOSTS_LEGADOS, que passam a sair pela configuração atual).
+    """
+    if not valor:
+        return valor
+    if valor.startswith(("http://", "https://")):
+        partes = urlsplit(valor)
+        if partes.netloc in URL_HOSTS_LEGADOS and partes.path.startswith("/files/"):
+            return url_arquivo(partes.path[len("/files/"):])
+        return valor
+    if valor.startswith("/"):
+        return f"{PUBLIC_BASE_URL}{valor}"
+    return url_arquivo(valor)
+
+
+def resolver_urls(linha: dict, colunas) -> dict:
+    """Resolve, no próprio dicionário, as colunas de arquivo presentes na linha."""
+    for coluna in colunas:
+        if linha.get(coluna):
+            linha[coluna] = resolver(linha[coluna])
+    return linha
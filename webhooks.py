@@ -0,0 +1,606 @@
+# Webhooks: eventos das análises entregues por POST às URLs cadastradas pelo usuário
+# webhooks.py
+#
+# Cada worker tem um despachante assíncrono, assinante de todos os eventos do
+# barramento (eventos.py). O worker que executa as certidões de uma análise é o
+# que publica os eventos dela, então cada evento é entregue por um único worker.
+#
+#   analise.finalizada   análise concluída (com ou sem erros) ao fim de process_certidoes
+#   certidao.finalizada  cada certidão emitida, com erro ou reaproveitada
+#
+# Os eventos de uma mesma assinatura são agrupados por até WEBHOOK_JANELA segundos
+# (ou WEBHOOK_LOTE_MAXIMO eventos) e enviados juntos, na ordem em que ocorreram:
+#
+#   POST <url>  {"eventos": [{"id": ..., "tipo": "certidao.finalizada", "analise_id": 1, ...}, ...]}
+#   X-Webhook-Id          id do lote (igual nas retentativas: o receptor deduplica por ele)
+#   X-Webhook-Timestamp   segundos desde a época
+#   X-Webhook-Assinatura  sha256=<HMAC-SHA256(segredo, "<timestamp>." + corpo)>
+#
+# Falha de rede, 408, 429 e 5xx são repetidas com backoff exponencial (Retry-After
+# é respeitado); outros 4xx e o esgotamento das tentativas levam o lote para a
+# tabela webhook_falha, de onde pode ser reenviado (POST /webhooks/{id}/falhas/reenviar/).
+#
+# URLs que resolvem para endereços privados, loopback ou link-local são recusadas no
+# cadastro e em cada entrega (resolver_destino). A entrega conecta ao endereço conferido,
+# com o host original no cabeçalho Host e no SNI, e não segue redirecionamentos.
+#
+# Para testar com um receptor local: python manage.py webhook-receptor --segredo <segredo>
+# (com WEBHOOK_REDES_PERMITIDAS=127.0.0.1/32)
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import secrets
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from cache import CacheLRU
+from db import SessionLocal, get_db
+from eventos import STATUS_FINAIS, get_barramento
+from models import Analise, WebhookAssinatura, WebhookFalha
+from schemas import EVENTOS_WEBHOOK, WebhookAssinaturaPayload
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# "0" desliga o despachante (as assinaturas continuam sendo aceitas)
+WEBHOOKS_ATIVOS = os.getenv("WEBHOOKS_ATIVOS", "1") == "1"
+# Agrupamento por assinatura: espera até WEBHOOK_JANELA segundos pelo lote de até WEBHOOK_LOTE_MAXIMO eventos
+WEBHOOK_JANELA = float(os.getenv("WEBHOOK_JANELA", "1"))
+WEBHOOK_LOTE_MAXIMO = int(os.getenv("WEBHOOK_LOTE_MAXIMO", "50"))
+# Entregas: tentativas por lote, backoff (segundos) e timeout de cada POST
+WEBHOOK_TENTATIVAS = int(os.getenv("WEBHOOK_TENTATIVAS", "6"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "2"))
+WEBHOOK_BACKOFF_MAXIMO = float(os.getenv("WEBHOOK_BACKOFF_MAXIMO", "300"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+# Conexões HTTP (keep-alive) compartilhadas por todas as assinaturas do worker
+WEBHOOK_CONEXOES = int(os.getenv("WEBHOOK_CONEXOES", "50"))
+# Eventos aguardando por assinatura; acima disso (receptor fora há muito tempo) vão direto para webhook_falha
+WEBHOOK_FILA_MAXIMA = int(os.getenv("WEBHOOK_FILA_MAXIMA", "1000"))
+# Espera máxima, em segundos, pelas entregas pendentes no encerramento do worker
+WEBHOOK_DRENAGEM = float(os.getenv("WEBHOOK_DRENAGEM", "10"))
+# Validade (segundos) das assinaturas em memória: cadastro feito em outro worker leva até isso para valer
+WEBHOOK_CACHE_TTL = int(os.getenv("WEBHOOK_CACHE_TTL", "30"))
+# Redes privadas aceitas como destino (ex.: "127.0.0.1/32" para o webhook-receptor local)
+WEBHOOK_REDES_PERMITIDAS = [
+    ipaddress.ip_network(rede.strip()) for rede in os.getenv("WEBHOOK_REDES_PERMITIDAS", "").split(",") if rede.strip()
+]
+
+EVENTO_ANALISE, EVENTO_CERTIDAO = EVENTOS_WEBHOOK
+EVENTO_TESTE = "webhook.teste"  # enviado sob demanda (POST /webhooks/{id}/teste/), ignora o filtro
+
+# Destinos inativos há mais que isso (segundos) liberam a tarefa de entrega
+_OCIOSO = 60
+# Fim da fila (encerramento do worker)
+_FIM = object()
+
+
+# =======================
+# ASSINATURA (HMAC)
+# =======================
+
+class DestinoBloqueado(ValueError):
+    """URL de webhook que resolve para endereço fora da internet pública."""
+
+
+def resolver_destino(url: str) -> str:
+    """
+    Resolve o host da URL e devolve o endereço (IP) a que a entrega deve conectar.
+    Todos os endereços do host precisam ser públicos: privados, loopback, link-local
+    (metadados da nuvem) e reservados levariam a API a fazer requisições à rede
+    interna (SSRF). DestinoBloqueado com o motivo se algum não for; erro de DNS
+    sobe como OSError. Bloqueante: chamar fora do event loop.
+    """
+    partes = urlsplit(url)
+    porta = partes.port or (443 if partes.scheme == "https" else 80)
+    enderecos = []
+    for *_, endereco in socket.getaddrinfo(partes.hostname, porta, proto=socket.IPPROTO_TCP):
+        ip = ipaddress.ip_address(endereco[0].split("%")[0])
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        if not any(ip in rede for rede in WEBHOOK_REDES_PERMITIDAS) and (not ip.is_global or ip.is_multicast):
+            raise DestinoBloqueado(f"{partes.hostname} resolve para endereço não público ({ip})")
+        enderecos.append(str(ip))
+    return enderecos[0]
+
+
+def _no_endereco(url: str, endereco: str) -> tuple:
+    """(URL com o IP no lugar do host, cabeçalho Host, nome para o SNI/certificado)."""
+    partes = urlsplit(url)
+    host = f"[{endereco}]" if ":" in endereco else endereco
+    netloc = host if partes.port is None else f"{host}:{partes.port}"
+    credenciais, _, host_original = partes.netloc.rpartition("@")
+    if credenciais:
+        netloc = f"{credenciais}@{netloc}"
+    return partes._replace(netloc=netloc).geturl(), host_original, partes.hostname
+
+
+def assinar(segredo: str, timestamp: int, corpo: bytes) -> str:
+    return "sha256=" + hmac.new(segredo.encode(), f"{timestamp}.".encode() + corpo, hashlib.sha256).hexdigest()
+
+
+def assinatura_valida(segredo: str, timestamp, corpo: bytes, assinatura: str, tolerancia: int = 300) -> bool:
+    """Conferência do lado do receptor: HMAC correto e timestamp recente (contra replay)."""
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerancia:
+        return False
+    return hmac.compare_digest(assinar(segredo, timestamp, corpo), assinatura or "")
+
+
+def _tipo_webhook(evento: dict):
+    if evento.get("tipo") == "certidao":
+        return EVENTO_CERTIDAO
+    if evento.get("tipo") == "status" and evento.get("status") in STATUS_FINAIS:
+        return EVENTO_ANALISE
+    return None
+
+
+def _espera(tentativa: int) -> float:
+    # Backoff exponencial com jitter: evita que os lotes que falharam juntos voltem juntos
+    return min(WEBHOOK_BACKOFF_MAXIMO, WEBHOOK_BACKOFF_BASE * 2 ** (tentativa - 1)) * random.uniform(0.5, 1)
+
+
+def _retry_after(valor):
+    # Retry-After em segundos ou como data HTTP
+    if not valor:
+        return None
+    try:
+        return max(float(valor), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(valor).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def registrar_falha(assinatura_id: int, url: str, eventos: list, tentativas: int, erro: str):
+    db = SessionLocal()
+    try:
+        db.add(WebhookFalha(
+            assinatura_id=assinatura_id,
+            url=url,
+            eventos=json.dumps(eventos, default=str),
+            tentativas=tentativas,
+            erro=(erro or "")[:255],
+            criado_em=datetime.utcnow()
+        ))
+        db.commit()
+    finally:
+        db.close()
+    logger.warning("Webhook %s: %d eventos para webhook_falha (%s)", assinatura_id, len(eventos), erro)
+
+
+# =======================
+# DESPACHANTE
+# =======================
+
+class _Destino:
+    """Fila e tarefa de entrega de uma assinatura (id, url, segredo, eventos)."""
+
+    def __init__(self, assinatura: tuple):
+        self.assinatura = assinatura
+        self.fila = asyncio.Queue()  # limite conferido em _enfileirar (o _FIM sempre cabe)
+        self.tarefa = None
+
+
+class DespachanteWebhooks:
+    """
+    Vive no loop do worker (iniciar/encerrar no lifespan, ver com_despachante).
+    Uma tarefa lê o barramento e distribui os eventos nas filas das assinaturas;
+    cada assinatura tem a própria tarefa de entrega, criada sob demanda, então
+    um receptor lento ou fora do ar não atrasa os demais.
+    """
+
+    def __init__(self, cliente=None):
+        self._cliente = cliente
+        self._fila = None
+        self._tarefa = None
+        self._loop = None
+        self._destinos = {}  # assinatura_id -> _Destino
+        self._gravacoes = set()  # gravações no dead letter em andamento (referência até terminarem)
+        self._encerrando = False
+        # usuario_id de uma análise não muda; as assinaturas do usuário valem WEBHOOK_CACHE_TTL
+        self._usuarios = CacheLRU(10000, 3600)
+        self._assinaturas = CacheLRU(1000, WEBHOOK_CACHE_TTL)
+
+    @property
+    def ativo(self) -> bool:
+        return self._tarefa is not None and not self._encerrando
+
+    async def iniciar(self):
+        if self._cliente is None:
+            try:
+                import httpx
+            except ImportError:
+                logger.warning("Webhooks desligados: o despachante requer o pacote httpx (pip install httpx)")
+                return
+            self._cliente = httpx.AsyncClient(
+                timeout=WEBHOOK_TIMEOUT,
+                follow_redirects=False,  # um redirecionamento levaria a um destino não conferido
+                limits=httpx.Limits(max_connections=WEBHOOK_CONEXOES, max_keepalive_connections=WEBHOOK_CONEXOES),
+            )
+        self._encerrando = False
+        self._loop = asyncio.get_running_loop()
+        self._fila = get_barramento().assinar(None, tamanho_fila=10 * WEBHOOK_FILA_MAXIMA)
+        self._tarefa = asyncio.create_task(self._consumir())
+
+    async def encerrar(self, timeout: float = WEBHOOK_DRENAGEM):
+        """Entrega (uma tentativa) o que já está nas filas; o resto vai para webhook_falha."""
+        if self._tarefa is None:
+            return
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + timeout
+        self._encerrando = True
+        get_barramento().cancelar(self._fila, None)
+        await asyncio.sleep(0)  # eventos publicados antes do cancelamento ainda a caminho da fila
+        await self._fila.put(_FIM)
+        try:
+            await asyncio.wait_for(self._tarefa, timeout=max(limite - loop.time(), 0))
+        except asyncio.TimeoutError:
+            pass
+        tarefas = []
+        for destino in list(self._destinos.values()):
+            destino.fila.put_nowait(_FIM)
+            tarefas.append(destino.tarefa)
+        if tarefas:
+            _, pendentes = await asyncio.wait(tarefas, timeout=max(limite - loop.time(), 0))
+            for tarefa in pendentes:
+                tarefa.cancel()
+            if pendentes:
+                await asyncio.wait(pendentes)
+        if self._gravacoes:
+            await asyncio.wait(self._gravacoes, timeout=max(limite - loop.time(), 0))
+        await self._cliente.aclose()
+        self._cliente = self._tarefa = self._fila = None
+        self._destinos = {}
+
+    def esquecer_usuario(self, usuario_id: str):
+        """Descarta as assinaturas do usuário em memória (depois de cadastrar/remover)."""
+        self._assinaturas.remover(usuario_id)
+
+    def enviar(self, assinatura: tuple, eventos: list):
+        """
+        Enfileira eventos já montados para uma assinatura (teste e reenvio do
+        dead letter). Pode ser chamado de qualquer thread.
+        """
+        def enfileirar():
+            for evento in eventos:
+                self._enfileirar(assinatura, evento)
+
+        self._loop.call_soon_threadsafe(enfileirar)
+
+    # -----------------------
+    # Roteamento
+    # -----------------------
+
+    async def _consumir(self):
+        while True:
+            evento = await self._fila.get()
+            if evento is _FIM:
+                return
+            try:
+                await self._rotear(evento)
+            except Exception:
+                logger.exception("Falha ao distribuir evento de webhook: %s", evento)
+
+    async def _rotear(self, evento: dict):
+        tipo = _tipo_webhook(evento)
+        if tipo is None or evento.get("analise_id") is None:
+            return
+        assinaturas = self._assinaturas_em_memoria(evento["analise_id"])
+        if assinaturas is None:
+            assinaturas = await run_in_threadpool(self._carregar_assinaturas, evento["analise_id"])
+        entrega = None
+        for assinatura in assinaturas:
+            if tipo in assinatura[3]:
+                entrega = entrega or {"id": uuid.uuid4().hex, **evento, "tipo": tipo}
+                self._enfileirar(assinatura, entrega)
+
+    def _assinaturas_em_memoria(self, analise_id: int):
+        usuario_id = self._usuarios.obter(analise_id)
+        return None if usuario_id is None else self._assinaturas.obter(usuario_id)
+
+    def _carregar_assinaturas(self, analise_id: int) -> list:
+        db = SessionLocal()
+        try:
+            usuario_id = self._usuarios.obter(analise_id)
+            if usuario_id is None:
+                usuario_id = db.execute(select(Analise.usuario_id).where(Analise.id == analise_id)).scalar()
+                if usuario_id is None:
+                    return []
+                self._usuarios.guardar(analise_id, usuario_id)
+            assinaturas = [
+                (id_, url, segredo, frozenset(eventos.split(",")))
+                for id_, url, segredo, eventos in db.execute(
+                    select(WebhookAssinatura.id, WebhookAssinatura.url, WebhookAssinatura.segredo, WebhookAssinatura.eventos)
+                    .where(WebhookAssinatura.usuario_id == usuario_id, WebhookAssinatura.ativo == 1)
+                )
+            ]
+            self._assinaturas.guardar(usuario_id, assinaturas)
+            return assinaturas
+        finally:
+            db.close()
+
+    def _enfileirar(self, assinatura: tuple, evento: dict):
+        destino = self._destinos.get(assinatura[0])
+        if destino is None or destino.tarefa.done():
+            destino = self._destinos[assinatura[0]] = _Destino(assinatura)
+            destino.tarefa = asyncio.create_task(self._entregar(destino))
+        if destino.fila.qsize() >= WEBHOOK_FILA_MAXIMA:
+            gravacao = asyncio.create_task(run_in_threadpool(
+                registrar_falha, assinatura[0], assinatura[1], [evento], 0, "fila de entrega cheia"
+            ))
+            self._gravacoes.add(gravacao)
+            gravacao.add_done_callback(self._gravacoes.discard)
+            return
+        destino.assinatura = assinatura  # url/segredo atualizados pelo cache
+        destino.fila.put_nowait(evento)
+
+    # -----------------------
+    # Entrega
+    # -----------------------
+
+    async def _entregar(self, destino: _Destino):
+        loop = asyncio.get_running_loop()
+        lote = []
+        try:
+            while True:
+                try:
+                    evento = await asyncio.wait_for(destino.fila.get(), timeout=_OCIOSO)
+                except asyncio.TimeoutError:
+                    # Sem await entre a conferência e a remoção: nada entra na fila no meio
+                    if destino.fila.empty():
+                        self._soltar(destino)
+                        return
+                    continue
+                fim = evento is _FIM
+                lote = [] if fim else [evento]
+                limite = loop.time() + (0 if self._encerrando else WEBHOOK_JANELA)
+                while not fim and len(lote) < WEBHOOK_LOTE_MAXIMO:
+                    try:
+                        if destino.fila.empty():
+                            evento = await asyncio.wait_for(destino.fila.get(), timeout=max(limite - loop.time(), 0))
+                        else:
+                            evento = destino.fila.get_nowait()
+                    except asyncio.TimeoutError:
+                        break
+                    fim = evento is _FIM
+                    if not fim:
+                        lote.append(evento)
+                if lote:
+                    await self._enviar_lote(destino.assinatura, lote)
+                lote = []
+                if fim:  # _FIM é o último item da fila
+                    self._soltar(destino)
+                    return
+        except asyncio.CancelledError:
+            # Drenagem estourou o tempo: guarda o lote em curso e a fila (chamada síncrona, já no encerramento)
+            while not destino.fila.empty():
+                evento = destino.fila.get_nowait()
+                if evento is not _FIM:
+                    lote.append(evento)
+            if lote:
+                registrar_falha(destino.assinatura[0], destino.assinatura[1], lote, 0, "worker encerrado")
+            raise
+
+    def _soltar(self, destino: _Destino):
+        if self._destinos.get(destino.assinatura[0]) is destino:
+            del self._destinos[destino.assinatura[0]]
+
+    async def _enviar_lote(self, assinatura: tuple, lote: list) -> bool:
+        assinatura_id, url, segredo, _ = assinatura
+        corpo = json.dumps({"eventos": lote}, default=str, ensure_ascii=False).encode()
+        id_lote = uuid.uuid4().hex
+        tentativa = 0
+        while True:
+            tentativa += 1
+            timestamp = int(time.time())
+            headers = {
+                "Content-Type": "application/json",
+                "X-Webhook-Id": id_lote,
+                "X-Webhook-Timestamp": str(timestamp),
+                "X-Webhook-Assinatura": assinar(segredo, timestamp, corpo),
+                "X-Webhook-Tentativa": str(tentativa),
+            }
+            espera = None
+            try:
+                # Conferido a cada entrega (o DNS pode mudar depois do cadastro) e a conexão vai
+                # ao endereço conferido: uma nova resolução (DNS rebinding) não é feita pelo httpx
+                endereco = await run_in_threadpool(resolver_destino, url)
+                url_ip, host, sni = _no_endereco(url, endereco)
+                resposta = await self._cliente.post(
+                    url_ip, content=corpo, headers={**headers, "Host": host}, extensions={"sni_hostname": sni}
+                )
+            except DestinoBloqueado as e:
+                erro, repetir = f"Destino bloqueado: {e}", False
+            except Exception as e:  # rede, DNS, timeout
+                erro, repetir = f"{type(e).__name__}: {e}", True
+            else:
+                if resposta.status_code < 300:
+                    return True
+                erro = f"HTTP {resposta.status_code}"
+                repetir = resposta.status_code in (408, 429) or resposta.status_code >= 500
+                espera = _retry_after(resposta.headers.get("Retry-After"))
+            if not repetir or tentativa >= WEBHOOK_TENTATIVAS or self._encerrando:
+                try:
+                    await run_in_threadpool(registrar_falha, assinatura_id, url, lote, tentativa, erro)
+                except Exception:
+                    logger.exception("Webhook %s: lote de %d eventos perdido (%s)", assinatura_id, len(lote), erro)
+                return False
+            await asyncio.sleep(min(espera, WEBHOOK_BACKOFF_MAXIMO) if espera is not None else _espera(tentativa))
+
+
+despachante = DespachanteWebhooks()
+
+
+def com_despachante(lifespan=None):
+    """
+    Envolve o lifespan da aplicação com o despachante do worker. O despachante
+    encerra por último: as emissões drenadas pelo lifespan interno ainda notificam.
+    """
+    @asynccontextmanager
+    async def ciclo_de_vida(app):
+        if WEBHOOKS_ATIVOS:
+            await despachante.iniciar()
+        try:
+            if lifespan is None:
+                yield
+            else:
+                async with lifespan(app) as estado:
+                    yield estado
+        finally:
+            await despachante.encerrar()
+
+    return ciclo_de_vida
+
+
+# =======================
+# ENDPOINTS
+# =======================
+
+def _assinatura_resposta(assinatura: WebhookAssinatura, segredo: bool = False) -> dict:
+    resposta = {
+        "id": assinatura.id,
+        "usuario_id": assinatura.usuario_id,
+        "url": assinatura.url,
+        "eventos": assinatura.eventos.split(","),
+        "ativo": bool(assinatura.ativo),
+        "criado_em": assinatura.criado_em,
+    }
+    if segredo:
+        resposta["segredo"] = assinatura.segredo
+    return resposta
+
+
+def _obter_assinatura(db: Session, assinatura_id: int) -> WebhookAssinatura:
+    assinatura = db.get(WebhookAssinatura, assinatura_id)
+    if assinatura is None or not assinatura.ativo:
+        raise HTTPException(status_code=404, detail="Assinatura não encontrada")
+    return assinatura
+
+
+def _exigir_despachante():
+    if not despachante.ativo:
+        raise HTTPException(status_code=503, detail="Despachante de webhooks desligado neste worker")
+
+
+@router.post("/webhooks/", tags=["Webhooks"], status_code=201)
+def criar_assinatura(payload: WebhookAssinaturaPayload, db: Session = Depends(get_db)):
+    """
+    Cadastra uma URL para receber os eventos das análises do usuário.
+    O segredo do HMAC só é devolvido aqui (gerado se não for informado).
+    """
+    # Endpoint síncrono: roda no threadpool, então a resolução do DNS não trava o event loop
+    try:
+        resolver_destino(payload.url)
+    except DestinoBloqueado as e:
+        raise HTTPException(status_code=422, detail=f"URL não permitida: {e}")
+    except (OSError, UnicodeError):
+        raise HTTPException(status_code=422, detail="Host da URL não encontrado")
+    assinatura = WebhookAssinatura(
+        usuario_id=str(payload.usuario_id),
+        url=payload.url,
+        segredo=payload.segredo or secrets.token_hex(32),
+        eventos=",".join(payload.eventos),
+        ativo=1,
+        criado_em=datetime.utcnow()
+    )
+    db.add(assinatura)
+    db.commit()
+    despachante.esquecer_usuario(assinatura.usuario_id)
+    return _assinatura_resposta(assinatura, segredo=True)
+
+
+@router.get("/webhooks/usuario/{usuario_id}/", tags=["Webhooks"])
+def listar_assinaturas(usuario_id: int, db: Session = Depends(get_db)):
+    assinaturas = db.execute(
+        select(WebhookAssinatura)
+        .where(WebhookAssinatura.usuario_id == str(usuario_id), WebhookAssinatura.ativo == 1)
+        .order_by(WebhookAssinatura.id)
+    ).scalars()
+    return [_assinatura_resposta(assinatura) for assinatura in assinaturas]
+
+
+@router.delete("/webhooks/{assinatura_id}/", tags=["Webhooks"], status_code=204)
+def remover_assinatura(assinatura_id: int, db: Session = Depends(get_db)):
+    # Desativa em vez de apagar: o dead letter continua apontando para a assinatura
+    assinatura = _obter_assinatura(db, assinatura_id)
+    assinatura.ativo = 0
+    db.commit()
+    despachante.esquecer_usuario(assinatura.usuario_id)
+
+
+@router.post("/webhooks/{assinatura_id}/teste/", tags=["Webhooks"], status_code=202)
+def testar_assinatura(assinatura_id: int, db: Session = Depends(get_db)):
+    """Envia um evento webhook.teste para conferir URL e assinatura HMAC."""
+    _exigir_despachante()
+    assinatura = _obter_assinatura(db, assinatura_id)
+    evento = {"id": uuid.uuid4().hex, "tipo": EVENTO_TESTE, "data": datetime.utcnow().isoformat()}
+    destino = (assinatura.id, assinatura.url, assinatura.segredo, frozenset())
+    despachante.enviar(destino, [evento])
+    return {"id": evento["id"]}
+
+
+@router.get("/webhooks/{assinatura_id}/falhas/", tags=["Webhooks"])
+def listar_falhas(assinatura_id: int, limite: int = 100, db: Session = Depends(get_db)):
+    """Lotes que esgotaram as tentativas e ainda não foram reenviados."""
+    falhas = db.execute(
+        select(WebhookFalha)
+        .where(WebhookFalha.assinatura_id == assinatura_id, WebhookFalha.reenviado_em.is_(None))
+        .order_by(WebhookFalha.id)
+        .limit(min(limite, 1000))
+    ).scalars()
+    return [
+        {
+            "id": falha.id,
+            "url": falha.url,
+            "eventos": json.loads(falha.eventos),
+            "tentativas": falha.tentativas,
+            "erro": falha.erro,
+            "criado_em": falha.criado_em,
+        }
+        for falha in falhas
+    ]
+
+
+@router.post("/webhooks/{assinatura_id}/falhas/reenviar/", tags=["Webhooks"], status_code=202)
+def reenviar_falhas(assinatura_id: int, db: Session = Depends(get_db)):
+    """Devolve os lotes do dead letter para a fila de entrega, na ordem original."""
+    _exigir_despachante()
+    assinatura = _obter_assinatura(db, assinatura_id)
+    falhas = db.execute(
+        select(WebhookFalha.id, WebhookFalha.eventos)
+        .where(WebhookFalha.assinatura_id == assinatura_id, WebhookFalha.reenviado_em.is_(None))
+        .order_by(WebhookFalha.id)
+        .with_for_update()
+    ).all()
+    if not falhas:
+        return {"reenviados": 0}
+    db.execute(
+        update(WebhookFalha)
+        .where(WebhookFalha.id.in_([falha.id for falha in falhas]))
+        .values(reenviado_em=datetime.utcnow())
+    )
+    db.commit()
+    eventos = [evento for falha in falhas for evento in json.loads(falha.eventos)]
+    destino = (assinatura.id, assinatura.url, assinatura.segredo, frozenset(assinatura.eventos.split(",")))
+    despachante.enviar(destino, eventos)
+    return {"reenviados": len(eventos)}
@@ -0,0 +1,275 @@
+# Download em ZIP de todas as certidões de uma análise, gerado em streaming
+# zip_certidoes.py
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import closing
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from armazenamento import get_armazenamento, chave_do_valor
+from arquivamento import analise_arquivada, linhas_arquivadas
+from db import get_db
+from models import Analise, Proprietario, EsposaSocio
+
+router = APIRouter()
+
+BLOCO = 256 * 1024
+# Entradas sem compressão (PDF já é comprimido) e com data descriptor: o tamanho
+# do ZIP é conhecido antes do primeiro byte e o CRC é calculado enquanto os dados saem
+_FLAGS = 0x0008 | 0x0800  # data descriptor + nomes em UTF-8
+_LIMITE_ZIP32 = 0xFFFFFFFF
+
+COLUNAS_PDF_PROPRIETARIO = [c for c in Proprietario.__table__.columns if c.name.startswith("pdf_")]
+COLUNAS_PDF_CONJUGE = [c for c in EsposaSocio.__table__.columns if c.name.startswith("pdf_")]
+
+
+# =======================
+# CRC DOS ARQUIVOS
+# =======================
+
+# (chave, tamanho, versão) -> crc32; evita reler um arquivo para retomar um download
+_crcs = OrderedDict()
+_crcs_lock = threading.Lock()
+CRC_CACHE_MAX = 4096
+
+
+def _crc_em_cache(chave):
+    with _crcs_lock:
+        return _crcs.get(chave)
+
+
+def _guardar_crc(chave, crc: int):
+    with _crcs_lock:
+        _crcs[chave] = crc
+        _crcs.move_to_end(chave)
+        while len(_crcs) > CRC_CACHE_MAX:
+            _crcs.popitem(last=False)
+
+
+def _crc_do_arquivo(entrada) -> int:
+    crc = _crc_em_cache(entrada.chave)
+    if crc is None:
+        crc = 0
+        with closing(get_armazenamento().abrir(entrada.arquivo)) as arquivo:
+            for bloco in iter(lambda: arquivo.read(BLOCO), b""):
+                crc = zlib.crc32(bloco, crc)
+        _guardar_crc(entrada.chave, crc)
+    return crc
+
+
+# =======================
+# LAYOUT DO ZIP
+# =======================
+
+class _Entrada:
+    def __init__(self, nome: str, arquivo: str, info: dict):
+        self.nome = nome.encode("utf-8")
+        self.arquivo = arquivo  # chave no armazenamento
+        self.tamanho = info["tamanho"]
+        self.chave = (arquivo, info["tamanho"], info["versao"])
+        self.hora, self.data = _hora_dos(info["modificado"])
+        self.offset = 0
+
+    def cabecalho_local(self) -> bytes:
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, _FLAGS, 0, self.hora, self.data, 0, 0, 0, len(self.nome), 0
+        ) + self.nome
+
+    def descritor(self, crc: int) -> bytes:
+        return struct.pack("<IIII", 0x08074B50, crc, self.tamanho, self.tamanho)
+
+    def central(self, crc: int) -> bytes:
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, _FLAGS, 0, self.hora, self.data,
+            crc, self.tamanho, self.tamanho, len(self.nome), 0, 0, 0, 0, 0, self.offset
+        ) + self.nome
+
+
+def _hora_dos(instante: float):
+    t = time.localtime(max(instante, 315532800))  # o formato DOS começa em 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class PacoteZip:
+    """
+    ZIP montado como uma sequência de segmentos de tamanho conhecido
+    (cabeçalho, dados do arquivo, descritor, diretório central). Qualquer
+    intervalo de bytes pode ser gerado sem produzir o que vem antes, o que
+    permite retomar downloads (Range) sem arquivo temporário.
+    """
+
+    def __init__(self, arquivos: list):
+        """arquivos: (nome dentro do ZIP, chave no armazenamento, info do armazenamento)."""
+        self.entradas = [_Entrada(nome, arquivo, info) for nome, arquivo, info in arquivos]
+        self.segmentos = []  # (inicio, tamanho, tipo, entrada)
+        posicao = 0
+        for entrada in self.entradas:
+            entrada.offset = posicao
+            for tipo, tamanho in (
+                ("cabecalho", 30 + len(entrada.nome)),
+                ("dados", entrada.tamanho),
+                ("descritor", 16),
+            ):
+                self.segmentos.append((posicao, tamanho, tipo, entrada))
+                posicao += tamanho
+        self.inicio_central = posicao
+        self.tamanho_central = sum(46 + len(entrada.nome) for entrada in self.entradas)
+        self.segmentos.append((posicao, self.tamanho_central + 22, "central", None))
+        self.tamanho = posicao + self.tamanho_central + 22
+        if self.tamanho > _LIMITE_ZIP32 or len(self.entradas) > 0xFFFF:
+            raise ValueError("Pacote grande demais para ZIP sem ZIP64")
+        self._crcs = {}
+
+    def _crc(self, entrada) -> int:
+        if entrada.chave not in self._crcs:
+            self._crcs[entrada.chave] = _crc_do_arquivo(entrada)
+        return self._crcs[entrada.chave]
+
+    def _central(self) -> bytes:
+        partes = [entrada.central(self._crc(entrada)) for entrada in self.entradas]
+        partes.append(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(self.entradas), len(self.entradas),
+            self.tamanho_central, self.inicio_central, 0
+        ))
+        return b"".join(partes)
+
+    def _dados(self, entrada, desde: int, ate: int):
+        # Lendo o arquivo inteiro desde o início, o CRC sai de graça
+        calcular = desde == 0 and entrada.chave not in self._crcs and _crc_em_cache(entrada.chave) is None
+        crc = 0
+        with closing(get_armazenamento().abrir(entrada.arquivo, desde)) as arquivo:
+            restante = ate - desde
+            while restante > 0:
+                bloco = arquivo.read(min(BLOCO, restante))
+                if not bloco:
+                    raise IOError(f"{entrada.arquivo} mudou durante o download")
+                if calcular:
+                    crc = zlib.crc32(bloco, crc)
+                restante -= len(bloco)
+                yield bloco
+        if calcular and ate == entrada.tamanho:
+            self._crcs[entrada.chave] = crc
+            _guardar_crc(entrada.chave, crc)
+
+    def gerar(self, inicio: int = 0, fim: int = None):
+        """Bytes do intervalo [inicio, fim] (inclusivo) do ZIP."""
+        fim = self.tamanho - 1 if fim is None else fim
+        for posicao, tamanho, tipo, entrada in self.segmentos:
+            if posicao + tamanho <= inicio or posicao > fim:
+                continue
+            desde = max(inicio - posicao, 0)
+            ate = min(fim - posicao + 1, tamanho)
+            if tipo == "dados":
+                yield from self._dados(entrada, desde, ate)
+                continue
+            if tipo == "cabecalho":
+                conteudo = entrada.cabecalho_local()
+            elif tipo == "descritor":
+                conteudo = entrada.descritor(self._crc(entrada))
+            else:
+                conteudo = self._central()
+            yield conteudo[desde:ate]
+
+
+# =======================
+# CERTIDÕES DA ANÁLISE
+# =======================
+
+def _no_armazenamento(valor: str):
+    """(chave, info) do arquivo gravado na coluna pdf_* (nome ou URL), ou None se não está no armazenamento."""
+    chave = chave_do_valor(valor)
+    info = get_armazenamento().info(chave) if chave else None
+    return (chave, info) if info else None
+
+
+def arquivos_da_analise(db: Session, analise_id: int) -> list:
+    """(nome dentro do ZIP, chave, info) de cada certidão dos proprietários e cônjuges."""
+    arquivos = []
+    proprietarios = db.execute(
+        select(Proprietario.id, *COLUNAS_PDF_PROPRIETARIO)
+        .where(Proprietario.analise_id == analise_id)
+        .order_by(Proprietario.id)
+    ).mappings().all()
+    conjuges = db.execute(
+        select(EsposaSocio.proprietario_id, *COLUNAS_PDF_CONJUGE)
+        .where(EsposaSocio.proprietario_id.in_([prop["id"] for prop in proprietarios]))
+        .order_by(EsposaSocio.proprietario_id)
+    ).mappings().all() if proprietarios else []
+    arquivada = None if proprietarios else linhas_arquivadas(db, analise_id)
+    if arquivada:
+        proprietarios = sorted(arquivada["proprietario"], key=lambda prop: prop["id"])
+        conjuges = sorted(arquivada["esposa_socio"], key=lambda conjuge: conjuge["proprietario_id"])
+    for prop in proprietarios:
+        for coluna in COLUNAS_PDF_PROPRIETARIO:
+            encontrado = _no_armazenamento(prop[coluna.name])
+            if encontrado:
+                arquivos.append((f"proprietario_{prop['id']}/{coluna.name[4:]}.pdf", *encontrado))
+    for conjuge in conjuges:
+        for coluna in COLUNAS_PDF_CONJUGE:
+            encontrado = _no_armazenamento(conjuge[coluna.name])
+            if encontrado:
+                arquivos.append((f"proprietario_{conjuge['proprietario_id']}/conjuge/{coluna.name[4:]}.pdf", *encontrado))
+    return arquivos
+
+
+_INTERVALO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _intervalo(cabecalho: str, tamanho: int):
+    """Converte o cabeçalho Range (um único intervalo) em (inicio, fim); None se inválido."""
+    match = _INTERVALO.match(cabecalho.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    inicio, fim = match.groups()
+    if inicio == "":
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio > fim or inicio >= tamanho:
+        return None
+    return inicio, fim
+
+
+@router.get("/analises/{analise_id}/certidoes/zip/", tags=["Arquivos"])
+def baixar_certidoes_zip(analise_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    ZIP com as certidões (colunas pdf_*) dos proprietários e cônjuges da análise,
+    enviado direto dos arquivos, sem montar o ZIP em disco nem em memória.
+    Aceita Range (um intervalo) e If-Range para retomar downloads interrompidos.
+    """
+    if not db.query(Analise.id).filter(Analise.id == analise_id).first() and not analise_arquivada(db, analise_id):
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    arquivos = arquivos_da_analise(db, analise_id)
+    if not arquivos:
+        raise HTTPException(status_code=404, detail="Nenhuma certidão disponível para esta análise")
+    try:
+        pacote = PacoteZip(arquivos)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    etag = '"%08x"' % zlib.crc32(repr([(e.nome, e.chave) for e in pacote.entradas]).encode())
+    cabecalhos = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="certidoes_analise_{analise_id}.zip"',
+    }
+    faixa = request.headers.get("range")
+    if faixa and request.headers.get("if-range", etag) == etag:
+        intervalo = _intervalo(faixa, pacote.tamanho)
+        if intervalo is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{pacote.tamanho}"})
+        inicio, fim = intervalo
+        cabecalhos["Content-Range"] = f"bytes {inicio}-{fim}/{pacote.tamanho}"
+        cabecalhos["Content-Length"] = str(fim - inicio + 1)
+        return StreamingResponse(
+            pacote.gerar(inicio, fim), status_code=206, media_type="application/zip", headers=cabecalhos
+        )
+    cabecalhos["Content-Length"] = str(pacote.tamanho)
+    return StreamingResponse(pacote.gerar(), media_type="application/zip", headers=cabecalhos)